@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 try:
-    import os
-    import threading
     import pygame
+    import time
     from random import choice
     from string import ascii_letters, digits
     from numpy import ceil
     from pygame.locals import *
-    from scripts.song import SongParser
-    from scripts.audio import SoundData
-    from scripts.ui_elements import Button, ScrollBar, SongTab, TextInput
+    from scripts.assets import ImageStore, load_manifest, StartupTimer
+    from scripts.history import PerformanceHistory
+    from scripts.library import DIFFICULTIES, SongLibrary
+    from scripts.profiler import PROFILER
+    from scripts.render import HudItem, LayeredRenderer, ScoreStrip, StaveLayer
+    from scripts.scheduler import BeatScheduler, SampleClock
+    from scripts.screen_loop import ScreenLoop
+    from scripts.song import compile_song
+    from scripts.audio import Calibrator, DEFAULT_NOTES, NoteClassifier, PitchDetector, PITCH_ENGINES, SoundData
+    from scripts.session import PerformanceSession
+    from scripts.text import render_text, TEXT
+    from scripts.ui_elements import Button, ScrollBar, SongCarousel, TextInput
     from scripts.user import User
 except ImportError as e: # most likely a ModuleNotFoundError
     raise Exception(f'Could not import a module: {e}.')
@@ -19,73 +27,48 @@ class Application:
         '''
         Initialize an Application instance.
         '''
+        self.startup = StartupTimer()
         pygame.init() # initialize all imported pygame modules
         pygame.mouse.set_cursor(*pygame.cursors.arrow)
-        
-        self.images = {}
-        images = self._loadFiles()
-        for image in images:
-            self.images[image[1]] = pygame.image.load(image[0]) # load the image onto a new Surface object into a dictionary
-        self.backgrounds = [self.images['menu_background_a'],
-                            self.images['menu_background_b'],
-                            self.images['menu_background_c'],
-                            self.images['menu_background_d'],
-                            self.images['menu_background_e']]
+        self.startup.mark('pygame')
+
+        self.manifest = load_manifest('./assets') # names and locations of every asset, cached between runs
+        self.images = ImageStore(self.manifest['images']) # images are loaded the first time they are drawn
+        TEXT.font_path = self.manifest['fonts']['font']
+        self.backgrounds = ['menu_background_a', # names rather than images, so only the background chosen is loaded
+                            'menu_background_b',
+                            'menu_background_c',
+                            'menu_background_d',
+                            'menu_background_e']
+        self.library = SongLibrary() # details of every song, only re-read when a song file changes
+        self.startup.mark('asset manifest')
         self.overlay = pygame.Surface((1280,720))
         self.overlay.set_alpha(50)
         self.overlay.fill((255,255,255))
 
         self.user = User()
         
-        self.screen = pygame.display.set_mode((1280, 720)) # initialize a window 
+        self.screen = pygame.display.set_mode((1280, 720)) # initialize a window, which must exist before images can be converted
 
         pygame.display.set_caption('Music Maestro') # set the text in the window caption (top left)
         pygame.display.set_icon(self.images['icon'])
+        self.startup.mark('display')
 
-        self.clock = pygame.time.Clock()
+        self.loop = ScreenLoop() # Every screen waits for events and pushes frames through this
         self.audio = SoundData()
 
-        self.notes = {'A'    :[440],
-                      'A#/Bb':[466],
-                      'B'    :[493],
-                      'C'    :[523],
-                      'C#/Db':[554],
-                      'D'    :[587],
-                      'D#/Eb':[622],
-                      'E'    :[659],
-                      'F'    :[698],
-                      'F#/Gb':[739],
-                      'G'    :[783],
-                      'G#/Ab':[830]}
-
-        self.font = {str(i):pygame.font.Font('.\\assets\\font.ttf', i) for i in range(10,510,10)} # Load various font sizes
+        self.notes = dict(DEFAULT_NOTES) # Replaced note by note when the microphone is calibrated
+        self.classifier = NoteClassifier(self.notes) # Rebuilt whenever self.notes is recalibrated
+        self.detector = PitchDetector(self.audio, self.classifier) # Note detection worker, only running during a performance
+        self.startup.mark('audio')
         return
 
-    def _loadFiles(self, t=['png','jpg']):
-        '''
-        Load files from the directory the program is run from and all child directories.
-        
-        Args:
-            t        (list) : list of all file extensions to whitelist during the directory walk
-                              default: ['png','jpg']
-        Returns:
-            location (list) : contains all file names and addresses of files that have the whitelisted extensions
-        '''
-        dir_contents = [[files,root] for root, dirs, files in os.walk('.')] # os.walk() will traverse all child directories from the argument returning a generator
-                                                                            # dir_contents is a 2D array of all files (and their root suffix, e.g: .png) in all child directories 
-        location = []
-        for x,dirs in enumerate(dir_contents): # enumerate allows for iteration over an object with an automatic counter (in this case variable x)
-                                               # for each child directory in dir_contents
-            for y,file in enumerate(dirs[0]): # for each file in each child directory 
-                file = file.split('.') # split a string file name at each '.' into a list: 'picture.jpg' --> ['picture' , 'jpg']
-                if file[1] in t:
-                    path = dirs[1] + '\\' + dir_contents[x][0][y]
-                    location.append([path,file[0]]) # add location details of a found file to location var where file[0]=name of file
-        return location
-
     def _menuScreen(self):
         '''
         Handle the main menu screen including the event loop and button functionality.
+
+        Returns:
+            (list) : the next screen and its arguments, or None to quit
         '''            
         # clear screen and set background color
         self.screen.fill((255,255,255))
@@ -97,109 +80,141 @@ class Application:
         # create ui elements
         song_select_button = Button(self, text='Song Select', text_size=22, position=[768,288], dimensions=[300,75], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
         options_button     = Button(self, text='Options'    , text_size=22, position=[768,378], dimensions=[300,75], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
-        buttons = [[song_select_button, self._songSelectScreen], # add button and the corresponding function to a list
-                   [options_button    , self._optionsScreen   ]]
+        buttons = [[song_select_button, [self._songSelectScreen]], # add button and the corresponding screen to a list
+                   [options_button    , [self._optionsScreen   ]]]
         if self.user.get_username(): # if the user is signed in there is no need to have a login button
-            text = self.font['30'].render(f'Logged in as: {self.user.get_username()}', True, (0,0,0)) # show logged in as text
+            text = render_text(f'Logged in as: {self.user.get_username()}', 30) # show logged in as text
             self.screen.blit(text, (15, 675))
             quit_button = Button(self, text='Quit', text_size=22, position=[768,468], dimensions=[300,75], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
-            buttons.append([quit_button, self.quit])
+            buttons.append([quit_button, None]) # None quits
         else:
             login_button = Button(self, text='Log In', text_size=22, position=[698,468], dimensions=[160,75], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
             quit_button  = Button(self, text='Quit'  , text_size=22, position=[856,468], dimensions=[125,75], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
-            buttons.append([login_button, self._logInScreen])
-            buttons.append([quit_button , self.quit        ])
+            buttons.append([login_button, [self._logInScreen]])
+            buttons.append([quit_button , None             ])
 
         # render title text
-        title = self.font['70'].render('Music Maestro', True, (0,0,0))
+        title = render_text('Music Maestro', 70)
         self.screen.blit(title, (190, 135))
             
         # event loop
         while True:
+            events = self.loop.poll() # wait for something to happen
             mouse_pos = pygame.mouse.get_pos() # get mouse position as a tuple
-            for event in pygame.event.get(): # iterate through all current pygame events 
+            for event in events: # iterate through all current pygame events 
                 if event.type == QUIT:
                     return self.quit() # end the program if the quit event is performed
 
                 if event.type == MOUSEBUTTONDOWN:
                     for button in buttons:
                         if button[0].check(mouse_pos):
-                            button[1]()
-                            return
+                            if button[1] is None:
+                                return self.quit()
+                            return button[1]
                     
             for button in buttons:
                 button[0].check(mouse_pos)
                 
-            pygame.display.flip() # update screen
+            self.loop.present() # update screen
+            self.startup.report('./assets/traces/startup.txt') # only reports the first time the menu is shown
         return
 
     def _songSelectScreen(self):
         '''
-        Handle the song select screen including the event loop, buttons and scroll bar functionality.
+        Handle the song select screen including the event loop, buttons, search, filter and scroll bar functionality.
+
+        Returns:
+            (list) : the next screen and its arguments, or None to quit
         '''
-        # background color
-        self.screen.fill((255,255,255))
+        def render_screen():
+            # background color
+            self.screen.fill((255,255,255))
 
-        # background image
+            # background image
+            self.screen.blit(background_image, (round(640-(background_image.get_size()[0]*.5)),round(360-(background_image.get_size()[1]*.5))))
+            self.screen.blit(self.overlay, (0,0))
+            
+            # title text
+            title = render_text('Song select', 50)
+            self.screen.blit(title, (490,36))
+            search_text = render_text('Search', 30)
+            self.screen.blit(search_text, (400,540))
+
+        def make_carousel():
+            # Only the songs matching the search and filter are shown, the scroll bar is remade to fit them
+            songs = self.library.query(search_input.get_value(), filters[0], sorts[0][1])
+            carousel = SongCarousel(self, songs, highscores=user_data, history=history)
+            render_screen()
+            scroll_bar = ScrollBar(self, dimensions=[1000,20], position=[640,504], scroll_length=carousel.get_scroll_length(), color=(153,217,234), alt_color=(0,162,232), clicked_color=(0,131,187))
+            filter_button = Button(self, text=f'Show: {filters[0] or "All"}', text_size=30, position=[920,620], dimensions=[180,60], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
+            sort_button = Button(self, text=f'Sort: {sorts[0][0]}', text_size=30, position=[1140,620], dimensions=[250,60], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
+            return carousel, scroll_bar, filter_button, sort_button
+
+        self.library.refresh(self.manifest['songs']) # Only songs added or changed since the last run have their header read
+        user_data = self.user.get_data() # Read once rather than for every tab
+        history = PerformanceHistory(self.user.get_username()) if user_data else None
         background_image = self.images['menu_background_f']
-        self.screen.blit(background_image, (round(640-(background_image.get_size()[0]*.5)),round(360-(background_image.get_size()[1]*.5))))
-        self.screen.blit(self.overlay, (0,0))
-        
-        # title text
-        title = self.font['50'].render('Song select', True, (0,0,0))
-        self.screen.blit(title, (490,36))
-
-        songs = self._loadFiles(t=['txt'])
-        for song in songs:
-            song[1] = song[1].split(' - ')
-        del songs[-1] # remove pseudocode.txt
+        filters = [None] + DIFFICULTIES # The first item of each list is the one in use, the buttons rotate them
+        sorts = [['Name','name'], ['Difficulty','difficulty'], ['Tempo','tempo'], ['Notes','notes']]
         
         # ui elements
-        song_tabs = []
-        for place,song in enumerate(songs,start=1):
-            if self.user.get_username():
-                user_data = self.user.get_data()
-                try:
-                    song_tabs.append(SongTab(self, start_pos=round(place*(250+25))-135, song=[songs[place-1][1][0],songs[place-1][1][1],songs[place-1][0]], highscore=user_data[songs[place-1][1][0]]))
-                except KeyError:
-                    song_tabs.append(SongTab(self, start_pos=round(place*(250+25))-135, song=[songs[place-1][1][0],songs[place-1][1][1],songs[place-1][0]], highscore=0))
-            else:
-                song_tabs.append(SongTab(self, start_pos=round(place*(250+25))-135, song=[songs[place-1][1][0],songs[place-1][1][1],songs[place-1][0]]))
+        search_input = TextInput(self, dimensions=(400, 40), position=(400,580), character_limit=24, allowed_characters=ascii_letters+digits+" '-", color=(153,217,234), active_color=(113,203,225))
         back_button = Button(self, text='Back', text_size=22, position=[128,648], dimensions=[160,75], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
-        scroll_bar = ScrollBar(self, dimensions=[1000,20], position=[640,504], scroll_length=round(275*len(song_tabs))-1025, color=(153,217,234), alt_color=(0,162,232), clicked_color=(0,131,187))
+        carousel, scroll_bar, filter_button, sort_button = make_carousel()
         
         # event loop
         while True:
+            events        = self.loop.poll()
             mouse_pos     = pygame.mouse.get_pos()
             mouse_clicked = pygame.mouse.get_pressed()[0]
-            pygame.draw.rect(self.screen, (255,255,255), (0,92,1280,400))
-            
-            scroll_bar.check(mouse_pos, mouse_clicked)               
-            back_button.check(mouse_pos)
-            for tab in song_tabs:
-                tab.set_x(scroll_bar.get_notch_position())
-                if -275 < tab.get_x() < 1280:
-                    tab.render()
-                    tab.button.check(mouse_pos)
-                      
-            for event in pygame.event.get():
+            for event in events:
                 if event.type == QUIT:
                     return self.quit()
                 if event.type == MOUSEBUTTONDOWN:
                     if back_button.check(mouse_pos):
-                        return self._menuScreen()
-                    for tab in song_tabs:
-                        if tab.button.check(mouse_pos):
-                            return self._performanceScreen(tab.song)
-                        
+                        return [self._menuScreen]
+                    if filter_button.check(mouse_pos):
+                        filters.append(filters.pop(0))
+                        carousel, scroll_bar, filter_button, sort_button = make_carousel()
+                    elif sort_button.check(mouse_pos):
+                        sorts.append(sorts.pop(0))
+                        carousel, scroll_bar, filter_button, sort_button = make_carousel()
+                    else:
+                        song = carousel.check(mouse_pos)
+                        if song:
+                            return [self._performanceScreen, song]
+                if event.type == KEYDOWN:
+                    search = search_input.get_value()
+                    if event.unicode:
+                        search_input.key_press(event.unicode, key_type='char')
+                    else:
+                        search_input.key_press(event.key, key_type='action')
+                    if search_input.get_value() != search: # Search as the user types
+                        carousel, scroll_bar, filter_button, sort_button = make_carousel()
+
+            # Drawn after the events, so a new search or filter is shown straight away
+            pygame.draw.rect(self.screen, (255,255,255), (0,92,1280,400))
+            
+            scroll_bar.check(mouse_pos, mouse_clicked)               
+            back_button.check(mouse_pos)
+            filter_button.check(mouse_pos)
+            sort_button.check(mouse_pos)
+            search_input.check(mouse_pos, mouse_clicked)
+            carousel.set_x(scroll_bar.get_notch_position()) # Only the tabs on screen exist
+            carousel.render(mouse_pos)
+
             pygame.draw.rect(self.screen, (255,255,255,255), (0,115,140,365))
             pygame.draw.rect(self.screen, (255,255,255,255), (1140,115,1280,365))
-            pygame.display.flip()  
+            self.loop.present()
         return
 
+
     def _optionsScreen(self):
         '''
         Handle the main menu screen including the event loop, buttons and slider functionality.
+
+        Returns:
+            (list) : the next screen and its arguments, or None to quit
         '''
         def render_screen():
             # background color
@@ -210,20 +225,27 @@ class Application:
             self.screen.blit(self.overlay, (0,0))
             
             # title text
-            title = self.font['50'].render('Options', True, (0,0,0))
+            title = render_text('Options', 50)
             self.screen.blit(title, (490,36))
 
-            title = self.font['40'].render('Calibrate Microphone', True, (0,0,0))
+            title = render_text('Calibrate Microphone', 40)
             self.screen.blit(title, (100,100))
 
-            title = self.font['40'].render('User Account', True, (0,0,0))
+            title = render_text('User Account', 40)
             self.screen.blit(title, (750,100))
 
             # ui elements
             back_button = Button(self, text='Back', text_size=22, position=[128,648], dimensions=[160,75], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
             calibration_button = Button(self, text='Calibrate', text_size=20, position=[300,200], dimensions=[200,60], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
-            buttons = [[back_button,self._menuScreen],
-                       [calibration_button, calibrate_microphone]]
+            pitch_engine_button = Button(self, text=f'Engine: {self.audio.pitch_engine.name.upper()}', text_size=24, position=[300,275], dimensions=[240,60], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
+            buttons = [[back_button,[self._menuScreen]], # a list is a screen to go to, a function is called and returns the new buttons
+                       [calibration_button, calibrate_microphone],
+                       [pitch_engine_button, cycle_pitch_engine]]
+
+            if self.audio.pitch_engine.frames_analysed: # Show how expensive the engine has been so far
+                cost_text = render_text(f'{self.audio.pitch_engine.cost()*1000:.3f} ms per frame', 20)
+                self.screen.blit(cost_text, (200,310))
+
             if self.user.get_username():
                 logout_button = Button(self, text='Log Out', text_size=20, position=[875,200], dimensions=[180,60], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
                 delete_account_button = Button(self, text='Delete Account', text_size=26, position=[875,275], dimensions=[250,60], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
@@ -231,72 +253,82 @@ class Application:
                 buttons.append([delete_account_button, delete_account])
             else:
                 login_button = Button(self, text='Log In', text_size=22, position=[875,200], dimensions=[160,75], color=(153,217,234), alt_color=(0,162,232), hover_color=(113,203,225), text_color=(255,255,255))
-                buttons.append([login_button, self._logInScreen])
+                buttons.append([login_button, [self._logInScreen]])
             return buttons
             
         def calibrate_microphone():             
+            calibrator = Calibrator(self.audio)
             for note in self.notes.keys():
-                title_text = self.font['40'].render('Please play the following note once:', True, (0,0,0))
-                note_text = self.font['400'].render(note, True, (0,0,0))
+                title_text = render_text('Please play the following note once:', 40)
+                note_text = render_text(note, 400)
 
                 self.screen.fill((255,255,255))
                 self.screen.blit(title_text, (490,36))
                 self.screen.blit(note_text, (0,25))
-                pygame.display.flip()
-
-                tick = 0
-                buffering = True
-                buffer = {}
-                while buffering:
-                    self.clock.tick(60)
-                    tick += 1
-
-                    if tick < 40:
-                        self.audio.stream()
-                        for frequency in self.audio.get_dominant_frequencies().tolist():
-                            buffer[str(frequency)] = buffer.get(str(frequency),0) + 1 # Creates a dictionary of how many times each dominant frequency appears in the timeframe
-                    else:
-                        buffering = False
-                        try:
-                            del buffer['1.0'] # Erroneous value that should be removed
-                        except KeyError:
-                            pass # Ignore error raised if the value is not found
-                        buffer_mode = sorted(zip(buffer.values(),buffer.keys()),reverse=True)[:3] # zip([A,B,C],[x,y,z])=[(A,x),(B,y),(C,z)] , sorted([2,87,1,9,2,4,56,8,0])=[0,1,2,2,4,8,9,56,87] --> Extract top 3 most frequent frequencies
-                        self.notes[note] = [int(float(freq[1])) for freq in buffer_mode]
-                        
-                    for event in pygame.event.get():
+                self.loop.present()
+
+                progress_rect = pygame.Rect(340,620,600,30)
+                calibrator.start()
+                while not calibrator.update(): # Only analyses the audio captured since the last frame, so the screen keeps responding
+                    events = self.loop.poll(fps=60) # the prompt is listening, so keep polling rather than waiting for events
+                    for event in events:
                         if event.type == QUIT:
                             return self.quit()
-            self._optionsScreen()
+
+                    pygame.draw.rect(self.screen, (153,217,234), progress_rect)
+                    pygame.draw.rect(self.screen, (0,162,232), (progress_rect.left, progress_rect.top, round(progress_rect.width*calibrator.progress()), progress_rect.height))
+                    self.loop.present([progress_rect])
+
+                if calibrator.result(): # Keep the previous frequencies if only silence was heard
+                    self.notes[note] = calibrator.result()
+            self.classifier = NoteClassifier(self.notes)
+            self.detector.set_classifier(self.classifier)
+            if self.user.get_username():
+                self._saveCalibration()
+            return render_screen()
             
+        def cycle_pitch_engine():
+            names = list(PITCH_ENGINES.keys())
+            self.audio.set_pitch_engine(names[(names.index(self.audio.pitch_engine.name)+1) % len(names)]) # Select the next engine, wrapping back to the first
+            self._loadCalibration() # Each engine reports slightly different frequencies, so has its own calibration
+            buttons = render_screen()
+            return buttons
+
         def user_logout():
             self.user = User()
+            self._loadCalibration() # Back to the default frequencies
             buttons = render_screen()
             return buttons
 
         def delete_account():
+            PerformanceHistory(self.user.get_username()).remove()
             self.user.remove()
             return user_logout()
         
-        background_image = choice(self.backgrounds)
+        background_image = self.images[choice(self.backgrounds)]
         buttons = render_screen()            
         
         # event loop
         while True:
+            events = self.loop.poll()
             mouse_pos = pygame.mouse.get_pos()
-            for event in pygame.event.get():
+            for event in events:
                 if event.type == QUIT:
                     return self.quit()
                 if event.type == MOUSEBUTTONDOWN:
                     for button in buttons:
                         if button[0].check(mouse_pos):
+                            if isinstance(button[1], list):
+                                return button[1]
                             buttons = button[1]()
+                            if buttons is None: # the window was closed during calibration
+                                return None
                             break
         
             for button in buttons:
                 button[0].check(mouse_pos)
             
-            pygame.display.flip()
+            self.loop.present()
         return
 
 
@@ -305,7 +337,7 @@ class Application:
         Handle the log in screen including the event loop, buttons and text box functionality.
 
         Returns:
-            self._menuScreen (bound method) : returns to the main menu
+            (list) : the next screen and its arguments, or None to quit
         '''
         def render_screen():
             # background color
@@ -316,36 +348,38 @@ class Application:
             self.screen.blit(self.overlay, (0,0))
             
             # title text
-            title = self.font['50'].render('Log in', True, (0,0,0))
+            title = render_text('Log in', 50)
             self.screen.blit(title, (565,36))
 
-            username_text = self.font['40'].render('Username', True, (0,0,0))
+            username_text = render_text('Username', 40)
             self.screen.blit(username_text, (340,125))
             
-            username_text = self.font['40'].render('Password', True, (0,0,0))
+            username_text = render_text('Password', 40)
             self.screen.blit(username_text, (340,235))
         
         def login(username, password):
             error = self.user.validate(username, password)
             if not error:
-                return self._menuScreen()
+                self._loadCalibration()
+                return [self._menuScreen]
             else:
                 render_screen()
-                error_text = self.font['30'].render(error, True, (0,0,0))
+                error_text = render_text(error, 30)
                 self.screen.blit(error_text, (340,325))
             return
 
         def create_account(username, password):
             error = self.user.create(username, password)
             if not error:
-                return self._menuScreen()
+                self._loadCalibration() # A new account starts with the default frequencies
+                return [self._menuScreen]
             else:
                 render_screen()
-                error_text = self.font['30'].render(error, True, (0,0,0))
+                error_text = render_text(error, 30)
                 self.screen.blit(error_text, (340,325))
             return
         
-        background_image = choice(self.backgrounds)
+        background_image = self.images[choice(self.backgrounds)]
         render_screen()
         
         # ui elements
@@ -357,18 +391,23 @@ class Application:
 
         # event loop
         while True:
+            events        = self.loop.poll()
             mouse_pos     = pygame.mouse.get_pos()
             mouse_clicked = pygame.mouse.get_pressed()[0]
-            for event in pygame.event.get():
+            for event in events:
                 if event.type == QUIT:
                     return self.quit()
                 if event.type == MOUSEBUTTONDOWN:
                     if login_button.check(mouse_pos):
-                        login(username_input.get_value(), password_input.get_value())
+                        next_screen = login(username_input.get_value(), password_input.get_value())
+                        if next_screen:
+                            return next_screen
                     if create_account_button.check(mouse_pos):
-                        create_account(username_input.get_value(), password_input.get_value())
+                        next_screen = create_account(username_input.get_value(), password_input.get_value())
+                        if next_screen:
+                            return next_screen
                     if back_button.check(mouse_pos):
-                        return self._menuScreen()
+                        return [self._menuScreen]
                 if event.type == KEYDOWN:
                     if event.unicode:
                         username_input.key_press(event.unicode, key_type='char')
@@ -383,9 +422,9 @@ class Application:
             username_input.check(mouse_pos,mouse_clicked)
             password_input.check(mouse_pos,mouse_clicked)
             
-            pygame.display.flip()
+            self.loop.present()
         
-        return self._menuScreen()
+        return [self._menuScreen]
 
 
     def _performanceScreen(self,song):
@@ -394,233 +433,186 @@ class Application:
 
         Args:
             song (list) : details of the song to be run, consisting of song name, difficulty, and file address
+
+        Returns:
+            (list) : the next screen and its arguments, or None to quit
         '''
-        # Declare global variables, used in the sub-routines 
-        global Song, score, tempo, cleff, time_signature, key, song_length
-        global metronome, current_note, current_mic_note, tick, event, beats, note_buffer, note_played_data
-        global hitbox, metronome_offset
-        
-        def get_song_vars(song):
-            global Song, score, tempo, cleff, time_signature, key, song_length
-            global metronome, current_note, current_mic_note, tick, event, beats, note_buffer, note_played_data
-            # Variables from song file
-            with open(song[2], mode='r') as File:
-                song_contents = File.read().split('|') # Read the song file into a list
-            for i,bar in enumerate(song_contents):
-                song_contents[i] = bar.strip('\n').split(',') # Strip all newlines and split into individual notes
-            Song = SongParser(song_contents, self.images) # Load SongParser object  
-            tempo = int(song_contents[0][0].split('=')[1]) # Identify song variables
-            cleff = self.images[song_contents[0][1].split('=')[1]+'_cleff']
-            time_signature = song_contents[0][2].split('=')[1].split('/')
-            key = song_contents[0][3].split('=')[1]
-            if key not in ['C','Am']: # The key of C and Am have no special notation, so only load the key image if it is not C or Am
-                key = self.images[key+'_key_signature']
-            song_length = int(song_contents[0][4].split('=')[1])
-
-            # Miscellaneous variables
-            metronome = 'left'
-            current_mic_note = 'X'
-            current_note = 'Y'
-            score = 0
-            tick = 0
-            event = None
-            beats = 0
-            note_buffer = [Song.next_note()]
-            note_played_data = []
-            return
+        def layout_stave():
+            # Work out where the stationary music components go, the hitbox sits just right of the time signature
+            cleff_rect = cleff.get_rect(topleft=(0,310))
+            if key not in ['C','Am']: # The key of C and Am have no special notation, so there is no key signature to make room for
+                key_rect = key.get_rect(topleft=(cleff_rect.right-75,300))
+                time_signature_pos = key_rect.right
+            else:
+                key_rect = None
+                time_signature_pos = cleff_rect.right-50
+            time_signature_rect = beats_text.get_rect(topleft=(time_signature_pos,350))
+            hitbox = pygame.Rect((time_signature_rect.right+25,340), (50,200))
+            return cleff_rect, key_rect, time_signature_pos, hitbox
 
         def fade_from_white():
+            renderer.compose() # Draw the whole first frame once, then fade it in
+            frame = self.screen.copy()
+            overlay = pygame.Surface((1280,720))
+            overlay.fill((255,255,255))
             for i in range(200):
-                draw_background()
-
-                overlay = pygame.Surface((1280,720))
+                self.screen.blit(frame, (0,0))
                 overlay.set_alpha(round(255-(255/200)*i))
-                overlay.fill((255,255,255))
                 self.screen.blit(overlay, (0,0))
 
-                for event in pygame.event.get():
+                for event in self.loop.poll(fps=240):
                     if event.type == QUIT:
-                        return self.quit()
+                        return False
                     
-                pygame.display.flip()
-            return
-        
-        def draw_background():
-            global hitbox, metronome_offset
-
-            # Draw note fadeout gradient 
-            fadeout_steps = 50
-            fadeout_gradient = [pygame.Surface((int(275/fadeout_steps),720)) for i in range(fadeout_steps)] # 275 is the distance between left of screen to left of hitbox
-            for i,part in enumerate(fadeout_gradient):
-                part.set_alpha(260-int((255/len(fadeout_gradient))*(i+1)))
-                part.fill((255,255,255))
-                self.screen.blit(part, (part.get_rect().width*i,0))
-
-            # Draw text
-            title = self.font['30'].render('Now playing - {}'.format(song[0]), True, (0,0,0)) # Render the "Now playing" text 
-            score_text = self.font['60'].render('Score: {}'.format(score), True, (0,0,0)) # Render the score text
-            self.screen.blit(title, (0,0)) # Display the "Now playing" and score text
-            self.screen.blit(score_text, (0,40))
-
-            # Draw metronome
-            self.screen.blit(self.images['metronome_'+metronome], (50,150)) # Draw the metronome
-
-            # Draw stationary music components
-            cleff_rect = self.screen.blit(cleff, (0,310)) # Display the cleff
-            beats_text = self.font['80'].render(time_signature[0], True, (0,0,0)) # Display the time signature 
-            per_bar = self.font['80'].render(time_signature[1], True, (0,0,0))
-            if key not in ['C','Am']: # Display the key signature (the key of C and Am do not have any special notation so only do this if it is any other key signature)
-                key_rect = self.screen.blit(key,(cleff_rect.right-75,300))
-                time_signature_rect = self.screen.blit(beats_text, (key_rect.right,350))
-                self.screen.blit(per_bar, (key_rect.right,430))
+                self.loop.present()
+            self.screen.blit(frame, (0,0))
+            self.loop.present()
+            return True
+
+        def detect():
+            detection = self.detector.latest() # Latest note found by the detection worker, never waits for the analysis
+            if detection:
+                return detection[1]
+            return None
+
+        def profile_overlay():
+            # Table of the p50 and p99 time of each stage and the counters, drawn in columns as the font is not monospaced,
+            # followed by the state of the trace being recorded
+            rows = []
+            if show_profile:
+                stages, counters = PROFILER.stats()
+                rows += [['stage', 'p50 ms', 'p99 ms']]
+                rows += [[name, f'{p50*1000:.2f}', f'{p99*1000:.2f}'] for name, [count, p50, p99] in sorted(stages.items())]
+                rows += [[name, str(total), f'{rate:.0f}/s'] for name, [total, rate] in sorted(counters.items())]
+            rows += [[line] for line in trace_status[0]]
+            font = TEXT.font(18) # Rendered directly, the numbers change too often to be worth caching
+            surface = pygame.Surface((390, 10+22*len(rows)), SRCALPHA)
+            surface.fill((255,255,255,220))
+            for row_number, row in enumerate(rows):
+                for text, x in zip(row, (8,220,300)):
+                    heading = (show_profile and row_number == 0) or len(row) == 1 # Column headings and trace messages
+                    surface.blit(font.render(text, True, (0,131,187) if heading else (0,0,0)), (x,5+22*row_number))
+            return surface
+
+        def save_trace():
+            file_name = '{} {}.json'.format(song[0], time.strftime('%Y-%m-%d %H-%M-%S'))
+            saved = PROFILER.save_trace('./assets/traces/'+file_name)
+            PROFILER.enabled = show_profile
+            if saved:
+                trace_status[:] = [['Trace saved to assets/traces/', file_name], time.perf_counter()] # There is no console to print to
             else:
-                time_signature_rect = self.screen.blit(beats_text, (cleff_rect.right-50,350))
-                self.screen.blit(per_bar, (cleff_rect.right-50,430))
-            for i in range(0,200,40): # Draw the stave
-                pygame.draw.line(self.screen, (0,0,0), (100,360+i), (1280,360+i), 5)
-                
-            hitbox = pygame.Surface((50,200)) # Create the hitbox for note detection
-            hitbox.set_alpha(200)
-            hitbox.fill((153,217,234))
-            hitbox = self.screen.blit(hitbox, (time_signature_rect.right+25,340))
-            metronome_offset = round(((self.screen.get_width()-hitbox.left)/(tempo/20))/(60**2/tempo))
-            return
-
-        def run_audio_stream():
-            while True:
-                self.audio.stream()
-                if event != 'playing':
-                    break
-            return                
-
-        get_song_vars(song)
-        fade_from_white()
+                trace_status[:] = [['Trace could not be saved,', 'assets/traces/ is not writable'], time.perf_counter()]
+
+        # Song variables
+        compiled_song = compile_song(song[2]) # Compiled once and cached until the song file changes
+        header = compiled_song.header
+        cleff = self.images[header['cleff']+'_cleff']
+        time_signature = header['time_signature']
+        key = header['key']
+        if key not in ['C','Am']: # The key of C and Am have no special notation, so only load the key image if it is not C or Am
+            key = self.images[key+'_key_signature']
+        beats_text = render_text(time_signature[0], 80)
+        per_bar = render_text(time_signature[1], 80)
+        cleff_rect, key_rect, time_signature_pos, hitbox = layout_stave()
+        session = PerformanceSession(song, compiled_song, images=self.images, hitbox=[hitbox.left, hitbox.right])
+
+        # Layers, drawn bottom first. The stave is rendered once and sits over the notes so they fade out to the left
+        strip = ScoreStrip() # The notes, drawn once each onto a scrolling strip
+        stave = StaveLayer((1280,720), cleff, cleff_rect, key_rect and key, key_rect, beats_text, per_bar, time_signature_pos, hitbox)
+        countdown  = HudItem((500,10))
+        mic_note   = HudItem((975,675))
+        title      = HudItem((0,0))
+        score_text = HudItem((0,40))
+        metronome  = HudItem((50,150))
+        profile    = HudItem((880,10)) # Stage timings, toggled with F3
+        title.set(render_text('Now playing - {}'.format(song[0]), 30))
+        score_text.set(render_text('Score: {}'.format(session.score), 60))
+        metronome.set(self.images['metronome_'+session.metronome])
+        renderer = LayeredRenderer(self.screen, [strip.draw, countdown.draw, mic_note.draw, stave.draw, title.draw, score_text.draw, metronome.draw, profile.draw], present=self.loop.present)
+
+        # The song is timed by the audio captured where there is a microphone, otherwise by the monotonic clock,
+        # so it keeps time whatever frame rate the screen manages. The 4 second countdown is 240 frames long.
+        clock = SampleClock(self.audio) if self.audio.audio_stream and self.audio.callback else time.perf_counter
+        scheduler = BeatScheduler(session, clock=clock, lead_in=240)
+
+        event = None
+        notes_rects = [] # Areas the notes were drawn over last frame
+        show_profile = PROFILER.enabled
+        profile_updated = 0 # When the overlay was last redrawn
+        trace_status = [[], 0] # Lines about the trace shown in the overlay, and when they were set
+        if not fade_from_white(): # The window was closed during the fade
+            return self.quit()
+        scheduler.start()
         while True:
-            self.clock.tick(60)
-            self.screen.fill((255,255,255)) # Fill the screen completely white
-            tick += 1
-            if event != 'playing' and tick % 60 == 0:
-                event = self.font['500'].render(str(4-(tick//60)), True, (0,0,0)) # Render countdown text
-                if not 4-(tick//60):
-                    tick = 0
+            events = self.loop.poll(fps=120) # Only limits the frame rate, the scheduler works out how far the song has got
+            tick = int(scheduler.frames())
+            if event != 'playing' and tick >= 60:
+                event = render_text(str(4-(tick//60)), 500) # Render countdown text
+                if 4-(tick//60) <= 0:
                     event = 'playing'
-                    stream_thread = threading.Thread(target=run_audio_stream)
-                    stream_thread.start()
+                    self.detector.start()
                     
             if event and event != 'playing':
-                self.screen.blit(event, (500,10))
+                renderer.invalidate(*countdown.set(event))
             elif event == 'playing':
-
-                if tick % (60**2/tempo) == 0:
-                    note_buffer[-1]['long_duration_bool'] += 1
-
-                if (tick-(3*metronome_offset)) % (60**2/tempo) == 0:
-                    beats += 1
-                    if metronome == 'left':
-                        metronome = 'right'
-                    else:
-                        metronome = 'left'
-                
-                if tick:
-                    if tick % round((60**2/tempo)*note_buffer[-1]['note_length']) == 0 and note_buffer[0]:
-                        if Song.end_of_bar:
-                            note_buffer.append({'pos': 1280,
-                                                'note_length': note_buffer[-1]['note_length'],
-                                                'note_name': 'X',
-                                                'long_duration_bool': 0,
-                                                'played': 5,
-                                                'note_img_offset':0,
-                                                'note_img': [None, 0]})
-                            Song.end_of_bar = False
-                        else:
-                            if note_buffer[-1]['note_length'] > 1:
-                                if note_buffer[-1]['long_duration_bool'] == note_buffer[-1]['note_length']:
-                                    note_buffer.append(Song.next_note())
-                                else:
-                                    tick += 60**2/tempo
-                            else:
-                                note_buffer.append(Song.next_note())
-
-                        if Song.end_of_bar:
-                            note_buffer[-1]['note_length'] /= 2
-                            
-                        if note_buffer[-1] == None: # End of the song is reached
-                            del note_buffer[-1]
-                            note_buffer.insert(0,None)
-                            
-                    if tick > 10:
-                        current_mic_frequencies = self.audio.get_dominant_frequencies()
-                        current_mic_note = self.audio.get_note_from_frequency(self.notes, current_mic_frequencies)
-                        note = self.font['30'].render(f'Detected note: {current_mic_note}', True, (0,0,0))
-                        self.screen.blit(note, (975,675))
-
-                if current_note in current_mic_note.split('/'):
-                    for note in note_buffer:
-                        if note:
-                            if note['note_name'][-1] == 'n':
-                                note_name = note['note_name'][0]
-                            else:
-                                note_name = note['note_name'][0] + note['note_name'][-1]
-                                
-                            if note_name == current_note:
-                                note['played'] -= 1
-                                break
-                        
-                for i,note in enumerate(note_buffer):
-                    if note:
-                        note['pos'] -= tempo/20                        
-                        if hitbox.left < note['pos'] < hitbox.right:
-                            if note['note_name'][-1] == 'n':
-                                current_note = note['note_name'][0]
-                            else:
-                                current_note = note['note_name'][0] + note['note_name'][-1]
-                        elif note['pos'] < hitbox.left-40:
-                            note['played'] = 2**40
-                            
-                        if note['played'] <= 0:
-                            note['pos'] = -40
-                            current_note = 'X'
-                            score += 1            
-                            
-                        for j,part in enumerate(list(note.keys())[6:]):
-                            if j:
-                                self.screen.blit(note[part][0], (note['pos']-25,note[part][1]))
-                            else:
-                                if note[part][0]:
-                                    self.screen.blit(note[part][0], (note['pos'],note[part][1]))
-                                    if note[part][1]+note['note_img_offset'] > 540:
-                                        for k in range(((note[part][1]+note['note_img_offset'])-520)//40):
-                                            pygame.draw.line(self.screen, (0,0,0), (note['pos']-10,560+(40*k)), (note['pos']+60,560+(40*k)), 5)
-                                    elif note[part][1] < 340:
-                                        for k in range(((360-(note[part][1]+note['note_img_offset']))//40)):
-                                            pygame.draw.line(self.screen, (0,0,0), (note['pos']-10,320-(40*k)), (note['pos']+60,320-(40*k)), 5)
-                                else:
-                                    pygame.draw.line(self.screen, (0,0,0), (note['pos'],360), (note['pos'],520), 4)
-                            
-                        if note['pos'] <= -40:
-                            del note_buffer[i] # Delete the note when it's x-position is off screen
-                            if note['note_name'] != 'X':
-                                note_played_data.append(round(100*(score/(len(note_played_data)+1)))) # Percent of notes played correctly out of all the notes so far
-                        else:
-                            note_buffer[i] = note
-                
-                if note_buffer == [None]:
+                renderer.invalidate(*countdown.set(None))
+                with PROFILER.span('session steps'):
+                    steps, phase = scheduler.advance(detect) # Catches up if the last frame was slow
+                if steps > 1:
+                    PROFILER.count('frames dropped', steps-1)
+                if session.tick > 11: # The detected note is shown once detection has started
+                    renderer.invalidate(*mic_note.set(render_text(f'Detected note: {session.current_mic_note}', 30)))
+                with PROFILER.span('score strip'):
+                    strip.advance(steps*session.tempo/20) # The notes move tempo/20 pixels left each step
+                    strip.phase = phase*session.tempo/20 # Draw the notes where they are between steps
+                    strip.update(session.note_buffer)
+                    new_notes_rects = strip.bounds()
+                renderer.invalidate(*notes_rects, *new_notes_rects) # Clear where the notes were and draw where they are
+                notes_rects = new_notes_rects
+                renderer.invalidate(*score_text.set(render_text('Score: {}'.format(session.score), 60)))
+                renderer.invalidate(*metronome.set(self.images['metronome_'+session.metronome]))
+
+                if session.complete:
                     event = 'complete'
-                    stream_thread.join()
-                    return self._analysisScreen([song[0], score, round(100*(score/song_length)), song_length, note_played_data])
+                    self.detector.stop()
+                    if PROFILER.tracing:
+                        save_trace()
+                    return [self._analysisScreen, session.result(), session.note_records]
               
-            for e in pygame.event.get():
+            for e in events:
                 if e.type == QUIT:
                     return self.quit()
                 if e.type == KEYDOWN:
                     if e.key == K_ESCAPE:
                         if event == 'playing':
                             event = 'complete'
-                            stream_thread.join()
-                            return self._menuScreen()
-                    
-            draw_background()
-            pygame.display.flip()
+                            self.detector.stop()
+                            if PROFILER.tracing:
+                                save_trace()
+                            return [self._menuScreen]
+                    if e.key == K_F3:
+                        if e.mod & KMOD_SHIFT: # Shift+F3 starts recording a trace, or saves the one being recorded
+                            if PROFILER.tracing:
+                                save_trace()
+                            else:
+                                PROFILER.start_trace()
+                                trace_status[:] = [['Recording trace, Shift+F3 to save'], time.perf_counter()]
+                            profile_updated = 0 # Show the change straight away
+                        else:
+                            show_profile = not show_profile
+                            PROFILER.enabled = show_profile or PROFILER.tracing
+                            profile_updated = 0
+
+            if trace_status[0] and not PROFILER.tracing and time.perf_counter()-trace_status[1] > 5: # The saved message is shown for 5 seconds
+                trace_status[:] = [[], 0]
+                profile_updated = 0
+            if time.perf_counter()-profile_updated > .25: # Redrawn a few times a second so it can be read
+                profile_updated = time.perf_counter()
+                renderer.invalidate(*profile.set(profile_overlay() if show_profile or trace_status[0] else None))
+
+            PROFILER.count('frames')
+            with PROFILER.span('draw'):
+                renderer.update() # Only the changed parts of the screen are redrawn and pushed to the display
 
         # As each note collides with the hitbox, set "current note" to the note value, or None if a rest
         # If some function current_note_being_played() == current_note, then they successfully played it
@@ -629,12 +621,17 @@ class Application:
         # current_note_being_played() should also have a None value if no note is detected
         return
 
-    def _analysisScreen(self, score):
+    def _analysisScreen(self, score, note_records=None):
         '''
         Display song performance scores, and graph to show where the errors in the performance occurred.
 
         Args:
-            score (list) : 
+            score        (list) : song name, score, percent, song length and the accuracy after each note, as returned by PerformanceSession.result
+            note_records (list) : each note's result, PerformanceSession.note_records, saved to the user's history
+                                  default: None
+
+        Returns:
+            (list) : the next screen and its arguments, or None to quit
         '''
         def graph(total_notes, percents):
             # Draw graph details
@@ -653,19 +650,19 @@ class Application:
             if min_percent == 100: # Prevent axis from having only one value on it
                 min_percent = 90 
             for i in range(0,(100-min_percent)+10,10): # Calculate positions of and display graph y-axis label text
-                text = self.font['20'].render(f'{i+min_percent}%', True, (0,0,0))
+                text = render_text(f'{i+min_percent}%', 20)
                 self.screen.blit(text, (590,y(i+min_percent))) 
 
             x_positions = []
             for i in range(total_notes): # Calculate positions of and display graph x-axis label text
                 if total_notes <= 20 or i==0 or i==total_notes-1: 
-                    text = self.font['20'].render(str(i+1), True, (0,0,0))
+                    text = render_text(str(i+1), 20)
                     self.screen.blit(text, (x(i),640))
                 x_positions.append(x(i)+6)
 
-            y_label = self.font['30'].render('Accuracy', True, (0,0,0)) # Label text for y-axis
+            y_label = render_text('Accuracy', 30) # Label text for y-axis
             self.screen.blit(y_label, (450,350))
-            x_label = self.font['30'].render('Note count', True, (0,0,0)) # Label text for x-axis
+            x_label = render_text('Note count', 30) # Label text for x-axis
             self.screen.blit(x_label, (830,660))
 
             # Plot points
@@ -684,15 +681,15 @@ class Application:
         self.screen.fill((255,255,255))
 
         # background image
-        background_image = choice(self.backgrounds)
+        background_image = self.images[choice(self.backgrounds)]
         self.screen.blit(background_image, (round(640-(background_image.get_size()[0]*.5)),round(360-(background_image.get_size()[1]*.5))))
         self.screen.blit(self.overlay, (0,0))
         
         # title text
-        title = self.font['50'].render('Song Performance', True, (0,0,0))
-        song_name_text = self.font['40'].render(f'Song name: {score[0]}', True, (0,0,0))
-        score_text = self.font['40'].render(f'Score: {score[1]}', True, (0,0,0))
-        percent_text  = self.font['40'].render(f'Percent: {score[2]}%', True, (0,0,0))
+        title = render_text('Song Performance', 50)
+        song_name_text = render_text(f'Song name: {score[0]}', 40)
+        score_text = render_text(f'Score: {score[1]}', 40)
+        percent_text  = render_text(f'Percent: {score[2]}%', 40)
         self.screen.blit(title, (490,36))
         self.screen.blit(song_name_text, (25,86))
         self.screen.blit(score_text, (25,126))
@@ -711,38 +708,80 @@ class Application:
                 user_data[score[0]] = score[2]
             finally:
                 self.user.save(user_data)
-                highscore_text = self.font['40'].render('High score: {0}%'.format(user_data[score[0]]), True, (0,0,0))
+                highscore_text = render_text('High score: {0}%'.format(user_data[score[0]]), 40)
                 self.screen.blit(highscore_text, (25,210))
+
+            # performance history, only the running aggregates are read
+            history = PerformanceHistory(self.user.get_username())
+            if note_records is not None:
+                history.record(score, note_records)
+            song_stats = history.song_stats(score[0])
+            if song_stats:
+                average_text = render_text('Average: {0:.0f}% over {1} plays'.format(song_stats['mean'], song_stats['plays']), 30)
+                recent_text = render_text('Recent: ' + ', '.join(f'{percent}%' for percent in song_stats['recent'][-5:]), 30)
+                self.screen.blit(average_text, (25,270))
+                self.screen.blit(recent_text, (25,305))
+                if song_stats['most_missed']:
+                    missed_text = render_text('Most missed: ' + ', '.join(note for note, count in song_stats['most_missed']), 30)
+                    self.screen.blit(missed_text, (25,340))
                 
         if score[2] > 1: # Only show graph if song contains more than one note to avoid division by zero error
             graph(score[3],score[4])
         # event loop
         while True:
+            events        = self.loop.poll()
             mouse_pos     = pygame.mouse.get_pos()
             mouse_clicked = pygame.mouse.get_pressed()[0]
-            for event in pygame.event.get():
+            for event in events:
                 if event.type == QUIT:
                     return self.quit()
                 if event.type == MOUSEBUTTONDOWN:
                     if back_button.check(mouse_pos):
-                        return self._menuScreen()
+                        return [self._menuScreen]
                     
             back_button.check(mouse_pos)
             
-            pygame.display.flip()
+            self.loop.present()
         return
     
+    def _loadCalibration(self):
+        '''
+        Use the logged in user's saved microphone calibration for the selected pitch engine, or the default frequencies if
+        nobody is logged in or they have not calibrated this engine, so one engine or user never uses another's calibration.
+        '''
+        user_data = self.user.get_data() or {}
+        notes = user_data.get('calibration', {}).get(self.audio.pitch_engine.name) or {}
+        self.notes = dict(DEFAULT_NOTES, **notes)
+        self.classifier = NoteClassifier(self.notes)
+        self.detector.set_classifier(self.classifier)
+        return
+
+    def _saveCalibration(self):
+        '''
+        Save the microphone calibration for the selected pitch engine with the logged in user, so it is loaded at login.
+        '''
+        user_data = self.user.get_data()
+        user_data.setdefault('calibration', {})[self.audio.pitch_engine.name] = self.notes
+        self.user.save(user_data)
+        return
+
     def run(self):
         '''
         Higher level initilization of the program.
+        Each screen returns the next screen to show and its arguments, rather than calling it, so navigating never grows the stack.
         '''
-        self._menuScreen()
+        screen = [self._menuScreen]
+        while screen: # None means the program was quit
+            self.loop.enter(screen[0].__name__)
+            screen = screen[0](*screen[1:])
         return
 
     def quit(self):
         '''
         End all PyGame processes and close the PyGame window.
         '''
+        self.loop.report('./assets/traces/screens.txt') # CPU and frame statistics of each screen, there is no console to print them to
+        TEXT.clear() # Cached fonts and text are invalid once the font module is shut down
         pygame.font.quit()
         pygame.quit()
         return
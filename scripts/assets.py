@@ -0,0 +1,188 @@
+try:
+    import json
+    import os
+    import time
+    from collections.abc import Mapping
+    from scripts.files import write_json, write_lines
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+try:
+    import pygame
+except ImportError: # Only needed to load images, the manifest itself can be built without it
+    pygame = None
+
+MANIFEST_VERSION = 2
+IMAGE_TYPES = ['png','jpg']
+SONG_TYPES  = ['txt']
+FONT_TYPES  = ['ttf']
+DATA_FOLDERS = ['users','traces'] # Written to while the program runs and hold no assets, so they are left out of the manifest
+
+def _directory_mtimes(root):
+    '''
+    Find the modification time of every asset folder below root, skipping hidden folders and DATA_FOLDERS.
+    A folder's modification time changes whenever a file or folder directly inside it is added, removed or renamed.
+    Root itself is left out, see _root_entries.
+
+    Args:
+        root   (str) : folder to search
+
+    Returns:
+        mtimes (dict) : folder address: modification time
+    '''
+    mtimes = {}
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(folder for folder in dirs if not folder.startswith('.') and folder not in DATA_FOLDERS)
+        if directory != root:
+            mtimes[directory] = os.path.getmtime(directory)
+    return mtimes
+
+def _root_entries(root):
+    '''
+    List the asset files and folders directly inside root. Root is checked by what it contains rather than its modification
+    time, as the program writes other files there while it runs (e.g. buffer.wav and the traces folder).
+
+    Args:
+        root    (str) : assets folder
+
+    Returns:
+        entries (list) : names of the asset files and folders, sorted
+    '''
+    entries = []
+    for entry in os.scandir(root):
+        if entry.name.startswith('.') or entry.name in DATA_FOLDERS:
+            continue
+        if entry.is_dir() or os.path.splitext(entry.name)[1][1:].lower() in IMAGE_TYPES+SONG_TYPES+FONT_TYPES:
+            entries.append(entry.name)
+    return sorted(entries)
+
+def build_manifest(root='./assets'):
+    '''
+    Index the assets folder, mapping logical names (file names without their extension) to file addresses.
+    Files are visited in sorted order, so when two files share a name (e.g. half_note.jpg and half_note.png) the last one is used.
+
+    Args:
+        root      (str) : assets folder
+                          default: './assets'
+
+    Returns:
+        manifest (dict) : version, root's entries, folder modification times, and the images, songs and fonts found
+    '''
+    manifest = {'version':MANIFEST_VERSION,
+                'root'   :_root_entries(root),
+                'mtimes' :_directory_mtimes(root),
+                'images' :{},
+                'songs'  :[],
+                'fonts'  :{}}
+    for directory in [root] + list(manifest['mtimes']):
+        for file in sorted(os.listdir(directory)):
+            name, extension = os.path.splitext(file)
+            extension = extension[1:].lower()
+            path = os.path.join(directory, file)
+            if extension in IMAGE_TYPES:
+                manifest['images'][name] = path
+            elif extension in SONG_TYPES:
+                manifest['songs'].append([path, name])
+            elif extension in FONT_TYPES:
+                manifest['fonts'][name] = path
+    manifest['songs'].sort(key=lambda song: song[1])
+    return manifest
+
+def load_manifest(root='./assets', cache_path=None):
+    '''
+    Read the cached asset manifest, rebuilding it if any folder under root has changed since it was written.
+    Checking costs one stat per folder, rather than a walk over every file. The cache is kept outside root, as writing it
+    inside would change root's modification time and make the next check fail.
+
+    Args:
+        root       (str) : assets folder
+                           default: './assets'
+        cache_path (str) : location of the cached manifest
+                           default: '.cache/manifest.json' in the folder containing root
+
+    Returns:
+        manifest  (dict) : see build_manifest
+    '''
+    cache_path = cache_path or os.path.join(os.path.dirname(os.path.abspath(root)), '.cache', 'manifest.json')
+    try:
+        with open(cache_path, 'r') as file:
+            manifest = json.load(file)
+        if (manifest['version'] == MANIFEST_VERSION and manifest['root'] == _root_entries(root)
+            and all(os.path.getmtime(directory) == mtime for directory, mtime in manifest['mtimes'].items())):
+            return manifest
+    except (OSError, ValueError, KeyError): # Missing, unreadable or out of date cache, or a folder was removed
+        pass
+    manifest = build_manifest(root)
+    write_json(cache_path, manifest) # If it can't be written the manifest is just rebuilt every start
+    return manifest
+
+class ImageStore(Mapping):
+    def __init__(self, paths):
+        '''
+        A dictionary of images that are only loaded from disk the first time they are looked up.
+        Images are converted to the display's pixel format, so the display mode must be set before the first lookup.
+
+        Args:
+            paths (dict) : image name: file address, e.g. manifest['images']
+        '''
+        self.paths  = paths
+        self.loaded = {} # image name: pygame.Surface
+
+    def __getitem__(self, name):
+        image = self.loaded.get(name)
+        if image is None:
+            path = self.paths[name] # KeyError for unknown images, like a dict
+            image = pygame.image.load(path)
+            if path.lower().endswith('.png'): # PNGs may be transparent
+                image = image.convert_alpha()
+            else:
+                image = image.convert()
+            self.loaded[name] = image
+        return image
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+class StartupTimer:
+    def __init__(self):
+        '''
+        Record how long each stage of startup takes, up to the first frame being shown.
+        '''
+        self.start  = time.perf_counter()
+        self.last   = self.start
+        self.stages = [] # [stage name, seconds]
+        self.reported = False
+
+    def mark(self, stage):
+        '''
+        Mark the end of a startup stage.
+
+        Args:
+            stage (str) : name of the stage that just finished
+        '''
+        now = time.perf_counter()
+        self.stages.append([stage, now-self.last])
+        self.last = now
+
+    def report(self, path):
+        '''
+        Mark the first frame as shown and write the time taken by each stage to a text file, only the first time it is called.
+        The program has no console to print to, so the report is kept with the profiler traces.
+
+        Args:
+            path (str) : location of the text file, replaced each start
+        '''
+        if self.reported:
+            return
+        self.mark('first frame')
+        self.reported = True
+        lines = [f'{stage:<20}{1000*seconds:8.1f} ms' for stage, seconds in self.stages]
+        lines.append(f'{"time to first frame":<20}{1000*(self.last-self.start):8.1f} ms')
+        write_lines(path, lines) # Nothing is lost but the report if it can't be written
+
+if __name__ == '__main__':
+    print('Module not execuatable.')
+    raise SystemExit
@@ -1,103 +1,251 @@
 try:
     import numpy as np
+    import threading
+    import time as clock
     import wave
-    from scipy.io import wavfile
-    from pyaudio import PyAudio, paInt16
+    from scripts.profiler import PROFILER
 except ImportError as e: # most likely a ModuleNotFoundError
     raise Exception(f'Could not import a module: {e}.')
+try:
+    from pyaudio import PyAudio, paInt16, paContinue
+except ImportError: # Only needed to capture from a microphone, recordings can still be analysed without it
+    PyAudio = None
+
+# Frequency in Hz of each note before the microphone has been calibrated
+DEFAULT_NOTES = {'A'    :[440],
+                 'A#/Bb':[466],
+                 'B'    :[493],
+                 'C'    :[523],
+                 'C#/Db':[554],
+                 'D'    :[587],
+                 'D#/Eb':[622],
+                 'E'    :[659],
+                 'F'    :[698],
+                 'F#/Gb':[739],
+                 'G'    :[783],
+                 'G#/Ab':[830]}
 
 class SoundData:
-    def __init__(self, chunk=1024, rate=44100):
+    def __init__(self, chunk=1024, rate=44100, ring_time=1., callback=True, frame_time=.025, hop_time=.01, padding='zeros', history_time=10., pitch_engine='fft', microphone=True):
         '''
         Initialize a SoundData object.
 
         Args:
-            chunk (int) : number of samples grouped together
-                          default: 1024
-            rate  (int) : sampling frequency in Hz
-                          default: 44100
+            chunk        (int) : number of samples grouped together
+                                 default: 1024
+            rate         (int) : sampling frequency in Hz
+                                 default: 44100
+            ring_time  (float) : seconds of audio kept in the capture ring buffer
+                                 default: 1.0
+            callback    (bool) : fill the ring buffer from a non-blocking PyAudio callback instead of blocking reads in stream()
+                                 default: True
+            frame_time (float) : length of each analysis frame in seconds, .025 secs chosen arbitrarily
+                                 default: 0.025
+            hop_time   (float) : time between the start of consecutive frames in seconds, .01 secs chosen arbitrarily
+                                 default: 0.01
+            padding      (str) : 'zeros' or 'none', see _framing
+                                 default: 'zeros'
+            history_time (float) : seconds of per-hop peaks kept by analyse_new_hops
+                                 default: 10.0
+            pitch_engine   (str) : key in PITCH_ENGINES of the method used to find each frame's frequency
+                                 default: 'fft'
+            microphone    (bool) : open a PyAudio stream from the microphone, False when only analysing recordings
+                                 default: True
+        '''
+        self.chunk      = chunk
+        self.rate       = rate
+        self.buffer     = None
+        self.callback   = callback
+        self.frame_time = frame_time
+        self.hop_time   = hop_time
+        self.padding    = padding
+        self.frame_buffer   = np.zeros(0) # Padded copy of the signal reused by _framing
+        self.spectral_cache = {} # Window and frequency axis for each (rate, frame_length, nfft)
+        self.classifier     = None # NoteClassifier for the notes dict last passed to get_note_from_frequency
+        self.set_pitch_engine(pitch_engine)
+        # The ring is stored twice back to back, so the latest N samples are always one contiguous slice (a view, never a copy)
+        self.ring_length   = int(ring_time * rate)
+        self.ring          = np.zeros(2 * self.ring_length, dtype=np.int16)
+        self.ring_position = 0 # Total number of samples written to the ring since it was created
+        self.generation    = 0 # Incremented on every write, so readers can tell cheaply whether anything changed
+        self.new_audio     = threading.Condition() # Notified every time samples are written to the ring
+        # Incremental analysis state, see analyse_new_hops
+        self.analysed_generation = 0
+        self.analysed_position   = 0 # Sample position of the first hop that has not been analysed yet
+        self.skipped_samples     = 0 # Samples overwritten in the ring before they were analysed, see new_hops
+        self.history_length      = int(history_time/hop_time)
+        self.history_positions   = np.full(self.history_length, -1, dtype=np.int64) # Start sample of each analysed hop, -1 when unused
+        self.history_peaks       = np.zeros(self.history_length) # Dominant frequency of each analysed hop
+        self.history_count       = 0 # Total number of hops analysed, the next one is stored at history_count % history_length
+        self.sample_width  = np.dtype(np.int16).itemsize
+        self.audio_stream  = None
+        if microphone:
+            if PyAudio is None:
+                raise Exception('Could not import a module: pyaudio is needed to use the microphone.')
+            self.pyaudio      = PyAudio() # Kept for the lifetime of the object, creating one is slow
+            self.audio_stream = self.pyaudio.open(format=paInt16, # Create an audio stream object from the microphone using PyAudio
+                                                  channels=1,
+                                                  rate=rate,
+                                                  input=True,
+                                                  frames_per_buffer=chunk,
+                                                  stream_callback=self._stream_callback if callback else None)
+
+    def _stream_callback(self, in_data, frame_count, time_info, status):
+        '''
+        PyAudio callback run on the audio thread each time a chunk has been captured.
+
+        Args:
+            in_data     (bytes) : captured int16 samples
+            frame_count   (int) : number of samples in in_data
+            time_info    (dict) : PyAudio timing information (unused)
+            status        (int) : PyAudio status flags (unused)
+
+        Returns:
+                        (tuple) : no output data and the flag to keep the stream running
+        '''
+        with PROFILER.span('audio callback'):
+            self._write_to_ring(np.frombuffer(in_data, dtype=np.int16))
+        return None, paContinue
+
+    def _write_to_ring(self, samples):
+        '''
+        Copy samples into both halves of the ring buffer.
+
+        Args:
+            samples (numpy.ndarray) : int16 mono audio signal, no longer than the ring
         '''
-        self.chunk  = chunk
-        self.rate   = rate
-        self.buffer = None
-        self.audio_stream = PyAudio().open(format=paInt16, # Create an audio stream object from the microphone using PyAudio
-                                           channels=1,
-                                           rate=rate,
-                                           input=True,
-                                           frames_per_buffer=chunk)
+        samples = samples[-self.ring_length:]
+        start = self.ring_position % self.ring_length
+        first = min(len(samples), self.ring_length-start) # Samples that fit before the end of the first half
+        for offset in (0, self.ring_length): # Write the same data into the first and the mirrored half
+            self.ring[offset+start:offset+start+first] = samples[:first]
+            self.ring[offset:offset+len(samples)-first] = samples[first:] # Wrap the remainder around to the start of the half
+        with self.new_audio:
+            self.ring_position += len(samples)
+            self.generation += 1
+            self.new_audio.notify_all()
+        PROFILER.count('audio chunks')
 
     def _write_stream_to_file(self, filename, data):
         '''
         Write contents of data to a Wave file.
 
         Args:
-            filename  (str) : name of Wave file to be written to
-            data     (list) : mono audio signal
+            filename           (str) : name of Wave file to be written to
+            data (numpy.ndarray) : int16 mono audio signal
         '''
         wave_file = wave.open(f'./assets/{filename}.wav', 'wb') # Open the Wave file in binary write mode
         wave_file.setnchannels(1) # Set details of the data being written
-        wave_file.setsampwidth(PyAudio().get_sample_size(paInt16))
+        wave_file.setsampwidth(self.sample_width)
         wave_file.setframerate(self.rate)
-        wave_file.writeframes(b''.join(data)) # Convert the list into a binary string and (over)write to the Wave file
+        wave_file.writeframes(np.ascontiguousarray(data, dtype=np.int16).tobytes()) # Convert the samples into a binary string and (over)write to the Wave file
         wave_file.close()
 
-    def _framing(self, data):
+    def _framing(self, data, frame_time=None, hop_time=None, padding=None):
         '''
         Transform audio signal into a series of overlapping frames.
         A frame (sample) is the amplitude at a point in time.
+        The frames are a read-only strided view, so they are only valid until the next call.
 
         Args:
-            data         (list) : mono audio signal
+            data      (numpy.ndarray) : mono audio signal
+            frame_time        (float) : length of each frame in seconds
+                                        default: self.frame_time
+            hop_time          (float) : time between the start of consecutive frames in seconds
+                                        default: self.hop_time
+            padding             (str) : 'zeros' to pad the end of the signal with zeros so the last frame is complete, or 'none' to drop incomplete frames
+                                        default: self.padding
 
         Returns:
-            frames       (list) : all the frames
-            frame_length  (int) : length of each frame
+            frames    (numpy.ndarray) : all the frames, one frame per row
+            frame_length        (int) : length of each frame
         '''
-        frame_length     = int(.025 * self.rate) # Frame length = (window length) * (rate), .025 secs chosen arbitrarily
-        frame_step       = int(.01  * self.rate) # Used to convert from seconds to samples, .01 secs between windows chosen arbitrarily
-        signal_length    = len(data)
-        number_of_frames = int(np.ceil(abs(signal_length-frame_length)/frame_step)) # Check there is at least one frame
+        frame_length  = int((frame_time or self.frame_time) * self.rate) # Frame length = (window length) * (rate)
+        frame_step    = int((hop_time   or self.hop_time)   * self.rate) # Used to convert from seconds to samples
+        padding       = padding or self.padding
+        data          = np.asarray(data)
+        signal_length = len(data)
 
-        # Find indices
-        index_a = np.tile(np.arange(0, frame_length), (number_of_frames, 1)) # numpy.arange(start,stop,step) returns evenly spaced values between start & stop
-                                                                       # numpy.tile(array, repeats) constructs an array by repeating the given array in each given axis (repeats)
-        index_b = np.tile(np.arange(0, number_of_frames*frame_step, frame_step), (frame_length, 1))
-        index_b = np.transpose(index_b) # Rearrange the array so rows become columns and colums become rows
-        indices = index_a + index_b
+        if padding == 'none':
+            number_of_frames = max(0, (signal_length-frame_length)//frame_step + 1) # Only the frames that fit entirely inside the signal
+            padded_buffer    = data # No padding needed, so the frames can be a view of the signal itself
+        elif padding == 'zeros':
+            number_of_frames = int(np.ceil(abs(signal_length-frame_length)/frame_step)) # Check there is at least one frame
 
-        # Pad out the signal to ensure the frames have at least the same length as the indices array
-        padding_amount = number_of_frames * frame_step + frame_length
-        padding        = np.zeros((padding_amount-signal_length)) # Creates a numpy array filled entirely of zeros
-        padded_buffer  = np.append(data, padding) # Merges two arrays into one
+            # Pad out the signal to ensure the last frame is complete, reusing the same buffer between calls
+            padding_amount = number_of_frames * frame_step + frame_length
+            if len(self.frame_buffer) < padding_amount:
+                self.frame_buffer = np.zeros(padding_amount) # Only grows, so steady-state calls allocate nothing
+            padded_buffer = self.frame_buffer
+            padded_buffer[:signal_length] = data
+            padded_buffer[signal_length:padding_amount] = 0
+        else:
+            raise ValueError(f'Unknown padding policy: {padding}.')
 
-        frames = padded_buffer[indices.astype(np.int32, copy=False)] # .astype(dtype, copy=False) changes the type of the indices array to int32
+        # Each row starts (frame_step) samples after the previous one, so the frames overlap in memory instead of being copied
+        frames = np.lib.stride_tricks.as_strided(padded_buffer,
+                                                 shape=(number_of_frames, frame_length),
+                                                 strides=(frame_step*padded_buffer.strides[0], padded_buffer.strides[0]),
+                                                 writeable=False)
         return frames, frame_length
 
-    def _get_dominant_frequency(self, frame):
+    def _spectral_tables(self, frame_length, nfft):
         '''
-        Find the dominant frequency of a single frame.
+        Get the window and frequency axis for a frame length and FFT size, building them on first use.
 
         Args:
-            frame (numpy.ndarray) : amplitude information at a point in time
-        
+            frame_length (int) : length of each frame
+            nfft         (int) : fast fourier transform points to be calculated
+
         Returns:
-                          (float) : dominant frequency in Hz
+                        (list) : Hamming window, frequency of each useful bin in Hz and the number of useful bins
+        '''
+        key = (self.rate, frame_length, nfft)
+        if key not in self.spectral_cache:
+            window = np.hamming(frame_length) # w(n) = .54 - .46*cos((2*(pi)*n)/(M-1)) , 0 <= n <= M-1 where M = number of points in the output window
+            frequencies = np.fft.fftfreq(nfft//2+1, 1/self.rate) # Gives the frequencies associated with the coefficients: .fftfreq(window_length,sampling_spacing) where sampling_spacing is the inverse of sampling rate
+            frequencies = (frequencies[np.where(frequencies >= 0)] // 2) + 1 # Filter out negative frequencies and return the floor division of 2 for each frequency. Finally, add 1 to each frequency
+            self.spectral_cache[key] = [window, frequencies, len(frequencies)]
+        return self.spectral_cache[key]
+
+    def _get_dominant_frequency(self, frames):
         '''
-        nfft = 2**14 # Fast fourier transform points to be calculated
-        fourier_transform = np.fft.rfft(frame, nfft) # Perform a fast fourier transform on a real input
+        Find the dominant frequency of every frame at once with the selected pitch engine.
 
-        magnitude_spectrum = (1/nfft) * abs(fourier_transform)
-        power_spectrum = (1/nfft)**2 * magnitude_spectrum**2
+        Args:
+            frames (numpy.ndarray) : 2D array of frames, one frame per row
 
-        frequencies = np.fft.fftfreq(len(power_spectrum), 1/self.rate) # Gives the frequencies associated with the coefficients: .fftfreq(window_length,sampling_spacing) where sampling_spacing is the inverse of sampling rate
-        frequencies = (frequencies[np.where(frequencies >= 0)] // 2) + 1 # Filter out negative frequencies and return the floor division of 2 for each frequency. Finally, add 1 to each frequency
-         
-        power_spectrum = power_spectrum[:len(frequencies)] # Take only the first half of the spectra as only the first part contains useful data
-        maxiumum_index = np.argmax(power_spectrum) # .argmax() returns the maximum values along an axis
+        Returns:
+                   (numpy.ndarray) : dominant frequency in Hz of each frame
+        '''
+        return self.pitch_engine.estimate(self, frames)
+
+    def set_pitch_engine(self, name):
+        '''
+        Select the pitch engine used for all analysis.
+
+        Args:
+            name (str) : key of the engine in PITCH_ENGINES
+        '''
+        self.pitch_engine = PITCH_ENGINES[name]()
+
+    def latest(self, time=.1):
+        '''
+        Get the most recently captured audio without copying it.
+
+        Args:
+            time          (float) : length of audio to return in seconds, no longer than the ring
+                                    default: 0.1
+
+        Returns:
+                  (numpy.ndarray) : read-only view of the last (time) seconds of the ring buffer
+        '''
+        length = min(int(self.rate*time), self.ring_length)
+        start  = (self.ring_position-length) % self.ring_length
+        view   = self.ring[start:start+length] # Always contiguous thanks to the mirrored second half
+        view.flags.writeable = False
+        return view
 
-        return frequencies[maxiumum_index] # Convert the dominant frequency to Hz
-        
-        
     def stream(self, time=.1):
         '''
         Update audio stream buffer.
@@ -106,55 +254,593 @@ class SoundData:
             time (float) : length of audio stream buffer in seconds
                            default: 0.1
         '''
-        # To record (time) seconds into the buffer, we must take (rate)*(time) samples.
-        # In each iteration (chunk) samples are taken, so we must loop (rate)*(time)/(chunk) times.
-        buffer_hex = [self.audio_stream.read(self.chunk) for i in range(int(self.rate/self.chunk*time))]
-        self._write_stream_to_file('buffer', buffer_hex)
-        self.rate, self.buffer = wavfile.read('./assets/buffer.wav')
+        with PROFILER.span('capture'):
+            if not self.callback:
+                # To record (time) seconds into the buffer, we must take (rate)*(time) samples.
+                # In each iteration (chunk) samples are taken, so we must loop (rate)*(time)/(chunk) times.
+                for i in range(int(self.rate/self.chunk*time)):
+                    self._write_to_ring(np.frombuffer(self.audio_stream.read(self.chunk), dtype=np.int16))
+            self.buffer = self.latest(time)
+
+    def record(self, filename, time):
+        '''
+        Save the last (time) seconds of captured audio to a Wave file in ./assets/.
+
+        Args:
+            filename   (str) : name of Wave file to be written to
+            time     (float) : length of audio to save in seconds, no longer than the ring
+        '''
+        self._write_stream_to_file(filename, self.latest(time))
 
-    def get_dominant_frequencies(self):
+    def get_dominant_frequencies(self, time=None):
         '''
         Analyse the buffer data to find the dominant frequencies.
 
+        Args:
+            time                (float) : analyse a view of the last (time) seconds of the ring buffer instead of self.buffer
+                                          default: None
+
         Returns:
             dominant_frequencies (list) : list of the dominant frequencies identified
         '''
-        # Perform framing on the signal
-        frames, frame_length = self._framing(self.buffer)
-        # Perform Hamming window function on the frames
-        windows = frames * np.hamming(frame_length) # w(n) = .54 - .46*cos((2*(pi)*n)/(M-1)) , 0 <= n <= M-1 where M = number of points in the output window
+        with PROFILER.span('dominant frequencies'):
+            if time:
+                self.buffer = self.latest(time)
+            # Perform framing on the signal
+            frames, frame_length = self._framing(self.buffer)
 
-        dominant_frequencies = np.array([self._get_dominant_frequency(window) for window in windows]) # Find the dominant frequency for each frame
-        dominant_frequencies = np.round(dominant_frequencies, 3) # Round to three decimal places
-        dominant_frequencies = np.unique(dominant_frequencies) # Remove all duplicate values
+            dominant_frequencies = self._get_dominant_frequency(frames) # Find the dominant frequency for each frame
+            dominant_frequencies = np.round(dominant_frequencies, 3) # Round to three decimal places
+            dominant_frequencies = np.unique(dominant_frequencies) # Remove all duplicate values
 
         return dominant_frequencies
 
+    def new_hops(self):
+        '''
+        Get the frames of every hop captured since the hops were last added to the peak history.
+        Audio that has already been overwritten in the ring is skipped and counted in skipped_samples.
+
+        Returns:
+            (numpy.ndarray) : read-only view of the frames in the ring, one frame per row, with no rows if nothing new is complete
+        '''
+        generation, ring_position = self.generation, self.ring_position # Read once, the capture thread keeps writing
+        frame_length = int(self.frame_time * self.rate)
+        if generation == self.analysed_generation:
+            return np.zeros((0, frame_length), dtype=np.int16)
+        self.analysed_generation = generation
+
+        frame_step = int(self.hop_time * self.rate)
+        oldest = ring_position - self.ring_length + frame_length # Hops older than this may already have been overwritten
+        if self.analysed_position < oldest:
+            skip = int(np.ceil((oldest-self.analysed_position)/frame_step)) * frame_step # Skip audio that was lost, staying on the hop grid
+            self.analysed_position += skip
+            self.skipped_samples   += skip
+        if ring_position-self.analysed_position < frame_length:
+            return np.zeros((0, frame_length), dtype=np.int16) # Not enough new audio for a complete frame yet
+
+        start = self.analysed_position % self.ring_length
+        return self._framing(self.ring[start:start+ring_position-self.analysed_position], padding='none')[0] # Contiguous thanks to the mirrored ring
+
+    def add_hops(self, peaks):
+        '''
+        Add the dominant frequency of each frame returned by new_hops to the peak history, the oldest being overwritten once it is full.
+
+        Args:
+            peaks (numpy.ndarray) : dominant frequency of each frame, in the same order
+        '''
+        frame_step = int(self.hop_time * self.rate)
+        indices = (self.history_count + np.arange(len(peaks))) % self.history_length
+        self.history_positions[indices] = self.analysed_position + frame_step*np.arange(len(peaks))
+        self.history_peaks[indices]     = peaks
+        self.history_count     += len(peaks)
+        self.analysed_position += frame_step * len(peaks)
+
+    def analyse_new_hops(self):
+        '''
+        Find the dominant frequency of every hop captured since the last call, and add it to the peak history.
+        Returns straight away if nothing has been written to the ring since the last call.
+
+        Returns:
+                 (int) : number of hops analysed
+        '''
+        frames = self.new_hops()
+        if not len(frames):
+            return 0
+        peaks = self._get_dominant_frequency(frames)
+        self.add_hops(peaks)
+        return len(peaks)
+
+    def peaks_between(self, start, end):
+        '''
+        Get the dominant frequencies of the analysed hops whose frames lie between two times.
+
+        Args:
+            start (float) : start time in seconds since capture began
+            end   (float) : end time in seconds since capture began
+
+        Returns:
+            (numpy.ndarray) : dominant frequency of each hop, oldest first
+        '''
+        frame_length = int(self.frame_time * self.rate)
+        mask  = (self.history_positions >= start*self.rate) & (self.history_positions+frame_length <= end*self.rate)
+        order = np.argsort(self.history_positions[mask])
+        return self.history_peaks[mask][order]
+
+    def recent_frequencies(self, time=.1):
+        '''
+        Analyse any new hops and return the dominant frequencies of the last (time) seconds, like get_dominant_frequencies.
+
+        Args:
+            time                (float) : length of audio in seconds
+                                          default: 0.1
+
+        Returns:
+            dominant_frequencies (list) : list of the dominant frequencies identified
+        '''
+        with PROFILER.span('dominant frequencies'):
+            self.analyse_new_hops()
+            end = self.ring_position / self.rate
+            return np.unique(np.round(self.peaks_between(end-time, end), 3))
+
     def get_note_from_frequency(self, notes_dict, frequencies):
         '''
         Convert a list of frequencies into their likeliest music note.
+        The NoteClassifier is only rebuilt when notes_dict changes (e.g. after calibration).
         
         Args:
             notes_dict  (dict) : dictionary of notes and their associated frequencies
             frequencies (list) : list of frequencies
             
         Returns:
-            note         (str) : single note or None if no note identified   
+            note         (str) : single note or 'rest' if background noise was detected
+        '''
+        with PROFILER.span('classify'):
+            key = tuple((note, tuple(target)) for note, target in notes_dict.items())
+            if self.classifier is None or self.classifier.key != key:
+                self.classifier = NoteClassifier(notes_dict)
+            return self.classifier.classify(frequencies)
+
+class PitchEngine:
+    '''
+    Base class of the methods used to find the frequency of each frame.
+    Engines work on the whole 2D frame matrix at once, and report whole frequencies in Hz with 1.0 meaning silence,
+    the same convention the original FFT peak picker used, so the calibration and NoteClassifier work with any of them.
+    '''
+    name = ''
+
+    def __init__(self):
+        self.frames_analysed = 0
+        self.time_spent      = 0.
+
+    def _estimate(self, sound, frames):
+        raise NotImplementedError
+
+    def estimate(self, sound, frames):
+        '''
+        Find the frequency of every frame, timing how long it takes.
+
+        Args:
+            sound      (SoundData) : provides the sampling rate and cached tables
+            frames (numpy.ndarray) : 2D array of frames, one frame per row
+
+        Returns:
+                   (numpy.ndarray) : frequency in Hz of each frame
         '''
-        if 1.0 in frequencies.tolist():
+        start = clock.perf_counter()
+        frequencies = self._estimate(sound, frames)
+        end = clock.perf_counter()
+        self.time_spent      += end-start
+        self.frames_analysed += len(frames)
+        if PROFILER.enabled:
+            PROFILER.add('pitch engine', start, end) # Already timed, so record it rather than timing it again
+            PROFILER.count('frames analysed', len(frames))
+        return frequencies
+
+    def cost(self):
+        '''
+        Returns:
+            (float) : average time spent per frame in seconds, 0 before any frame has been analysed
+        '''
+        if not self.frames_analysed:
+            return 0.
+        return self.time_spent/self.frames_analysed
+
+class FFTPeakEngine(PitchEngine):
+    '''
+    Zero-padded FFT of each Hamming windowed frame, taking the loudest bin. Accurate but expensive, and can lock onto harmonics.
+    '''
+    name = 'fft'
+
+    def __init__(self, nfft=2**14):
+        super().__init__()
+        self.nfft = nfft # Fast fourier transform points to be calculated
+
+    def _estimate(self, sound, frames):
+        window, frequencies, bins = sound._spectral_tables(frames.shape[1], self.nfft)
+        fourier_transform = np.fft.rfft(frames*window, self.nfft, axis=1)[:, :bins] # One fast fourier transform per row, keeping only the first half as only that part contains useful data
+        power_spectrum = fourier_transform.real**2 + fourier_transform.imag**2 # Scaling by 1/nfft does not change where the peak is, so it is skipped
+        return frequencies[np.argmax(power_spectrum, axis=1)] # .argmax(axis=1) returns the index of the maximum value of each row
+
+class YINEngine(PitchEngine):
+    '''
+    YIN autocorrelation pitch estimator (de Cheveigné & Kawahara, 2002). Finds the fundamental rather than the loudest harmonic,
+    and only needs an FFT about twice the frame length. Frames with no clear period are reported as silence.
+    '''
+    name = 'yin'
+
+    def __init__(self, threshold=.15, lowest_frequency=80, highest_frequency=2000):
+        super().__init__()
+        self.threshold         = threshold # Highest normalised difference that still counts as a period
+        self.lowest_frequency  = lowest_frequency
+        self.highest_frequency = highest_frequency
+
+    def _estimate(self, sound, frames):
+        frames = np.asarray(frames, dtype=np.float64)
+        count, frame_length = frames.shape
+        longest_period  = min(int(sound.rate/self.lowest_frequency), frame_length//2)
+        shortest_period = max(int(sound.rate/self.highest_frequency), 2)
+        width = frame_length - longest_period # Number of samples compared for every period
+
+        # Difference function d(tau) = sum((x[j]-x[j+tau])**2) = energy(x[0:W]) + energy(x[tau:tau+W]) - 2*correlation(tau), with the correlation done by FFT
+        nfft = 2**int(np.ceil(np.log2(frame_length+width)))
+        correlation = np.fft.irfft(np.conj(np.fft.rfft(frames[:, :width], nfft, axis=1)) * np.fft.rfft(frames, nfft, axis=1), nfft, axis=1)[:, :longest_period+1]
+        energy = np.concatenate((np.zeros((count, 1)), np.cumsum(frames**2, axis=1)), axis=1)
+        taus = np.arange(longest_period+1)
+        difference = energy[:, [width]] + energy[:, taus+width] - energy[:, taus] - 2*correlation
+
+        # Cumulative mean normalised difference, d'(0) = 1 and d'(tau) = d(tau) * tau / sum(d[1:tau+1])
+        running_sum = np.cumsum(difference[:, 1:], axis=1)
+        normalised = np.ones_like(difference)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normalised[:, 1:] = difference[:, 1:] * taus[1:] / running_sum
+        normalised[:, :shortest_period] = np.inf
+        normalised = np.nan_to_num(normalised, nan=np.inf)
+
+        # Take the lowest point of the first dip below the threshold in every row
+        below = normalised < self.threshold
+        voiced = below.any(axis=1)
+        first = np.argmax(below, axis=1)
+        after = (taus >= first[:, None]) & ~below
+        end = np.where(after.any(axis=1), np.argmax(after, axis=1), len(taus))
+        dip = (taus >= first[:, None]) & (taus < end[:, None])
+        period = np.argmin(np.where(dip, normalised, np.inf), axis=1)
+
+        # Parabolic interpolation between neighbouring periods for sub-sample accuracy
+        rows = np.arange(count)
+        left  = normalised[rows, np.clip(period-1, 0, longest_period)]
+        mid   = normalised[rows, period]
+        right = normalised[rows, np.clip(period+1, 0, longest_period)]
+        with np.errstate(all='ignore'): # Neighbours outside the searched periods are infinite
+            curve = left - 2*mid + right
+            shift = np.where(np.isfinite(curve) & (curve > 0), (left-right)/(2*curve), 0)
+            period = period + np.clip(shift, -1, 1)
+            frequencies = np.floor(sound.rate/period) + 1
+        return np.where(voiced & (period > 0), frequencies, 1.)
+
+class HPSEngine(PitchEngine):
+    '''
+    Harmonic product spectrum: multiplies the spectrum with copies of itself compressed by 2, 3, ... so the harmonics line up on the fundamental.
+    Cheaper than the FFT peak picker thanks to the smaller FFT, and much less likely to report a harmonic.
+    '''
+    name = 'hps'
+
+    def __init__(self, nfft=2**13, harmonics=3, lowest_frequency=60):
+        super().__init__()
+        self.nfft             = nfft # Fast fourier transform points to be calculated
+        self.harmonics        = harmonics # Number of spectra multiplied together
+        self.lowest_frequency = lowest_frequency
+
+    def _estimate(self, sound, frames):
+        window = sound._spectral_tables(frames.shape[1], self.nfft)[0]
+        magnitude = np.abs(np.fft.rfft(frames*window, self.nfft, axis=1))
+        bins = magnitude.shape[1] // self.harmonics
+        # Add logs instead of multiplying, which would overflow
+        with np.errstate(divide='ignore'):
+            log_magnitude = np.log(magnitude)
+        product = sum(log_magnitude[:, ::harmonic][:, :bins] for harmonic in range(1, self.harmonics+1))
+        product[:, :int(self.lowest_frequency*self.nfft/sound.rate)] = -np.inf # Ignore DC and rumble
+        quiet = magnitude[:, :bins] < .1*magnitude.max(axis=1, keepdims=True)
+        product[quiet] = -np.inf # The fundamental must be audible itself, otherwise pure tones are reported an octave low
+        rows = np.arange(len(frames))
+        peak = np.argmax(product, axis=1)
+        silent = ~np.isfinite(product[rows, peak])
+
+        # The product is skewed by the slope of the window's main lobe, so move to the top of the lobe in the plain spectrum
+        lobe = int(np.ceil(2*self.nfft/frames.shape[1])) # Half the width of the Hamming window's main lobe in bins
+        candidates = np.clip(peak[:, None] + np.arange(-lobe, lobe+1), 1, magnitude.shape[1]-2)
+        peak = candidates[rows, np.argmax(magnitude[rows[:, None], candidates], axis=1)]
+
+        # Parabolic interpolation between neighbouring bins for sub-bin accuracy
+        with np.errstate(divide='ignore', invalid='ignore'):
+            left, mid, right = np.log(magnitude[rows, peak-1]), np.log(magnitude[rows, peak]), np.log(magnitude[rows, peak+1])
+            shift = np.nan_to_num(.5*(left-right)/(left-2*mid+right))
+        frequencies = np.floor((peak+np.clip(shift, -.5, .5))*sound.rate/self.nfft) + 1
+        return np.where(silent | (peak <= 1), 1., frequencies)
+
+PITCH_ENGINES = {'fft':FFTPeakEngine,
+                 'yin':YINEngine,
+                 'hps':HPSEngine}
+
+class NoteClassifier:
+    def __init__(self, notes_dict):
+        '''
+        Precomputed note classifier built from the calibrated note frequencies.
+
+        Args:
+            notes_dict (dict) : dictionary of notes and their associated frequencies
+        '''
+        self.key   = tuple((note, tuple(target)) for note, target in notes_dict.items())
+        self.notes = list(notes_dict.keys())
+        most_targets = max([len(target) for target in notes_dict.values()] + [1])
+        # One row per note, padded with NaN where a note has fewer calibrated frequencies than the others
+        targets = np.full((len(self.notes), most_targets), np.nan)
+        for i, target in enumerate(notes_dict.values()):
+            targets[i, :len(target)] = target
+        self.log_targets = np.log2(targets)
+        self.lookup = None # Best note index for every whole frequency in Hz, built on first use
+
+    def _distances(self, frequencies):
+        '''
+        Score every frequency against every note in one broadcast expression.
+
+        Args:
+            frequencies (numpy.ndarray) : 1D array of frequencies in Hz
+
+        Returns:
+                        (numpy.ndarray) : distance of each frequency (rows) from each note (columns), 0 for an exact match and at most 100
+        '''
+        # sin(pi*log2(f/t)) is 0 whenever f is a whole number of octaves away from t, and furthest from 0 half an octave away
+        # (see "Coding conversion of frequency to note name" in the write-up)
+        min_distance_from_target = np.abs(100*np.round(np.sin(np.pi*(np.log2(frequencies)[:, None, None]-self.log_targets)), 4))
+        min_distance_from_target = np.where(np.isnan(self.log_targets), np.inf, min_distance_from_target) # Padding never counts as the closest target
+        return min_distance_from_target.min(axis=2)
+
+    def _weights(self, frequencies):
+        '''
+        Sum the distances of all frequencies for each note, an exact match counting as -100.
+
+        Args:
+            frequencies (numpy.ndarray) : 1D array of frequencies in Hz
+
+        Returns:
+                        (numpy.ndarray) : weight of each note, the lowest being the likeliest
+        '''
+        distances = self._distances(frequencies)
+        return np.where(distances == 0, -100, distances).sum(axis=0)
+
+    def _build_lookup(self, highest_frequency):
+        '''
+        Precompute the likeliest note for every whole frequency from 1 Hz up to highest_frequency.
+
+        Args:
+            highest_frequency (int) : highest frequency in Hz the table must cover
+        '''
+        frequencies = np.arange(1, highest_frequency+1, dtype=np.float64)
+        distances = self._distances(frequencies)
+        self.lookup = np.argmin(np.where(distances == 0, -100, distances), axis=1)
+        self.lookup = np.insert(self.lookup, 0, 0) # Index 0 (0 Hz) is never looked up, but keeps index == frequency
+
+    def classify(self, frequencies):
+        '''
+        Convert a list of frequencies into their likeliest music note.
+
+        Args:
+            frequencies (list) : list of frequencies
+
+        Returns:
+            note         (str) : single note or 'rest' if background noise was detected
+        '''
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        if not len(frequencies):
+            return 'rest' # Nothing analysed yet (e.g. before the first complete frame), treated like silence
+        if (frequencies == 1.0).any():
             return 'rest' # If 1.0 is a dominant frequency assume it is background noise
-        for note in notes_dict.keys():
-            target = notes_dict[note]
-            weight = 0
-            for freq in frequencies:
-                min_distance_from_target = min([abs(100*round(np.sin((np.pi/np.log(2))*np.log(freq/value)),4)) for value in target])
-                if not min_distance_from_target:
-                    min_distance_from_target = -100
-                weight += min_distance_from_target
-                
-            try:
-                if weight < closest_match[1]:
-                    closest_match = [note, weight]
-            except NameError: # On the first iteration closest_match has not yet been declared
-                closest_match = [note, weight]
-        return closest_match[0]
+        if len(frequencies) == 1 and frequencies[0].is_integer() and frequencies[0] >= 1:
+            # A single peak is the common case, and the FFT peak picker only ever reports whole frequencies, so use the lookup table
+            if self.lookup is None or frequencies[0] >= len(self.lookup):
+                self._build_lookup(max(int(frequencies[0]), 22050))
+            return self.notes[self.lookup[int(frequencies[0])]]
+        return self.notes[int(np.argmin(self._weights(frequencies)))] # .argmin() returns the first lowest weight, so ties go to the earliest note
+
+    def confidence(self, frequencies):
+        '''
+        Score how closely the frequencies match each note.
+
+        Args:
+            frequencies (list) : list of frequencies
+
+        Returns:
+                        (dict) : each note and its confidence from 0 (half an octave away) to 1 (exact match)
+        '''
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        if not len(frequencies):
+            return {note:0. for note in self.notes}
+        confidences = 1 - self._distances(frequencies).mean(axis=0)/100
+        return {note:float(confidence) for note, confidence in zip(self.notes, np.clip(confidences, 0, 1))}
+
+class PitchDetector:
+    def __init__(self, audio, classifier, time=.1, stale_after=.2):
+        '''
+        Run note detection on a worker thread and publish the latest detected note.
+        NumPy releases the GIL inside the FFT, so the analysis runs alongside the render loop instead of inside it.
+
+        Args:
+            audio          (SoundData) : audio source to analyse
+            classifier (NoteClassifier) : classifier used to turn frequencies into a note
+            time               (float) : length of audio analysed for each result in seconds
+                                         default: 0.1
+            stale_after        (float) : age in seconds after which a result read by the render loop counts as stale
+                                         default: 0.2
+        '''
+        self.audio       = audio
+        self.classifier  = classifier
+        self.time        = time
+        self.stale_after = stale_after
+        self.result      = None # [timestamp, note, frequencies] of the latest analysis, replaced as a whole so reading it never needs a lock
+        self.unread      = False
+        self.dropped     = 0 # Results replaced before the render loop read them
+        self.stale       = 0 # Reads that returned a result older than stale_after
+        self.running     = threading.Event()
+        self.thread      = None
+
+    def _run(self):
+        '''
+        Worker loop: wait for new audio, analyse it and publish the result.
+        '''
+        last_position = self.audio.ring_position
+        while self.running.is_set():
+            if self.audio.callback:
+                with self.audio.new_audio: # Sleep until the capture callback has written new samples
+                    self.audio.new_audio.wait_for(lambda: self.audio.ring_position != last_position or not self.running.is_set(), timeout=.1)
+            else:
+                self.audio.stream(self.time) # Blocking capture, the worker reads the microphone itself
+            if self.audio.ring_position == last_position:
+                continue
+            last_position = self.audio.ring_position
+
+            frequencies = self.audio.recent_frequencies(self.time) # Only the hops captured since the last pass are analysed
+            with PROFILER.span('classify'):
+                note = self.classifier.classify(frequencies)
+            if self.unread:
+                self.dropped += 1
+                PROFILER.count('detections dropped')
+            self.result = [clock.perf_counter(), note, frequencies]
+            self.unread = True
+
+    def start(self):
+        '''
+        Start the worker thread, clearing any previous result and counters.
+        '''
+        if self.thread:
+            return
+        self.result  = None
+        self.unread  = False
+        self.dropped = 0
+        self.stale   = 0
+        self.running.set()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        '''
+        Stop the worker thread and wait for it to finish its current analysis.
+        '''
+        if not self.thread:
+            return
+        self.running.clear()
+        with self.audio.new_audio:
+            self.audio.new_audio.notify_all()
+        self.thread.join()
+        self.thread = None
+
+    def set_classifier(self, classifier):
+        '''
+        Replace the classifier, e.g. after the microphone has been recalibrated.
+
+        Args:
+            classifier (NoteClassifier) : classifier used to turn frequencies into a note
+        '''
+        self.classifier = classifier
+
+    def latest(self):
+        '''
+        Get the latest detection result without blocking.
+
+        Returns:
+                  (list) : timestamp, note and frequencies of the latest result
+            None (NoneType) : no result has been published yet
+        '''
+        result = self.result
+        if result is None:
+            return None
+        self.unread = False
+        if clock.perf_counter()-result[0] > self.stale_after:
+            self.stale += 1
+        return result
+
+class Calibrator:
+    def __init__(self, audio, timeout=4., settle_time=.5, top=3):
+        '''
+        Find the frequencies a note is heard at, from a histogram of the dominant frequency of each hop captured while it is played.
+        Nothing blocks: update() only analyses the hops captured since it was last called, so it can run once per frame.
+        Finishes once the most common frequencies have stayed the same for settle_time seconds of sound, or after timeout seconds.
+
+        Args:
+            audio       (SoundData) : audio being captured
+            timeout         (float) : longest time in seconds spent listening for one note
+                                      default: 4.0
+            settle_time     (float) : seconds of sound the most common frequencies must stay the same for
+                                      default: 0.5
+            top               (int) : number of frequencies kept for each note
+                                      default: 3
+        '''
+        self.audio       = audio
+        self.timeout     = timeout
+        self.settle_hops = settle_time / audio.hop_time
+        self.top         = top
+        self.start()
+
+    def start(self):
+        '''
+        Clear the histogram and start listening for the next note.
+        '''
+        self.audio.analyse_new_hops() # Audio captured before the note was asked for is not counted
+        self.counted   = self.audio.history_count # Hops already in the histogram, or skipped
+        self.histogram = np.zeros(self.audio.rate//2+2, dtype=np.int64) # Count of hops at each whole frequency up to the Nyquist frequency
+        self.sounded   = 0 # Hops that were not silent
+        self.stable    = 0 # Hops since the most common frequencies last changed
+        self.frequencies = []
+        self.start_time  = clock.perf_counter()
+        self.shown_progress = 0.
+        self.done = False
+
+    def update(self):
+        '''
+        Add the hops captured since the last call to the histogram.
+
+        Returns:
+            (bool) : whether the note is finished, see result()
+        '''
+        if self.done:
+            return True
+        if not self.audio.callback:
+            self.audio.stream(self.audio.chunk/self.audio.rate) # Blocking capture, so only read one chunk a call
+        self.audio.analyse_new_hops()
+        count = self.audio.history_count
+        new = min(count-self.counted, self.audio.history_length) # Older hops have been overwritten in the history
+        self.counted = count
+        if new:
+            indices = np.arange(count-new, count) % self.audio.history_length
+            frequencies = np.rint(self.audio.history_peaks[indices]).astype(np.int64)
+            frequencies = frequencies[(frequencies > 1) & (frequencies < len(self.histogram))] # 1 Hz means the hop was silent
+            if len(frequencies):
+                self.histogram += np.bincount(frequencies, minlength=len(self.histogram))
+                self.sounded += len(frequencies)
+                heard = np.flatnonzero(self.histogram)
+                top = heard[np.argsort(-self.histogram[heard], kind='stable')][:self.top].tolist() # Most common first, ties go to the lowest
+                if sorted(top) == sorted(self.frequencies):
+                    self.stable += len(frequencies)
+                else:
+                    self.stable = 0
+                self.frequencies = top
+        settled = self.stable >= self.settle_hops and self.sounded >= 2*self.settle_hops
+        self.done = settled or clock.perf_counter()-self.start_time >= self.timeout
+        return self.done
+
+    def progress(self):
+        '''
+        Returns:
+            (float) : from 0 when listening starts to 1 when the note is finished
+        '''
+        if self.done:
+            return 1.
+        progress = max((clock.perf_counter()-self.start_time)/self.timeout, self.stable/self.settle_hops)
+        self.shown_progress = min(max(self.shown_progress, progress), 1.) # Never goes backwards when the frequencies change
+        return self.shown_progress
+
+    def result(self):
+        '''
+        Returns:
+            (list) : the most common frequencies heard, most common first, empty if only silence was heard
+        '''
+        return self.frequencies
@@ -0,0 +1,156 @@
+try:
+    import argparse
+    import csv
+    import json
+    import os
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from scripts.scoring import score_recording
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+COLUMNS = ['take', 'song', 'score', 'percent', 'notes', 'accuracy', 'error']
+
+def match_takes(takes_dir, songs_dir='./assets/songs'):
+    '''
+    Find every Wave file under takes_dir and the song it is a take of.
+    A take belongs to a song if it is in a folder named after the song file, e.g. "Ode to Joy - Easy/take1.wav",
+    or if its name starts with the song file's name, e.g. "Ode to Joy - Easy 2019-05-01.wav".
+
+    Args:
+        takes_dir (str) : folder searched (including child folders) for Wave files
+        songs_dir (str) : folder containing the song files
+                          default: './assets/songs'
+
+    Returns:
+        matched  (list) : [take, song] file addresses of every take matched to a song
+        unmatched (list) : file addresses of takes that could not be matched
+    '''
+    songs = {os.path.splitext(file)[0]:os.path.join(songs_dir, file) for file in os.listdir(songs_dir) if file.endswith('.txt')}
+    by_length = sorted(songs.keys(), key=len, reverse=True) # Longest names first, so "Song - Hard" is preferred over "Song"
+    matched, unmatched = [], []
+    for root, dirs, files in os.walk(takes_dir):
+        dirs.sort() # Walk in a stable order so chunks are the same between runs
+        for file in sorted(files):
+            if not file.lower().endswith('.wav'):
+                continue
+            take = os.path.join(root, file)
+            folder = os.path.basename(root)
+            if folder in songs:
+                matched.append([take, songs[folder]])
+                continue
+            for name in by_length:
+                if file.startswith(name):
+                    matched.append([take, songs[name]])
+                    break
+            else:
+                unmatched.append(take)
+    return matched, unmatched
+
+def _score_chunk(chunk, notes, pitch_engine):
+    '''
+    Score a chunk of takes, run inside a worker process.
+
+    Args:
+        chunk        (list) : [take, song] file addresses
+        notes        (dict) : calibrated notes and their associated frequencies, or None for the defaults
+        pitch_engine  (str) : key in PITCH_ENGINES of the method used to find each frame's frequency
+
+    Returns:
+        rows         (list) : one row of the results table per take
+    '''
+    rows = []
+    for take, song in chunk:
+        try:
+            name, score, percent, song_length, note_played_data = score_recording(song, take, notes=notes, pitch_engine=pitch_engine)
+            rows.append([take, song, score, percent, song_length, ' '.join(str(i) for i in note_played_data), ''])
+        except Exception as e: # A damaged take should not stop the rest of the chunk
+            rows.append([take, song, '', '', '', '', f'{type(e).__name__}: {e}'])
+    return rows
+
+def _finished_takes(output):
+    '''
+    Read the takes already in a results table, so an interrupted job can resume.
+    Takes that failed are not finished, so they are tried again. Their earlier rows stay in the table, and a take's last row is its result.
+
+    Args:
+        output (str) : location of the results table
+
+    Returns:
+               (set) : file addresses of the takes already scored successfully
+    '''
+    if not os.path.exists(output):
+        return set()
+    finished = set()
+    with open(output, 'r', newline='') as file:
+        for row in csv.DictReader(file): # Rows are in the order they were written, so a later success or failure replaces an earlier one
+            if row['error']:
+                finished.discard(row['take'])
+            else:
+                finished.add(row['take'])
+    return finished
+
+def rescore(takes_dir, output, songs_dir='./assets/songs', notes=None, workers=None, chunk_size=16, pitch_engine='fft', log=print):
+    '''
+    Score every take under takes_dir across a pool of processes, appending to a CSV results table.
+    Each chunk is written as soon as it finishes, and takes already scored are skipped, so the job can be restarted after an interruption.
+    Takes that failed are tried again each time the job is run.
+
+    Args:
+        takes_dir      (str) : folder searched (including child folders) for Wave files
+        output         (str) : location of the results table
+        songs_dir      (str) : folder containing the song files
+                               default: './assets/songs'
+        notes         (dict) : calibrated notes and their associated frequencies
+                               default: None (DEFAULT_NOTES)
+        workers        (int) : number of worker processes
+                               default: None (one per core)
+        chunk_size     (int) : number of takes given to a worker at a time
+                               default: 16
+        pitch_engine   (str) : key in PITCH_ENGINES of the method used to find each frame's frequency
+                               default: 'fft'
+        log       (function) : called with progress messages
+                               default: print
+
+    Returns:
+                       (int) : number of takes scored by this run
+    '''
+    matched, unmatched = match_takes(takes_dir, songs_dir)
+    for take in unmatched:
+        log(f'No song found for {take}, skipping.')
+    finished = _finished_takes(output)
+    jobs = [job for job in matched if job[0] not in finished]
+    log(f'{len(matched)} takes found, {len(matched)-len(jobs)} already scored.')
+    chunks = [jobs[i:i+chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+    scored = 0
+    new_file = not os.path.exists(output)
+    with open(output, 'a', newline='') as file, ProcessPoolExecutor(workers) as pool:
+        writer = csv.writer(file)
+        if new_file:
+            writer.writerow(COLUMNS)
+        futures = [pool.submit(_score_chunk, chunk, notes, pitch_engine) for chunk in chunks]
+        for future in as_completed(futures):
+            rows = future.result()
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno()) # Make sure finished chunks survive the job being killed
+            scored += len(rows)
+            log(f'{scored}/{len(jobs)} takes scored.')
+    return scored
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-score a folder of Wave takes across every core.')
+    parser.add_argument('takes', help='folder of Wave takes, in folders named after their song or named "<song file name>...wav"')
+    parser.add_argument('output', help='CSV results table, appended to and resumed from if it already exists')
+    parser.add_argument('--songs', default='./assets/songs', help='folder containing the song files')
+    parser.add_argument('--notes', help='JSON file of calibrated notes and their frequencies')
+    parser.add_argument('--workers', type=int, help='number of worker processes, one per core by default')
+    parser.add_argument('--chunk-size', type=int, default=16, help='number of takes given to a worker at a time')
+    parser.add_argument('--engine', default='fft', help='pitch engine: fft, yin or hps')
+    args = parser.parse_args()
+
+    notes = None
+    if args.notes:
+        with open(args.notes, 'r') as file:
+            notes = json.load(file)
+    rescore(args.takes, args.output, songs_dir=args.songs, notes=notes, workers=args.workers, chunk_size=args.chunk_size, pitch_engine=args.engine)
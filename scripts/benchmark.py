@@ -0,0 +1,238 @@
+try:
+    import argparse
+    import json
+    import platform
+    import time
+    import tracemalloc
+    import numpy as np
+    from scripts.audio import DEFAULT_NOTES, NoteClassifier, PITCH_ENGINES, SoundData
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+KINDS = ['pure', 'harmonic', 'detuned', 'noise', 'silence']
+
+def synthesize(kind, frequency, length, rate, rng):
+    '''
+    Generate a deterministic test signal.
+
+    Args:
+        kind                     (str) : one of KINDS
+        frequency              (float) : fundamental frequency in Hz, ignored for noise and silence
+        length                   (int) : number of samples
+        rate                     (int) : sampling frequency in Hz
+        rng (numpy.random.Generator) : seeded random number generator
+
+    Returns:
+                     (numpy.ndarray) : int16 mono audio signal
+    '''
+    t = np.arange(length)/rate
+    phase = rng.uniform(0, 2*np.pi)
+    if kind == 'pure':
+        signal = np.sin(2*np.pi*frequency*t+phase)
+    elif kind == 'harmonic': # Five harmonics falling off like a plucked string
+        signal = sum(np.sin(2*np.pi*frequency*harmonic*t+phase*harmonic)/harmonic for harmonic in range(1,6))
+    elif kind == 'detuned': # A fifth of a semitone sharp or flat, still closest to the same note
+        signal = np.sin(2*np.pi*frequency*2**(rng.choice([-.2,.2])/12)*t+phase)
+    elif kind == 'noise':
+        signal = rng.normal(0, .3, length)
+    else:
+        signal = np.zeros(length)
+    signal = signal/max(np.abs(signal).max(), 1e-9) * 8000 if kind != 'silence' else signal
+    return signal.astype(np.int16)
+
+def make_signals(buffer_time, rate, seed=0):
+    '''
+    Generate a test signal of every kind for every note in DEFAULT_NOTES, an octave below, at and above the table.
+
+    Args:
+        buffer_time (float) : length of each signal in seconds
+        rate          (int) : sampling frequency in Hz
+        seed          (int) : random seed, the same seed always gives the same signals
+                              default: 0
+
+    Returns:
+        signals      (list) : [kind, expected note, signal], the expected note being 'rest' for noise and silence
+    '''
+    rng = np.random.default_rng(seed)
+    length = int(buffer_time*rate)
+    signals = []
+    for note, target in DEFAULT_NOTES.items():
+        for octave in (.5, 1, 2):
+            for kind in KINDS[:3]:
+                signals.append([kind, note, synthesize(kind, target[0]*octave, length, rate, rng)])
+    for i in range(len(DEFAULT_NOTES)):
+        for kind in KINDS[3:]:
+            signals.append([kind, 'rest', synthesize(kind, 0, length, rate, rng)])
+    return signals
+
+def time_calls(function, arguments, repeat):
+    '''
+    Time a function over every argument, keeping the fastest of (repeat) passes.
+
+    Args:
+        function (function) : function to time, called with one argument
+        arguments    (list) : arguments to call it with
+        repeat        (int) : number of passes
+
+    Returns:
+                    (float) : seconds taken by the fastest pass
+    '''
+    best = np.inf
+    for i in range(repeat):
+        start = time.perf_counter()
+        for argument in arguments:
+            function(argument)
+        best = min(best, time.perf_counter()-start)
+    return best
+
+def benchmark_config(engine, nfft, hop_time, buffer_time, rate=44100, repeat=3, seed=0):
+    '''
+    Measure the cost and accuracy of the audio pipeline for one configuration.
+
+    Args:
+        engine        (str) : key in PITCH_ENGINES
+        nfft          (int) : FFT size for engines that have one, ignored by the others
+        hop_time    (float) : time between the start of consecutive frames in seconds
+        buffer_time (float) : length of audio analysed per call in seconds
+        rate          (int) : sampling frequency in Hz
+                              default: 44100
+        repeat        (int) : number of timing passes, the fastest is kept
+                              default: 3
+        seed          (int) : random seed for the test signals
+                              default: 0
+
+    Returns:
+        result       (dict) : the configuration and its measurements
+    '''
+    audio = SoundData(rate=rate, hop_time=hop_time, pitch_engine=engine, microphone=False)
+    if hasattr(audio.pitch_engine, 'nfft'):
+        audio.pitch_engine.nfft = nfft
+    classifier = NoteClassifier(DEFAULT_NOTES)
+    signals = make_signals(buffer_time, rate, seed)
+    samples = [signal[2] for signal in signals]
+    frame_count = sum(len(audio._framing(signal)[0]) for signal in samples)
+    frame_sets = [np.array(audio._framing(signal)[0]) for signal in samples] # Copies, as the views are only valid until the next call
+
+    def dominant_frequencies(signal):
+        audio.buffer = signal
+        return audio.get_dominant_frequencies()
+
+    dominant_frequencies(samples[0]) # Build the cached tables outside the timed passes
+    framing_time   = time_calls(audio._framing, samples, repeat)
+    engine_time    = time_calls(audio._get_dominant_frequency, frame_sets, repeat)
+    pipeline_time  = time_calls(dominant_frequencies, samples, repeat)
+    detected       = [dominant_frequencies(signal) for signal in samples]
+    classifier.classify(detected[0])
+    classify_time  = time_calls(classifier.classify, detected, repeat)
+
+    tracemalloc.start() # NumPy reports its allocations to tracemalloc
+    for signal in samples:
+        dominant_frequencies(signal)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    labels = [classifier.classify(frequencies) for frequencies in detected]
+    accuracy = {}
+    for kind in KINDS:
+        results = [label == signal[1] for label, signal in zip(labels, signals) if signal[0] == kind]
+        accuracy[kind] = round(sum(results)/len(results), 4)
+
+    return {'engine'             :engine,
+            'nfft'               :nfft if hasattr(audio.pitch_engine, 'nfft') else None,
+            'hop_time'           :hop_time,
+            'buffer_time'        :buffer_time,
+            'signals'            :len(samples),
+            'frames'             :frame_count,
+            'framing_fps'        :round(frame_count/framing_time),
+            'engine_fps'         :round(frame_count/engine_time),
+            'pipeline_fps'       :round(frame_count/pipeline_time),
+            'pipeline_latency_ms':round(1000*pipeline_time/len(samples), 4),
+            'classify_latency_us':round(1e6*classify_time/len(samples), 3),
+            'peak_memory_kb'     :round(peak_memory/1024, 1),
+            'accuracy'           :accuracy} # For noise and silence this is the fraction reported as a rest
+
+def run(engines, nffts, hop_times, buffer_times, repeat=3, seed=0, log=print):
+    '''
+    Benchmark every combination of the given settings.
+
+    Args:
+        engines      (list) : keys in PITCH_ENGINES
+        nffts        (list) : FFT sizes
+        hop_times    (list) : times between frames in seconds
+        buffer_times (list) : lengths of audio analysed per call in seconds
+        repeat        (int) : number of timing passes, the fastest is kept
+                              default: 3
+        seed          (int) : random seed for the test signals
+                              default: 0
+        log      (function) : called with progress messages
+                              default: print
+
+    Returns:
+                     (dict) : details of the machine and a list of results
+    '''
+    results = []
+    for engine in engines:
+        for nfft in nffts if hasattr(PITCH_ENGINES[engine](), 'nfft') else [None]: # Engines without an FFT size only need to run once
+            for hop_time in hop_times:
+                for buffer_time in buffer_times:
+                    result = benchmark_config(engine, nfft, hop_time, buffer_time, repeat=repeat, seed=seed)
+                    log(f"{engine} nfft={nfft} hop={hop_time} buffer={buffer_time}: {result['engine_fps']} frames/s, {result['pipeline_latency_ms']} ms per call, accuracy {result['accuracy']}")
+                    results.append(result)
+    return {'time'    :time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python'  :platform.python_version(),
+            'numpy'   :np.__version__,
+            'machine' :platform.machine(),
+            'platform':platform.platform(),
+            'seed'    :seed,
+            'results' :results}
+
+def compare(baseline, current, tolerance=.1):
+    '''
+    Find results that got slower or less accurate than a baseline run.
+
+    Args:
+        baseline  (dict) : output of an earlier run
+        current   (dict) : output of this run
+        tolerance (float) : fraction throughput may drop by before it counts as a regression
+                            default: 0.1
+
+    Returns:
+                   (list) : description of each regression
+    '''
+    key = lambda result: (result['engine'], result['nfft'], result['hop_time'], result['buffer_time'])
+    previous = {key(result):result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = previous.get(key(result))
+        if not old:
+            continue
+        if result['pipeline_fps'] < old['pipeline_fps']*(1-tolerance):
+            regressions.append(f"{key(result)}: {old['pipeline_fps']} --> {result['pipeline_fps']} frames/s")
+        for kind, accuracy in result['accuracy'].items():
+            if accuracy < old['accuracy'].get(kind, 0):
+                regressions.append(f"{key(result)}: {kind} accuracy {old['accuracy'][kind]} --> {accuracy}")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the cost and accuracy of the audio pipeline with synthesized signals.')
+    parser.add_argument('--engines', nargs='+', default=list(PITCH_ENGINES.keys()), help='pitch engines to test')
+    parser.add_argument('--nfft', nargs='+', type=int, default=[2**12, 2**13, 2**14], help='FFT sizes to test')
+    parser.add_argument('--hop', nargs='+', type=float, default=[.005, .01, .02], help='hop times to test, in seconds')
+    parser.add_argument('--buffer', nargs='+', type=float, default=[.05, .1, .2], help='buffer lengths to test, in seconds')
+    parser.add_argument('--repeat', type=int, default=3, help='timing passes per measurement, the fastest is kept')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the test signals')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of an earlier run, exits with status 1 if anything regressed')
+    args = parser.parse_args()
+
+    report = run(args.engines, args.nfft, args.hop, args.buffer, repeat=args.repeat, seed=args.seed)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=4)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(json.load(file), report)
+        for regression in regressions:
+            print(f'Regression: {regression}')
+        if regressions:
+            raise SystemExit(1)
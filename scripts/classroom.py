@@ -0,0 +1,492 @@
+try:
+    import argparse
+    import asyncio
+    import json
+    import os
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    import numpy as np
+    from scripts.audio import DEFAULT_NOTES, NoteClassifier, SoundData
+    from scripts.profiler import Profiler
+    from scripts.scoring import read_recording, score_recording
+    from scripts.session import PerformanceSession
+    from scripts.song import compile_song, song_details
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+try:
+    from pyaudio import PyAudio, paInt16, paContinue
+except ImportError: # Only needed for stations plugged into this machine, recordings and sockets work without it
+    PyAudio = None
+
+class AudioSource:
+    '''
+    Base class of the places a station's audio comes from. read() waits for the next chunk of int16 mono samples,
+    and returns None once the station has finished, e.g. the end of a recording or the station disconnecting.
+    '''
+    def __init__(self, rate=44100, chunk=1024):
+        self.rate  = rate
+        self.chunk = chunk
+
+    async def open(self):
+        pass
+
+    async def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class WavSource(AudioSource):
+    def __init__(self, path, chunk=1024, speed=1.):
+        '''
+        Play a Wave recording in as if it was being captured, one chunk at a time at the recording's own pace.
+
+        Args:
+            path     (str) : location of the Wave file
+            chunk    (int) : number of samples delivered at a time
+                             default: 1024
+            speed  (float) : how many times faster than real time the recording is delivered
+                             default: 1.0
+        '''
+        rate, self.samples = read_recording(path)
+        super().__init__(rate, chunk)
+        self.speed    = speed
+        self.position = 0
+        self.start    = None
+
+    async def open(self):
+        self.start = time.perf_counter()
+
+    async def read(self):
+        if self.position >= len(self.samples):
+            return None
+        end = self.position+self.chunk
+        # A chunk is only available once all of it would have been captured
+        await asyncio.sleep(max(self.start + min(end, len(self.samples))/self.rate/self.speed - time.perf_counter(), 0))
+        samples = self.samples[self.position:end]
+        self.position = end
+        return samples
+
+class DeviceSource(AudioSource):
+    def __init__(self, device=None, rate=44100, chunk=1024):
+        '''
+        Capture from an input device on this machine, e.g. one of several USB microphones.
+
+        Args:
+            device  (int) : PyAudio input device index
+                            default: None (the default input device)
+            rate    (int) : sampling frequency in Hz
+                            default: 44100
+            chunk   (int) : number of samples captured at a time
+                            default: 1024
+        '''
+        super().__init__(rate, chunk)
+        self.device = device
+        self.pyaudio = None
+        self.audio_stream = None
+
+    async def open(self):
+        if PyAudio is None:
+            raise Exception('Could not import a module: pyaudio is needed to capture from a device.')
+        self.loop  = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.pyaudio = PyAudio()
+        self.audio_stream = self.pyaudio.open(format=paInt16,
+                                              channels=1,
+                                              rate=self.rate,
+                                              input=True,
+                                              input_device_index=self.device,
+                                              frames_per_buffer=self.chunk,
+                                              stream_callback=self._stream_callback)
+
+    def _stream_callback(self, in_data, frame_count, time_info, status):
+        # Runs on PyAudio's thread, so the chunk is handed to the event loop rather than put in the queue directly
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, np.frombuffer(in_data, dtype=np.int16).copy())
+        return None, paContinue
+
+    async def read(self):
+        return await self.queue.get()
+
+    def close(self):
+        if self.audio_stream:
+            self.audio_stream.stop_stream()
+            self.audio_stream.close()
+            self.pyaudio.terminate()
+            self.audio_stream = None
+            self.queue.put_nowait(None)
+
+class SocketSource(AudioSource):
+    def __init__(self, port, host='127.0.0.1', rate=44100, chunk=1024):
+        '''
+        Listen on a local port for a station streaming raw int16 mono samples, e.g. send_recording standing in for a real station.
+        Only the first connection is used, and the station has finished when it disconnects.
+
+        Args:
+            port    (int) : port to listen on
+            host    (str) : address to listen on
+                            default: '127.0.0.1'
+            rate    (int) : sampling frequency in Hz the station sends at
+                            default: 44100
+            chunk   (int) : most samples read at a time
+                            default: 1024
+        '''
+        super().__init__(rate, chunk)
+        self.port = port
+        self.host = host
+        self.server = None
+        self.writer = None
+        self.remainder = b'' # Odd byte left over when a read ends half way through a sample
+
+    async def open(self):
+        self.connection = asyncio.get_running_loop().create_future()
+        self.server = await asyncio.start_server(self._connected, self.host, self.port)
+
+    def _connected(self, reader, writer):
+        if self.connection.done():
+            writer.close() # Another station is already using this port
+            return
+        self.writer = writer
+        self.connection.set_result(reader)
+
+    async def read(self):
+        reader = await self.connection
+        data = await reader.read(2*self.chunk)
+        if not data:
+            return None
+        data = self.remainder + data
+        usable = len(data) - len(data)%2
+        self.remainder = data[usable:]
+        return np.frombuffer(data[:usable], dtype=np.int16)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        if self.server:
+            self.server.close()
+            self.server = None
+
+async def send_recording(path, port, host='127.0.0.1', chunk=1024, speed=1.):
+    '''
+    Stand in for a station by streaming a Wave recording to a SocketSource at the recording's own pace.
+
+    Args:
+        path     (str) : location of the Wave file, at the rate the host expects
+        port     (int) : port the SocketSource is listening on
+        host     (str) : address the SocketSource is listening on
+                         default: '127.0.0.1'
+        chunk    (int) : number of samples sent at a time
+                         default: 1024
+        speed  (float) : how many times faster than real time the recording is sent
+                         default: 1.0
+    '''
+    source = WavSource(path, chunk, speed)
+    reader, writer = await asyncio.open_connection(host, port)
+    await source.open()
+    try:
+        while True:
+            samples = await source.read()
+            if samples is None:
+                break
+            writer.write(samples.tobytes())
+            await writer.drain()
+    finally:
+        writer.close()
+
+class ClassroomSession:
+    def __init__(self, name, song_path, source, notes=None, start=0., buffer_time=.1, pitch_engine='fft', fps=60):
+        '''
+        One station's performance: its own audio, classifier and PerformanceSession, sharing nothing with the other stations.
+        The song is stepped by the audio itself, so frame f is scored as soon as the audio up to (start+f/fps) seconds has
+        been analysed. As long as the host keeps up (no audio is overwritten in the ring before it is analysed), the hops and
+        peaks are the same as score_recording finds for the same audio, so the result is too, see ClassroomHost.run(check).
+
+        Args:
+            name               (str) : name of the station or student, used in the results
+            song_path          (str) : location of the song file
+            source     (AudioSource) : where the station's audio comes from
+            notes             (dict) : calibrated notes and their associated frequencies
+                                       default: DEFAULT_NOTES
+            start            (float) : time in the audio, in seconds, when the countdown finished
+                                       default: 0.0
+            buffer_time      (float) : length of audio classified each frame in seconds
+                                       default: 0.1
+            pitch_engine       (str) : key in PITCH_ENGINES of the method used to find each frame's frequency
+                                       default: 'fft'
+            fps                (int) : frames per second the performance screen runs at
+                                       default: 60
+        '''
+        self.name        = name
+        self.song_path   = song_path
+        self.source      = source
+        self.notes       = notes
+        self.start       = start
+        self.buffer_time = buffer_time
+        self.fps         = fps
+        self.audio       = SoundData(rate=source.rate, pitch_engine=pitch_engine, microphone=False)
+        self.classifier  = NoteClassifier(notes or DEFAULT_NOTES)
+        self.session     = PerformanceSession(song_details(song_path), compile_song(song_path))
+        self.profiler    = Profiler() # Latency of this station alone
+        self.profiler.enabled = True
+        self.waiting_since = None # time.perf_counter() when the oldest audio not scored yet arrived
+        self.ended = False # Whether the source has finished
+        self.finished = False # Whether the end of the audio has been padded with silence, see finish
+        self.error = ''
+
+    async def capture(self):
+        '''
+        Copy the source's audio into the ring buffer until it finishes. A station failing is recorded instead of stopping the class.
+        '''
+        try:
+            await self.source.open()
+            while True:
+                samples = await self.source.read()
+                if samples is None:
+                    break
+                self.receive(samples)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+        finally:
+            self.ended = True
+            self.source.close()
+
+    def receive(self, samples):
+        '''
+        Args:
+            samples (numpy.ndarray) : int16 mono audio signal just captured
+        '''
+        if self.waiting_since is None:
+            self.waiting_since = time.perf_counter()
+        for i in range(0, len(samples), self.audio.ring_length): # A chunk longer than the ring is written a ring at a time
+            self.audio._write_to_ring(samples[i:i+self.audio.ring_length])
+        self.profiler.count('samples', len(samples))
+
+    def finish(self):
+        '''
+        Pad the end of the audio with silence once the source has finished, long enough to complete the hops that overlap the end
+        and the first hop of silence after it. Called by the host before taking the hops, so the last audio is analysed with them.
+        '''
+        frame_length = int(self.audio.frame_time * self.audio.rate)
+        frame_step   = int(self.audio.hop_time   * self.audio.rate)
+        self.audio._write_to_ring(np.zeros(frame_length+frame_step, dtype=np.int16))
+        self.finished = True
+
+    def detect(self):
+        # Classify the (buffer_time) seconds of audio that end at the current frame, like recent_frequencies
+        end = self.start + self.session.frame/self.fps
+        return self.classifier.classify(np.unique(np.round(self.audio.peaks_between(end-self.buffer_time, end), 3)))
+
+    def advance(self):
+        '''
+        Step the performance through every frame whose audio has been analysed, or to the end of the song once the end of the audio
+        has been analysed (the rest of the song is scored as silence), and record how long the audio waited to be scored.
+
+        Returns:
+            (int) : number of steps taken
+        '''
+        steps = 0
+        # A frame's peaks are the hops that end by the frame's time, so it is due once the next hop to be analysed would end after it
+        analysed = (self.audio.analysed_position + int(self.audio.frame_time*self.audio.rate)) / self.audio.rate
+        while not self.session.complete and (self.finished or self.start+self.session.frame/self.fps < analysed):
+            self.session.step(self.detect)
+            steps += 1
+        if steps and self.waiting_since is not None:
+            self.profiler.add('latency', self.waiting_since, time.perf_counter())
+            self.waiting_since = None
+        return steps
+
+    @property
+    def complete(self):
+        return self.session.complete
+
+    def result(self):
+        '''
+        Returns:
+            (dict) : station name, the result shown by _analysisScreen, the latency percentiles in milliseconds, the number of samples
+                     the host fell too far behind to analyse, and whether the result is valid (none were skipped)
+        '''
+        name, score, percent, song_length, note_played_data = self.session.result()
+        stages, counters = self.profiler.stats()
+        count, p50, p99 = stages.get('latency', [0, 0., 0.])
+        return {'station':self.name, 'song':name, 'score':score, 'percent':percent, 'notes':song_length, 'accuracy':note_played_data,
+                'latency_p50_ms':round(p50*1000, 2), 'latency_p99_ms':round(p99*1000, 2), 'error':self.error,
+                'skipped_samples':self.audio.skipped_samples, 'valid':not self.audio.skipped_samples} # Skipped audio was never scored, so the score is too low
+
+def _estimate_batch(batch):
+    '''
+    Find the dominant frequencies of several stations' new hops in one call to the pitch engine, run inside a worker thread.
+    NumPy releases the GIL inside the FFT, so the batches run side by side.
+
+    Args:
+        batch (list) : [ClassroomSession, frames] of stations sharing a sampling rate, frame length and pitch engine
+
+    Returns:
+              (list) : dominant frequency of each frame, one array per station in the same order
+    '''
+    audio = batch[0][0].audio
+    peaks = audio.pitch_engine.estimate(audio, np.concatenate([frames for session, frames in batch]))
+    return np.split(peaks, np.cumsum([len(frames) for session, frames in batch])[:-1])
+
+class ClassroomHost:
+    def __init__(self, workers=None, tick=.02):
+        '''
+        Run many stations' performances at once on one event loop. Every tick the new audio of all the stations is gathered,
+        grouped into one batch per worker and analysed on a pool of threads, then each station's song is stepped.
+
+        Args:
+            workers   (int) : number of analysis threads
+                              default: None (one per core)
+            tick    (float) : seconds between analysis passes
+                              default: 0.02
+        '''
+        self.workers  = workers or os.cpu_count() or 1
+        self.tick     = tick
+        self.sessions = []
+        self.profiler = Profiler() # Time taken by each pass over every station
+        self.profiler.enabled = True
+
+    def add(self, session):
+        '''
+        Args:
+            session (ClassroomSession) : station to run
+        '''
+        self.sessions.append(session)
+
+    def _batches(self):
+        # Take every station's new hops, grouped so each batch can share one pitch engine call, and spread over the workers
+        groups = {}
+        for session in self.sessions:
+            frames = session.audio.new_hops()
+            if len(frames):
+                # Copied, so the stations can keep writing to their rings while the workers run
+                key = (session.audio.rate, frames.shape[1], session.audio.pitch_engine.name)
+                groups.setdefault(key, []).append([session, np.array(frames)])
+        batches = []
+        for group in groups.values():
+            group.sort(key=lambda item: -len(item[1]))
+            split = [[] for i in range(min(self.workers, len(group)))]
+            for i, item in enumerate(group):
+                split[i % len(split)].append(item) # Largest first, dealt out in turn, so the batches are a similar size
+            batches += split
+        return batches
+
+    async def run(self, check=False):
+        '''
+        Run every station until all of their songs are complete.
+
+        Args:
+            check (bool) : also score each Wave file station with score_recording afterwards, and add whether the results match
+                           default: False
+
+        Returns:
+            (list) : each station's result, see ClassroomSession.result
+        '''
+        loop = asyncio.get_running_loop()
+        captures = [asyncio.ensure_future(session.capture()) for session in self.sessions]
+        next_tick = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(self.workers) as pool:
+                while not all(session.complete for session in self.sessions):
+                    next_tick += self.tick
+                    await asyncio.sleep(max(next_tick-time.perf_counter(), 0)) # Capturing carries on while waiting
+                    start = time.perf_counter()
+                    for session in self.sessions:
+                        # Checked before the hops are taken, so audio that arrives while the workers run is analysed next tick rather than skipped
+                        if session.ended and not session.finished:
+                            session.finish()
+                    batches = self._batches()
+                    results = await asyncio.gather(*[loop.run_in_executor(pool, _estimate_batch, batch) for batch in batches])
+                    for batch, peaks in zip(batches, results):
+                        for [session, frames], session_peaks in zip(batch, peaks):
+                            session.audio.add_hops(session_peaks)
+                    for session in self.sessions:
+                        session.advance()
+                    end = time.perf_counter()
+                    self.profiler.add('tick', start, end)
+                    self.profiler.count('ticks')
+                    self.profiler.count('hops analysed', sum(len(frames) for batch in batches for session, frames in batch))
+                    if end > next_tick + self.tick: # Took longer than a tick, so start again from now rather than rushing to catch up
+                        self.profiler.count('overruns')
+                        next_tick = end
+        finally:
+            for capture in captures:
+                capture.cancel()
+            await asyncio.gather(*captures, return_exceptions=True)
+        results = [session.result() for session in self.sessions]
+        if check:
+            for session, result in zip(self.sessions, results):
+                if isinstance(session.source, WavSource):
+                    offline = score_recording(session.song_path, (session.source.rate, session.source.samples), notes=session.notes, start=session.start,
+                                              buffer_time=session.buffer_time, pitch_engine=session.audio.pitch_engine.name, fps=session.fps)
+                    result['offline_match'] = offline[1:] == [result['score'], result['percent'], result['notes'], result['accuracy']]
+        return results
+
+    def report(self):
+        '''
+        Returns:
+            (dict) : number of stations, passes, overruns, the pass time percentiles in milliseconds and the number of stations that skipped audio
+        '''
+        stages, counters = self.profiler.stats()
+        timings, p50, p99 = stages.get('tick', [0, 0., 0.])
+        return {'stations':len(self.sessions), 'ticks':counters.get('ticks', [0])[0], 'hops':counters.get('hops analysed', [0])[0],
+                'overruns':counters.get('overruns', [0])[0], 'tick_p50_ms':round(p50*1000, 2), 'tick_p99_ms':round(p99*1000, 2),
+                'skipped':sum(1 for session in self.sessions if session.audio.skipped_samples)}
+
+def make_source(station, rate=44100, speed=1.):
+    '''
+    Args:
+        station   (str) : a Wave file, "device:<index>" or "socket:<port>"
+        rate      (int) : sampling frequency in Hz of devices and sockets
+                          default: 44100
+        speed   (float) : how many times faster than real time Wave files are played in
+                          default: 1.0
+
+    Returns:
+        (AudioSource) : the station's source
+    '''
+    kind, _, value = station.partition(':')
+    if kind == 'device':
+        return DeviceSource(int(value) if value else None, rate)
+    if kind == 'socket':
+        return SocketSource(int(value), rate=rate)
+    return WavSource(station, speed=speed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score many stations playing a song at once, without a window.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    host = commands.add_parser('host', help='run the stations and print each result as a line of JSON')
+    host.add_argument('song', help='song file, e.g. "assets/songs/Ode to Joy - Easy.txt"')
+    host.add_argument('stations', nargs='+', help='Wave file, "device:<index>" or "socket:<port>" for each station')
+    host.add_argument('--notes', help='JSON file of calibrated notes and their frequencies')
+    host.add_argument('--start', type=float, default=0., help='time in the audio when the countdown finished, in seconds')
+    host.add_argument('--engine', default='fft', help='pitch engine: fft, yin or hps')
+    host.add_argument('--rate', type=int, default=44100, help='sampling frequency of devices and sockets in Hz')
+    host.add_argument('--speed', type=float, default=1., help='how many times faster than real time Wave files are played in')
+    host.add_argument('--workers', type=int, help='number of analysis threads, one per core by default')
+    host.add_argument('--tick', type=float, default=.02, help='seconds between analysis passes')
+    host.add_argument('--check', action='store_true', help='also score Wave file stations offline, report whether the results match and exit with status 1 if any station skipped audio or does not match')
+    send = commands.add_parser('send', help='stand in for a station by streaming a Wave file to a socket station')
+    send.add_argument('recording', help='mono or stereo Wave file of the performance')
+    send.add_argument('port', type=int, help='port of the socket station')
+    send.add_argument('--host', default='127.0.0.1', help='address of the socket station')
+    send.add_argument('--speed', type=float, default=1., help='how many times faster than real time the recording is sent')
+    args = parser.parse_args()
+
+    if args.command == 'send':
+        asyncio.run(send_recording(args.recording, args.port, args.host, speed=args.speed))
+        raise SystemExit
+    notes = None
+    if args.notes:
+        with open(args.notes, 'r') as file:
+            notes = json.load(file)
+    classroom = ClassroomHost(args.workers, args.tick)
+    for i, station in enumerate(args.stations):
+        classroom.add(ClassroomSession(f'{i+1} {station}', args.song, make_source(station, args.rate, args.speed), notes=notes, start=args.start, pitch_engine=args.engine))
+    results = asyncio.run(classroom.run(args.check))
+    for result in results:
+        print(json.dumps(result))
+    print(json.dumps(classroom.report()))
+    if args.check and not all(result['valid'] and result.get('offline_match', True) for result in results):
+        raise SystemExit(1)
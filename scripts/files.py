@@ -0,0 +1,70 @@
+try:
+    import json
+    import os
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+def write_atomic(path, write, suffix='.tmp'):
+    '''
+    Write a file next to its final location and then replace it in one step, so a half written file is never read.
+    Its folder is created if needed.
+
+    Args:
+        path          (str) : location of the file
+        write    (function) : called with the temporary location to write the file to
+        suffix        (str) : added to path for the temporary file, e.g. np.savez needs it to end in '.npz'
+                              default: '.tmp'
+
+    Returns:
+                     (bool) : whether the file was written, False if it could not be, e.g. on a read-only install
+    '''
+    temporary_path = path + suffix
+    try:
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        write(temporary_path)
+        os.replace(temporary_path, path)
+        return True
+    except OSError:
+        try:
+            os.remove(temporary_path) # Don't leave a partial file behind if only the replace failed
+        except OSError:
+            pass
+        return False
+
+def write_json(path, data):
+    '''
+    Write data to a JSON file in one step, see write_atomic.
+
+    Args:
+        path    (str) : location of the file
+        data (object) : anything json can serialise
+
+    Returns:
+               (bool) : whether the file was written
+    '''
+    def write(temporary_path):
+        with open(temporary_path, 'w') as file:
+            json.dump(data, file)
+    return write_atomic(path, write)
+
+def write_lines(path, lines):
+    '''
+    Write lines of text to a file in one step, see write_atomic.
+
+    Args:
+        path   (str) : location of the file
+        lines (list) : the lines of text, without line endings
+
+    Returns:
+              (bool) : whether the file was written
+    '''
+    def write(temporary_path):
+        with open(temporary_path, 'w') as file:
+            file.writelines(line+'\n' for line in lines)
+    return write_atomic(path, write)
+
+if __name__ == '__main__':
+    print('Module not execuatable.')
+    raise SystemExit
@@ -0,0 +1,256 @@
+try:
+    import hashlib
+    import json
+    import os
+    import shutil
+    import time
+    import numpy as np
+    from scripts.audio import DEFAULT_NOTES
+    from scripts.files import write_json
+    from scripts.song import ACCIDENTALS, PITCHES
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+HISTORY_VERSION = 2 # Part of the record file names, so records laid out differently by an older version are left alone rather than misread
+DETECTED_NOTES = list(DEFAULT_NOTES) + ['rest'] # Anything else (nothing heard yet) is stored as -1
+RECENT_PLAYS = 10 # Percentages kept per song for the accuracy trend
+
+# One record per performance, and one per note played. Both files are only ever appended to
+SESSION_DTYPE = np.dtype([('time'   ,'<f8'), # Seconds since the epoch the performance ended
+                          ('song'   ,'<u2'), # Line of the song name in songs.txt
+                          ('score'  ,'<u2'),
+                          ('notes'  ,'<u2'), # Number of notes in the song
+                          ('percent','u1'),
+                          ('first'  ,'<u4'), # Index of the session's first note record
+                          ('count'  ,'<u2')]) # Number of note records
+NOTE_DTYPE = np.dtype([('session'   ,'<u4'),
+                       ('pitch'     ,'i1'), # Index in PITCHES of the note expected
+                       ('accidental','i1'), # Index in ACCIDENTALS
+                       ('detected'  ,'i1'), # Index in DETECTED_NOTES of the note heard
+                       ('passed'    ,'?'),
+                       ('rest'      ,'?'), # Rests are named by a pitch like notes, so they are told apart here and left out of the aggregates
+                       ('offset'    ,'<f4')]) # Seconds after the middle of the hitbox the note was played, NaN if it was missed
+
+def note_label(note_name):
+    '''
+    Args:
+        note_name (str) : note with octave and accidental, e.g. 'C5#' or 'E4n'
+
+    Returns:
+        (str) : note without the octave, as the performance screen names it, e.g. 'C#' or 'E'
+    '''
+    return note_name[0] if note_name[-1] == 'n' else note_name[0] + note_name[-1]
+
+def history_folder(username):
+    '''
+    Args:
+        username (str) : exact username
+
+    Returns:
+        (str) : name of the user's history folder. Usernames are case sensitive but Windows file names are not, so the folder is
+                named after a hash of the exact username rather than the username itself
+    '''
+    return hashlib.sha256(username.encode('utf-8')).hexdigest()[:32]
+
+class PerformanceHistory:
+    def __init__(self, username, directory='./assets/users/history'):
+        '''
+        Every performance a user has finished, kept as two append-only binary files of fixed size records, alongside running
+        aggregates per song and per note name. Recording a performance appends its records and updates the aggregates,
+        so looking up a song's trend or the most missed notes never reads the history itself.
+
+        Args:
+            username  (str) : user the history belongs to
+            directory (str) : folder holding a folder of history for each user, see history_folder
+                              default: './assets/users/history'
+        '''
+        self.directory = os.path.join(directory, history_folder(username))
+        self.sessions_path   = os.path.join(self.directory, f'sessions_v{HISTORY_VERSION}.bin')
+        self.notes_path      = os.path.join(self.directory, f'notes_v{HISTORY_VERSION}.bin')
+        self.songs_path      = os.path.join(self.directory, 'songs.txt')
+        self.aggregates_path = os.path.join(self.directory, 'aggregates.json')
+        self.aggregates = {'version':HISTORY_VERSION, 'sessions':0, 'notes':0, 'songs':{}, 'note_names':{}}
+        try:
+            with open(self.songs_path, 'r', encoding='utf-8') as file:
+                self.song_names = file.read().splitlines() # Songs are stored by their line number
+        except OSError:
+            self.song_names = []
+        try:
+            with open(self.aggregates_path, 'r') as file:
+                aggregates = json.load(file)
+            if aggregates['version'] == HISTORY_VERSION:
+                self.aggregates = aggregates
+        except (OSError, ValueError, KeyError): # No history yet, or the aggregates are unreadable and are rebuilt from the records below
+            pass
+        self._catch_up()
+
+    def _records(self, path, dtype, start=0):
+        # Read the records from index start onwards, ignoring a partly written record at the end
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.zeros(0, dtype=dtype)
+        count = size//dtype.itemsize - start
+        if count <= 0:
+            return np.zeros(0, dtype=dtype)
+        return np.fromfile(path, dtype=dtype, count=count, offset=start*dtype.itemsize)
+
+    def _catch_up(self):
+        # Fold in any records the aggregates do not include yet, e.g. if the program closed between appending and saving them
+        sessions = self._records(self.sessions_path, SESSION_DTYPE, self.aggregates['sessions'])
+        if not len(sessions):
+            return
+        notes = self._records(self.notes_path, NOTE_DTYPE, int(sessions['first'][0]))
+        for session in sessions:
+            first = int(session['first'])-int(sessions['first'][0])
+            self._aggregate(session, notes[first:first+int(session['count'])])
+        self._save_aggregates()
+
+    def _aggregate(self, session, notes):
+        '''
+        Add one performance to the running aggregates.
+
+        Args:
+            session         (numpy.void) : the session record
+            notes        (numpy.ndarray) : the session's note records
+        '''
+        aggregates = self.aggregates
+        name = self.song_names[session['song']]
+        song = aggregates['songs'].setdefault(name, {'plays':0, 'best':0, 'percent_total':0, 'recent':[], 'missed':{}})
+        song['plays'] += 1
+        song['best'] = max(song['best'], int(session['percent']))
+        song['percent_total'] += int(session['percent'])
+        song['recent'] = (song['recent'] + [int(session['percent'])])[-RECENT_PLAYS:]
+        for note in notes[~notes['rest']]: # A rest is not a note to play, so it can't be missed
+            label = note_label(PITCHES[note['pitch']] + ACCIDENTALS[note['accidental']])
+            stats = aggregates['note_names'].setdefault(label, {'played':0, 'passed':0, 'offset_total':0., 'offset_count':0})
+            stats['played'] += 1
+            if note['passed']:
+                stats['passed'] += 1
+                if not np.isnan(note['offset']):
+                    stats['offset_total'] += float(note['offset'])
+                    stats['offset_count'] += 1
+            else:
+                song['missed'][label] = song['missed'].get(label, 0) + 1
+        aggregates['sessions'] += 1
+        aggregates['notes'] += len(notes)
+
+    def _save_aggregates(self):
+        # If the history folder can't be written to, the aggregates in memory are kept for the rest of the run
+        write_json(self.aggregates_path, self.aggregates)
+
+    def record(self, result, note_records):
+        '''
+        Append a finished performance to the history and update the aggregates.
+
+        Args:
+            result       (list) : song name, score, percent, song length and accuracy, as returned by PerformanceSession.result
+            note_records (list) : PerformanceSession.note_records
+        '''
+        new_song = result[0] not in self.song_names
+        if new_song:
+            self.song_names.append(result[0])
+        session_index = self._count(self.sessions_path, SESSION_DTYPE)
+        first = self._count(self.notes_path, NOTE_DTYPE)
+
+        notes = np.zeros(len(note_records), dtype=NOTE_DTYPE)
+        for i, [note_name, detected, offset, passed, rest] in enumerate(note_records):
+            notes[i] = (session_index, PITCHES.index(note_name[:2]), ACCIDENTALS.index(note_name[2]),
+                        DETECTED_NOTES.index(detected) if detected in DETECTED_NOTES else -1, passed, rest, np.nan if offset is None else offset)
+        session = np.array([(time.time(), self.song_names.index(result[0]), result[1], result[3], result[2], first, len(notes))], dtype=SESSION_DTYPE)
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if new_song:
+                with open(self.songs_path, 'a', encoding='utf-8') as file:
+                    file.write(result[0]+'\n')
+            # The notes are written before the session that points to them, so a session record is only ever read with its notes present
+            with open(self.notes_path, 'ab') as file:
+                file.truncate(first*NOTE_DTYPE.itemsize) # Drop a partly written record left by a crash
+                notes.tofile(file)
+            with open(self.sessions_path, 'ab') as file:
+                file.truncate(session_index*SESSION_DTYPE.itemsize)
+                session.tofile(file)
+            written = True
+        except OSError: # An unwritable history folder only loses the performance from disk, it is still in the aggregates shown
+            written = False
+        self._aggregate(session[0], notes)
+        if written: # Saved aggregates must never count a session that is not in the records, or it would not be caught up later
+            self._save_aggregates()
+
+    def _count(self, path, dtype):
+        # Number of complete records in a file
+        try:
+            return os.path.getsize(path)//dtype.itemsize
+        except OSError:
+            return 0
+
+    def song_stats(self, song):
+        '''
+        Args:
+            song (str) : song name
+
+        Returns:
+            (dict) : plays, best and mean percent, the last RECENT_PLAYS percents and the most missed notes, or None if never played
+        '''
+        stats = self.aggregates['songs'].get(song)
+        if not stats:
+            return None
+        return {'plays'      :stats['plays'],
+                'best'       :stats['best'],
+                'mean'       :stats['percent_total']/stats['plays'],
+                'recent'     :list(stats['recent']),
+                'most_missed':sorted(stats['missed'].items(), key=lambda item: -item[1])[:3]}
+
+    def note_stats(self):
+        '''
+        Returns:
+            (dict) : note name: [times played, accuracy percent, mean timing offset in seconds or None] over every performance
+        '''
+        return {label:[stats['played'],
+                       100*stats['passed']/stats['played'],
+                       stats['offset_total']/stats['offset_count'] if stats['offset_count'] else None]
+                for label, stats in self.aggregates['note_names'].items()}
+
+    def most_missed(self, count=3):
+        '''
+        Args:
+            count (int) : number of notes to return
+                          default: 3
+
+        Returns:
+            (list) : [note name, accuracy percent] of the least accurate notes over every performance, worst first
+        '''
+        stats = self.note_stats()
+        return sorted([[label, accuracy] for label, [played, accuracy, offset] in stats.items()], key=lambda item: item[1])[:count]
+
+    def sessions(self):
+        '''
+        Read every session record, e.g. for a detailed report. Unlike the aggregates this reads the whole file.
+
+        Returns:
+            (numpy.ndarray) : SESSION_DTYPE records, oldest first
+        '''
+        return self._records(self.sessions_path, SESSION_DTYPE)
+
+    def notes(self, session):
+        '''
+        Read the note records of one session.
+
+        Args:
+            session (numpy.void) : a record returned by sessions()
+
+        Returns:
+            (numpy.ndarray) : NOTE_DTYPE records in the order they were played
+        '''
+        return self._records(self.notes_path, NOTE_DTYPE, int(session['first']))[:int(session['count'])]
+
+    def remove(self):
+        '''
+        Delete the whole history, e.g. when the account is deleted.
+        '''
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    print('Module not execuatable.')
+    raise SystemExit
@@ -0,0 +1,126 @@
+try:
+    import json
+    import os
+    from scripts.files import write_json
+    from scripts.song import read_header
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+LIBRARY_VERSION = 1
+DIFFICULTIES = ['Easy','Medium','Hard'] # Sorting order, unknown difficulties go last
+SORT_KEYS = {'name'      :lambda song: song['name'].casefold(),
+             'difficulty':lambda song: DIFFICULTIES.index(song['difficulty']) if song['difficulty'] in DIFFICULTIES else len(DIFFICULTIES),
+             'tempo'     :lambda song: song['tempo'],
+             'notes'     :lambda song: song['notes']}
+
+def read_song_entry(path, file_name=None):
+    '''
+    Read a song's details from its file name and header line, without reading the rest of the file.
+
+    Args:
+        path       (str) : location of the song file
+        file_name  (str) : file name without its extension, e.g. "Ode to Joy - Easy"
+                           default: None (taken from path)
+
+    Returns:
+        entry     (dict) : path, name, difficulty, tempo, time_signature, key, notes and mtime
+    '''
+    file_name = file_name or os.path.splitext(os.path.basename(path))[0]
+    name = file_name.split(' - ')
+    mtime = os.path.getmtime(path)
+    with open(path, mode='r') as File:
+        header_line = File.readline().split('|')[0] # The header is everything before the first bar line
+    header = read_header([header_line.strip().split(',')])
+    return {'path'          :path,
+            'name'          :name[0],
+            'difficulty'    :name[-1],
+            'tempo'         :header['tempo'],
+            'time_signature':'/'.join(header['time_signature']),
+            'key'           :header['key'],
+            'notes'         :header['song_length'],
+            'mtime'         :mtime}
+
+class SongLibrary:
+    def __init__(self, cache_path='./.cache/library.json'):
+        '''
+        An index of every song's details, kept between runs so only songs that changed have their header read again.
+        The index is kept outside the assets folder, so writing it does not invalidate the asset manifest.
+
+        Args:
+            cache_path (str) : location of the saved index
+                               default: './.cache/library.json'
+        '''
+        self.cache_path = cache_path
+        self.songs = {} # song file address: entry, see read_song_entry
+        try:
+            with open(cache_path, 'r') as file:
+                cache = json.load(file)
+            if cache['version'] == LIBRARY_VERSION:
+                self.songs = cache['songs']
+        except (OSError, ValueError, KeyError): # No index yet or it is unreadable, so every song is read on the first refresh
+            pass
+
+    def refresh(self, songs):
+        '''
+        Bring the index up to date with the song files, reading the header of new and changed songs only.
+        Checking a song that has not changed costs one stat.
+
+        Args:
+            songs (list) : [file address, file name without extension] of every song, e.g. manifest['songs']
+
+        Returns:
+            (int) : number of songs read, removed or found to be unreadable
+        '''
+        changes = 0
+        found = {}
+        for path, file_name in songs:
+            entry = self.songs.get(path)
+            try:
+                if entry is None or entry['mtime'] != os.path.getmtime(path):
+                    entry = read_song_entry(path, file_name)
+                    changes += 1
+            except (OSError, ValueError, KeyError): # Missing file or a broken header, leave the song out
+                changes += 1
+                continue
+            found[path] = entry
+        changes += len(set(self.songs)-set(found)) # Songs that have been removed
+        self.songs = found
+        if changes:
+            self.save()
+        return changes
+
+    def save(self):
+        '''
+        Write the index in one step, so a half written index is never read.
+        '''
+        write_json(self.cache_path, {'version':LIBRARY_VERSION, 'songs':self.songs}) # If it can't be written every header is just read each run
+
+    def query(self, search='', difficulty=None, sort='name', reverse=False):
+        '''
+        Find songs by name and difficulty.
+
+        Args:
+            search      (str) : text the song name must contain, ignoring case
+                                default: '' (every song)
+            difficulty  (str) : only songs of this difficulty
+                                default: None (every difficulty)
+            sort        (str) : key of SORT_KEYS to sort by, ties are sorted by name
+                                default: 'name'
+            reverse    (bool) : sort in descending order
+                                default: False
+
+        Returns:
+            (list) : matching entries, see read_song_entry
+        '''
+        search = search.casefold()
+        songs = [song for song in self.songs.values() if search in song['name'].casefold() and (difficulty is None or song['difficulty'] == difficulty)]
+        songs.sort(key=SORT_KEYS['name'])
+        songs.sort(key=SORT_KEYS[sort], reverse=reverse) # Stable, so songs that tie stay in name order
+        return songs
+
+    def __len__(self):
+        return len(self.songs)
+
+if __name__ == '__main__':
+    print('Module not execuatable.')
+    raise SystemExit
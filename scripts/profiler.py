@@ -0,0 +1,161 @@
+try:
+    import os
+    import threading
+    import time
+    from collections import deque
+    import numpy as np
+    from scripts.files import write_json
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+class _NullSpan:
+    # Returned by Profiler.span while profiling is off, entering and leaving it does nothing
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name     = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.profiler.add(self.name, self.start, time.perf_counter())
+        return False
+
+class Profiler:
+    def __init__(self, window=300, rate_interval=1.):
+        '''
+        Time named stages of the audio and drawing pipeline, and count events such as dropped frames.
+        While disabled a span is a shared object that does nothing, so instrumented code costs one method call per span.
+        Spans can be timed from any thread, e.g. the audio callback and the detection worker.
+
+        Args:
+            window          (int) : number of recent timings of each stage kept for the percentiles
+                                    default: 300
+            rate_interval (float) : seconds between updates of the per second rates of the counters
+                                    default: 1.0
+        '''
+        self.window        = window
+        self.rate_interval = rate_interval
+        self.enabled = False
+        self.tracing = False # Whether spans are also recorded for a trace file, see save_trace
+        self.origin  = time.perf_counter() # Trace timestamps are relative to this
+        self.reset()
+
+    def reset(self):
+        '''
+        Forget every timing, counter and recorded trace event.
+        '''
+        self.durations = {} # stage name: deque of recent durations in seconds
+        self.counters  = {} # counter name: total
+        self.rates     = {} # counter name: per second over the last rate interval
+        self.rate_totals = {} # counter name: total when the rates were last updated
+        self.rate_time   = time.perf_counter()
+        self.events    = [] # Chrome trace events recorded while tracing
+
+    def span(self, name):
+        '''
+        Time a stage, use as: with PROFILER.span('stage'): ...
+
+        Args:
+            name (str) : name of the stage
+
+        Returns:
+            context manager timing the code inside it, or one that does nothing while profiling is off
+        '''
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def add(self, name, start, end):
+        '''
+        Record one timing of a stage.
+
+        Args:
+            name    (str) : name of the stage
+            start (float) : time.perf_counter() when the stage started
+            end   (float) : time.perf_counter() when the stage ended
+        '''
+        durations = self.durations.get(name)
+        if durations is None:
+            durations = self.durations.setdefault(name, deque(maxlen=self.window))
+        durations.append(end-start) # deque.append is atomic, so threads can record without a lock
+        if self.tracing:
+            self.events.append({'name':name, 'ph':'X', 'pid':os.getpid(), 'tid':threading.get_ident(),
+                                'ts':(start-self.origin)*1e6, 'dur':(end-start)*1e6}) # Chrome traces are in microseconds
+
+    def count(self, name, amount=1):
+        '''
+        Add to a counter, doing nothing while profiling is off.
+
+        Args:
+            name    (str) : name of the counter
+            amount  (int) : amount to add
+                            default: 1
+        '''
+        if not self.enabled:
+            return
+        total = self.counters[name] = self.counters.get(name, 0) + amount
+        if self.tracing:
+            self.events.append({'name':name, 'ph':'C', 'pid':os.getpid(), 'tid':threading.get_ident(),
+                                'ts':(time.perf_counter()-self.origin)*1e6, 'args':{name:total}})
+
+    def stats(self):
+        '''
+        Returns:
+            stages   (dict) : stage name: [number of timings kept, p50, p99] with times in seconds
+            counters (dict) : counter name: [total, per second]
+        '''
+        now = time.perf_counter()
+        if now-self.rate_time >= self.rate_interval:
+            for name, total in list(self.counters.items()):
+                self.rates[name] = (total-self.rate_totals.get(name, 0))/(now-self.rate_time)
+                self.rate_totals[name] = total
+            self.rate_time = now
+        stages = {}
+        for name, durations in list(self.durations.items()):
+            timings = np.array(durations)
+            if len(timings):
+                p50, p99 = np.percentile(timings, [50, 99])
+                stages[name] = [len(timings), p50, p99]
+        counters = {name:[total, self.rates.get(name, 0.)] for name, total in list(self.counters.items())}
+        return stages, counters
+
+    def start_trace(self):
+        '''
+        Start recording spans and counters for a trace file, enabling the profiler if it is off.
+        '''
+        self.enabled = True
+        self.tracing = True
+        self.events  = []
+
+    def save_trace(self, path):
+        '''
+        Write the recorded events as a Chrome trace (open in chrome://tracing or ui.perfetto.dev) and stop recording.
+
+        Args:
+            path (str) : location of the JSON file, its folder is created if needed
+
+        Returns:
+                (bool) : whether the trace was written
+        '''
+        self.tracing = False
+        events, self.events = self.events, []
+        return write_json(path, {'traceEvents':events, 'displayTimeUnit':'ms'})
+
+PROFILER = Profiler() # Shared by the audio, detection and drawing code
+
+if __name__ == '__main__':
+    print('Module not execuatable.')
+    raise SystemExit
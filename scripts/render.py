@@ -0,0 +1,371 @@
+try:
+    import math
+    import pygame
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+class HudItem:
+    def __init__(self, position):
+        '''
+        A surface drawn at a fixed position that only needs redrawing when it is swapped for a different surface.
+
+        Args:
+            position (tuple) : coordinates of the top left of the surface
+        '''
+        self.position = position
+        self.surface  = None
+        self.rect     = None
+
+    def set(self, surface):
+        '''
+        Swap the surface shown, e.g. for newly rendered text. Surfaces from the text cache are reused for the same text,
+        so setting the same text again is free.
+
+        Args:
+            surface (pygame.Surface) : surface to show, or None to show nothing
+
+        Returns:
+            dirty             (list) : rectangles that need redrawing
+        '''
+        if surface is self.surface:
+            return []
+        dirty = [self.rect] if self.rect else []
+        self.surface = surface
+        self.rect = surface.get_rect(topleft=self.position) if surface else None
+        if self.rect:
+            dirty.append(self.rect)
+        return dirty
+
+    def draw(self, screen):
+        if self.surface:
+            screen.blit(self.surface, self.position)
+
+class StaveLayer:
+    def __init__(self, size, cleff, cleff_rect, key, key_rect, beats_text, per_bar, time_signature_pos, hitbox, fadeout_width=275, fadeout_steps=50):
+        '''
+        Everything on the performance screen that stays still and is drawn over the notes: the note fadeout gradient,
+        cleff, key signature, time signature, stave and hitbox. The gradient and the stave are rendered once per song,
+        and the images between them are blitted as they are so they blend with the notes exactly as before.
+
+        Args:
+            size                  (tuple) : width and height of the layer
+            cleff        (pygame.Surface) : cleff image
+            cleff_rect      (pygame.Rect) : where the cleff is drawn
+            key          (pygame.Surface) : key signature image, or None for the key of C or Am
+            key_rect        (pygame.Rect) : where the key signature is drawn, or None
+            beats_text   (pygame.Surface) : top number of the time signature
+            per_bar      (pygame.Surface) : bottom number of the time signature
+            time_signature_pos      (int) : x-coordinate of the time signature
+            hitbox          (pygame.Rect) : the hitbox for note detection
+            fadeout_width           (int) : distance from the left of the screen the notes fade out over
+                                            default: 275
+            fadeout_steps           (int) : number of bands in the fadeout gradient
+                                            default: 50
+        '''
+        # Note fadeout gradient, the same bands the screen used to build every frame
+        band_width = int(fadeout_width/fadeout_steps)
+        self.fadeout = pygame.Surface((band_width*fadeout_steps, size[1]), pygame.SRCALPHA)
+        for i in range(fadeout_steps):
+            self.fadeout.fill((255,255,255,min(260-int((255/fadeout_steps)*(i+1)), 255)), pygame.Rect(band_width*i, 0, band_width, size[1]))
+
+        self.images = [[cleff, cleff_rect.topleft],
+                       [beats_text, (time_signature_pos,350)],
+                       [per_bar, (time_signature_pos,430)]]
+        if key_rect:
+            self.images.insert(1, [key, key_rect.topleft])
+
+        # The stave, with the translucent hitbox over it. The hitbox's pixels are set directly rather than blended onto the
+        # transparent surface, and the stave inside it is redrawn as black seen through the hitbox
+        self.stave = pygame.Surface(size, pygame.SRCALPHA)
+        self.stave.fill((255,255,255,0))
+        for i in range(0,200,40):
+            pygame.draw.line(self.stave, (0,0,0), (100,360+i), (size[0],360+i), 5)
+        hitbox_color = (153,217,234)
+        hitbox_alpha = 200
+        self.stave.fill(hitbox_color+(hitbox_alpha,), hitbox)
+        line_color = tuple(round(c*hitbox_alpha/255) for c in hitbox_color)
+        self.stave.set_clip(hitbox)
+        for i in range(0,200,40):
+            pygame.draw.line(self.stave, line_color, (100,360+i), (size[0],360+i), 5)
+        self.stave.set_clip(None)
+
+    def draw(self, screen):
+        screen.blit(self.fadeout, (0,0))
+        for image, position in self.images:
+            screen.blit(image, position)
+        screen.blit(self.stave, (0,0))
+
+def draw_note(surface, note, x):
+    '''
+    Draw a note from SongParser, its accidental and its ledger lines, or a bar line for the end of a bar.
+
+    Args:
+        surface (pygame.Surface) : surface to draw onto
+        note              (dict) : the note, as served by SongParser.next_note
+        x                (float) : x-coordinate to draw the note at on the surface
+    '''
+    for j,part in enumerate(list(note.keys())[6:]):
+        if j:
+            surface.blit(note[part][0], (x-25,note[part][1]))
+        else:
+            if note[part][0]:
+                surface.blit(note[part][0], (x,note[part][1]))
+                if note[part][1]+note['note_img_offset'] > 540:
+                    for k in range(((note[part][1]+note['note_img_offset'])-520)//40):
+                        pygame.draw.line(surface, (0,0,0), (x-10,560+(40*k)), (x+60,560+(40*k)), 5)
+                elif note[part][1] < 340:
+                    for k in range(((360-(note[part][1]+note['note_img_offset']))//40)):
+                        pygame.draw.line(surface, (0,0,0), (x-10,320-(40*k)), (x+60,320-(40*k)), 5)
+            else:
+                pygame.draw.line(surface, (0,0,0), (x,360), (x,520), 4)
+
+def note_rect(note, x):
+    '''
+    Find the area draw_note covers.
+
+    Args:
+        note       (dict) : the note, as served by SongParser.next_note
+        x         (float) : x-coordinate the note is drawn at
+
+    Returns:
+        (pygame.Rect) : bounds of the note, accidental, ledger lines and bar line, or None if nothing is drawn (rests have no note_img_offset, so no parts are drawn)
+    '''
+    x = int(x)
+    rects = []
+    for j,part in enumerate(list(note.keys())[6:]):
+        if j:
+            rects.append(note[part][0].get_rect(topleft=(x-25,note[part][1])))
+        elif note[part][0]:
+            rects.append(note[part][0].get_rect(topleft=(x,note[part][1])))
+            if note[part][1]+note['note_img_offset'] > 540: # Ledger lines below the stave
+                rects.append(pygame.Rect(x-10, 556, 75, 40*(((note[part][1]+note['note_img_offset'])-520)//40)))
+            elif note[part][1] < 340: # Ledger lines above the stave
+                lines = (360-(note[part][1]+note['note_img_offset']))//40
+                rects.append(pygame.Rect(x-10, 324-40*lines, 75, 40*lines))
+        else:
+            rects.append(pygame.Rect(x-2, 358, 6, 166))
+    if not rects:
+        return None
+    return rects[0].unionall(rects[1:]).inflate(4,4) # Allow for the fractional part of the position
+
+class ScoreStrip:
+    def __init__(self, height=720, view_width=1280, chunk_width=1024, background=(255,255,255)):
+        '''
+        The notes of a performance rasterized onto a long strip that scrolls left, so each frame costs a blit per visible chunk
+        however many notes there are. Notes are drawn onto the strip once, when they are spawned, at their strip x-coordinate
+        (their screen position plus how far the strip has scrolled). The strip is held as chunks, only the chunks in view are kept,
+        and a chunk is only redrawn when a note on it is played, removed or falls out of step with the others.
+
+        Args:
+            height       (int) : height of the strip
+                                 default: 720
+            view_width   (int) : width of the part of the strip shown on screen
+                                 default: 1280
+            chunk_width  (int) : width of each chunk of the strip
+                                 default: 1024
+            background (tuple) : color behind the notes
+                                 default: (255,255,255)
+        '''
+        self.height      = height
+        self.view_width  = view_width
+        self.chunk_width = chunk_width
+        self.background  = background
+        self.scroll = 0. # Distance the strip has moved left
+        self.phase  = 0. # Extra distance the strip is drawn moved left, for drawing between steps
+        self.chunks = {} # chunk index: [pygame.Surface, rect covered by notes or None]
+        self.placed = {} # id of note: [note, strip x-coordinate]
+        self.dirty  = set() # indices of chunks to redraw
+        self.chunk_renders = 0 # Number of times a whole chunk was drawn, for profiling
+
+    def _chunk_indices(self, rect):
+        return range(int(rect.left//self.chunk_width), int((rect.right-1)//self.chunk_width)+1)
+
+    def _draw(self, note, x):
+        # Draw a newly spawned note onto the chunks that already exist, chunks made later draw it themselves
+        rect = note_rect(note, x)
+        if not rect:
+            return
+        for index in self._chunk_indices(rect):
+            chunk = self.chunks.get(index)
+            if chunk and index not in self.dirty:
+                offset = index*self.chunk_width
+                draw_note(chunk[0], note, x-offset)
+                rect_on_chunk = rect.move(-offset, 0)
+                chunk[1] = chunk[1].union(rect_on_chunk) if chunk[1] else rect_on_chunk
+
+    def _invalidate(self, note, x):
+        rect = note_rect(note, x)
+        if not rect:
+            return
+        for index in self._chunk_indices(rect):
+            if index in self.chunks:
+                self.dirty.add(index)
+
+    def _render_chunk(self, index):
+        offset = index*self.chunk_width
+        chunk_rect = pygame.Rect(offset, 0, self.chunk_width, self.height)
+        if index in self.chunks:
+            chunk = self.chunks[index]
+        else:
+            chunk = self.chunks[index] = [pygame.Surface((self.chunk_width, self.height)), None]
+        chunk[0].fill(self.background)
+        chunk[1] = None
+        for note, x in self.placed.values():
+            rect = note_rect(note, x)
+            if rect and rect.colliderect(chunk_rect):
+                draw_note(chunk[0], note, x-offset)
+                rect_on_chunk = rect.move(-offset, 0)
+                chunk[1] = chunk[1].union(rect_on_chunk) if chunk[1] else rect_on_chunk
+        if chunk[1]:
+            chunk[1] = chunk[1].clip(chunk[0].get_rect())
+        self.chunk_renders += 1
+
+    def advance(self, pixels):
+        '''
+        Scroll the strip left, by the same distance the notes moved.
+
+        Args:
+            pixels (float) : distance moved
+        '''
+        self.scroll += pixels
+
+    def update(self, notes):
+        '''
+        Bring the strip in line with the notes being played: draw new notes, and redraw chunks whose notes were played or removed.
+
+        Args:
+            notes (list) : the notes being played, PerformanceSession.note_buffer
+        '''
+        present = set()
+        for note in notes:
+            if not note:
+                continue
+            x = note['pos'] + self.scroll
+            placed = self.placed.get(id(note))
+            if placed and placed[0] is note:
+                if abs(placed[1]-x) > .01: # The note moved a different distance to the others this frame
+                    self._invalidate(note, placed[1])
+                    placed[1] = x
+                    self._invalidate(note, x)
+            else:
+                self.placed[id(note)] = [note, x]
+                self._draw(note, x)
+            present.add(id(note))
+        for key in list(self.placed):
+            if key not in present: # Played, or moved off the screen
+                note, x = self.placed.pop(key)
+                self._invalidate(note, x)
+
+        first = int(self.scroll//self.chunk_width)
+        last  = int((self.scroll+self.phase+self.view_width)//self.chunk_width)
+        for index in list(self.chunks):
+            if index < first: # Scrolled past, so the memory used stays the same however long the song is
+                del self.chunks[index]
+        for index in range(first, last+1):
+            if index not in self.chunks or index in self.dirty:
+                self._render_chunk(index)
+        self.dirty.clear()
+
+    def bounds(self):
+        '''
+        Returns:
+            rects (list) : areas of the screen covered by notes
+        '''
+        rects = []
+        for index, (surface, extent) in self.chunks.items():
+            if extent:
+                rects.append(extent.move(math.floor(index*self.chunk_width-self.scroll-self.phase), 0))
+        return rects
+
+    def draw(self, screen):
+        # With tempos that move the notes by fractions of a pixel a note can land a pixel from where drawing it directly would put it
+        for index, (surface, extent) in self.chunks.items():
+            if extent:
+                screen.blit(surface, (math.floor(index*self.chunk_width-self.scroll-self.phase)+extent.x, extent.y), extent)
+
+def _merge(rects):
+    '''
+    Merge overlapping rectangles, so no area is drawn twice.
+
+    Args:
+        rects  (list) : pygame.Rect objects
+
+    Returns:
+        merged (list) : rectangles covering the same area, none of which overlap
+    '''
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = 0
+        while i < len(merged): # Keep absorbing rectangles until nothing overlaps the growing one
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+class LayeredRenderer:
+    def __init__(self, screen, layers, background=(255,255,255), present=None):
+        '''
+        Draw a stack of layers and push only the parts of the window that changed.
+        Changed rectangles are redrawn through every layer, clipped to the rectangle, then sent with pygame.display.update.
+
+        Args:
+            screen  (pygame.Surface) : the display surface
+            layers            (list) : functions called with the screen that draw each layer, bottom layer first
+            background       (tuple) : color under every layer
+                                       default: (255,255,255)
+            present       (function) : called with the changed rectangles to push them to the display
+                                       default: None (pygame.display.update)
+        '''
+        self.screen     = screen
+        self.layers     = layers
+        self.background = background
+        self.dirty      = []
+        self.present    = present or pygame.display.update
+
+    def invalidate(self, *rects):
+        '''
+        Mark rectangles as needing redrawing on the next update. None is ignored.
+        '''
+        self.dirty.extend(rect for rect in rects if rect)
+
+    def invalidate_all(self):
+        self.dirty = [self.screen.get_rect()]
+
+    def compose(self, rect=None):
+        '''
+        Draw every layer, clipped to rect, without updating the display.
+
+        Args:
+            rect (pygame.Rect) : area to redraw
+                                 default: None (the whole screen)
+        '''
+        self.screen.set_clip(rect)
+        self.screen.fill(self.background)
+        for layer in self.layers:
+            layer(self.screen)
+        self.screen.set_clip(None)
+
+    def update(self):
+        '''
+        Redraw and push every rectangle marked since the last update.
+
+        Returns:
+            rects (list) : rectangles that were pushed to the display
+        '''
+        screen_rect = self.screen.get_rect()
+        rects = [rect.clip(screen_rect) for rect in _merge(self.dirty)]
+        rects = [rect for rect in rects if rect.width and rect.height]
+        for rect in rects:
+            self.compose(rect)
+        if rects:
+            self.present(rects)
+        self.dirty = []
+        return rects
+
+if __name__ == '__main__':
+    print('Module not execuatable.')
+    raise SystemExit
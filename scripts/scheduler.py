@@ -0,0 +1,107 @@
+try:
+    import time
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+class SampleClock:
+    def __init__(self, audio):
+        '''
+        A clock that follows the number of samples the microphone has captured, so the song stays in step with the audio.
+        Samples arrive a chunk at a time, so between chunks the clock runs on the monotonic clock, and it never goes backwards.
+        If the microphone stops delivering samples the clock carries on at the monotonic clock's rate.
+
+        Args:
+            audio (SoundData) : the audio being captured
+        '''
+        self.audio = audio
+        self.last_position = None
+        self.last_change   = None
+        self.base          = 0. # Seconds of audio captured at the last change
+        self.reading       = 0. # Last time returned, to keep the clock monotonic
+
+    def __call__(self):
+        '''
+        Returns:
+            (float) : seconds of audio captured, interpolated between chunks
+        '''
+        now = time.perf_counter()
+        position = self.audio.ring_position # Read once, the capture thread keeps writing
+        if position != self.last_position:
+            self.last_position = position
+            self.last_change = now
+            self.base = position / self.audio.rate
+        self.reading = max(self.reading, self.base + (now - self.last_change))
+        return self.reading
+
+class BeatScheduler:
+    def __init__(self, session, clock=time.perf_counter, fps=60, lead_in=0, max_steps=60):
+        '''
+        Advance a PerformanceSession by as many 60 fps steps as the clock says are due, however fast the screen is being drawn.
+        A slow frame is followed by several steps to catch up, rather than the song slowing down.
+
+        Args:
+            session (PerformanceSession) : the performance to advance
+            clock             (function) : called with no arguments, returns the time in seconds, e.g. time.perf_counter or a SampleClock
+                                           default: time.perf_counter
+            fps                    (int) : steps per second the session's timings are written for
+                                           default: 60
+            lead_in                (int) : frames after start() before the first step, e.g. for a countdown
+                                           default: 0
+            max_steps              (int) : most steps taken by one call to advance, so a long stall is caught up over a few frames
+                                           default: 60
+        '''
+        self.session   = session
+        self.clock     = clock
+        self.fps       = fps
+        self.lead_in   = lead_in
+        self.max_steps = max_steps
+        self.start_time = None
+
+    def start(self):
+        self.start_time = self.clock()
+
+    def frames(self):
+        '''
+        Returns:
+            (float) : frames elapsed since start(), including the lead in and the fraction of the current frame
+        '''
+        if self.start_time is None:
+            return 0.
+        return (self.clock() - self.start_time) * self.fps
+
+    def due(self, frames=None):
+        '''
+        Args:
+            frames (float) : frames elapsed, as returned by frames()
+                             default: None (now)
+
+        Returns:
+                     (int) : number of steps the session should have taken by now
+        '''
+        frames = self.frames() if frames is None else frames
+        return max(int(frames) - self.lead_in + 1, 0) # The first step is taken on the first frame after the lead in
+
+    def advance(self, detect=None):
+        '''
+        Step the session until it has caught up with the clock, or the song is complete.
+
+        Args:
+            detect (function) : passed on to PerformanceSession.step
+                                default: None
+
+        Returns:
+            steps        (int) : number of steps taken
+            phase      (float) : fraction of a step the clock is past the last step, for drawing the notes between steps
+        '''
+        frames = self.frames()
+        behind = self.due(frames) - self.session.frame
+        steps = 0
+        while steps < min(behind, self.max_steps) and not self.session.complete:
+            self.session.step(detect)
+            steps += 1
+        phase = frames - int(frames) if behind <= self.max_steps else 0. # Only interpolate once caught up
+        return steps, phase
+
+if __name__ == '__main__':
+    print('Module not execuatable.')
+    raise SystemExit
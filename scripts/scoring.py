@@ -0,0 +1,96 @@
+try:
+    import argparse
+    import json
+    import numpy as np
+    from scipy.io import wavfile
+    from scripts.audio import DEFAULT_NOTES, NoteClassifier, SoundData
+    from scripts.session import PerformanceSession
+    from scripts.song import compile_song, song_details
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+def read_recording(path):
+    '''
+    Read a Wave file as a mono int16 signal.
+
+    Args:
+        path                (str) : location of the Wave file
+
+    Returns:
+        rate                (int) : sampling frequency in Hz
+        samples (numpy.ndarray) : mono audio signal
+    '''
+    rate, samples = wavfile.read(path)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1) # Mix stereo down to mono
+    if samples.dtype.kind == 'f': # Floating point Wave files store samples between -1 and 1
+        samples = samples * 32767
+    elif samples.dtype == np.uint8: # 8-bit Wave files are unsigned
+        samples = (samples.astype(np.int16)-128) * 256
+    elif samples.dtype == np.int32:
+        samples = samples // 65536
+    return rate, np.asarray(samples, dtype=np.int16)
+
+def score_recording(song_path, recording, notes=None, start=0., buffer_time=.1, pitch_engine='fft', fps=60):
+    '''
+    Score a recorded performance of a song without a window or a microphone.
+    The song is advanced one frame at a time exactly like _performanceScreen. Before each frame the recording is written
+    to the ring buffer up to that frame's time, as the microphone would have captured it, and the note is found from the
+    peaks of the last (buffer_time) seconds of hops, the same way the detection worker does. After the end of the
+    recording the microphone captures silence.
+
+    Args:
+        song_path           (str) : location of the song file
+        recording  (str or tuple) : location of the Wave file, or (rate, samples) already read with read_recording
+        notes              (dict) : calibrated notes and their associated frequencies
+                                    default: DEFAULT_NOTES
+        start             (float) : time in the recording, in seconds, when the countdown finished
+                                    default: 0.0
+        buffer_time       (float) : length of audio analysed each frame in seconds
+                                    default: 0.1
+        pitch_engine        (str) : key in PITCH_ENGINES of the method used to find each frame's frequency
+                                    default: 'fft'
+        fps                 (int) : frames per second the performance screen runs at
+                                    default: 60
+
+    Returns:
+                           (list) : song name, score, percent, song length and the accuracy after each note, as shown by _analysisScreen
+    '''
+    if isinstance(recording, str):
+        recording = read_recording(recording)
+    rate, samples = recording
+    audio = SoundData(rate=rate, pitch_engine=pitch_engine, microphone=False)
+    classifier = NoteClassifier(notes or DEFAULT_NOTES)
+    session = PerformanceSession(song_details(song_path), compile_song(song_path))
+    frame = 0
+
+    def detect():
+        # Capture up to the current frame's time, then analyse the new hops exactly like PitchDetector
+        end = int((start+frame/fps)*rate)
+        while audio.ring_position < end:
+            position = audio.ring_position
+            captured = samples[position:min(end, position+audio.ring_length)] # No more than the ring holds at once
+            if not len(captured):
+                captured = np.zeros(min(end-position, audio.ring_length), dtype=np.int16) # Silence after the recording ends
+            audio._write_to_ring(captured)
+        return classifier.classify(audio.recent_frequencies(buffer_time))
+
+    while session.step(detect):
+        frame += 1
+    return session.result()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score a Wave recording of a song without a window or a microphone.')
+    parser.add_argument('song', help='song file, e.g. "assets/songs/Ode to Joy - Easy.txt"')
+    parser.add_argument('recording', help='mono or stereo Wave file of the performance')
+    parser.add_argument('--notes', help='JSON file of calibrated notes and their frequencies')
+    parser.add_argument('--start', type=float, default=0., help='time in the recording when the countdown finished, in seconds')
+    parser.add_argument('--engine', default='fft', help='pitch engine: fft, yin or hps')
+    args = parser.parse_args()
+
+    notes = None
+    if args.notes:
+        with open(args.notes, 'r') as file:
+            notes = json.load(file)
+    name, score, percent, song_length, note_played_data = score_recording(args.song, args.recording, notes=notes, start=args.start, pitch_engine=args.engine)
+    print(json.dumps({'song':name, 'score':score, 'percent':percent, 'notes':song_length, 'accuracy':note_played_data}))
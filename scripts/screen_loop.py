@@ -0,0 +1,115 @@
+try:
+    import time
+    import pygame
+    from pygame.locals import NOEVENT
+    from scripts.files import write_lines
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+class ScreenLoop:
+    def __init__(self, idle_timeout=500):
+        '''
+        The event loop shared by every screen. Screens that are waiting for input block on pygame.event.wait rather than
+        redrawing as fast as the CPU allows, and only push a new frame when an event woke them.
+        Screens that animate (the performance and calibration) poll at a capped frame rate instead.
+        Keeps CPU and frame statistics for each screen.
+
+        Args:
+            idle_timeout (int) : longest time in milliseconds an idle screen waits for an event before its loop runs anyway
+                                 default: 500
+        '''
+        self.clock = pygame.time.Clock()
+        self.idle_timeout = idle_timeout
+        self.stats = {} # screen name: statistics, see enter()
+        self.current = None # statistics of the screen being shown
+        self.fresh = True # The first poll after entering a screen returns at once, so the screen is drawn before waiting
+        self.idle_wake = False # Whether the last poll timed out with nothing to do
+
+    def _close(self):
+        # Add the time spent on the screen being left to its statistics
+        if self.current:
+            self.current['cpu']  += time.process_time()-self.current['cpu_start']
+            self.current['wall'] += time.perf_counter()-self.current['wall_start']
+
+    def enter(self, name):
+        '''
+        Start counting statistics for a screen.
+
+        Args:
+            name (str) : name of the screen
+        '''
+        self._close()
+        if name not in self.stats:
+            self.stats[name] = {'visits':0, 'iterations':0, 'frames':0, 'idle':0., 'cpu':0., 'wall':0.}
+        self.current = self.stats[name]
+        self.current['visits'] += 1
+        self.current['cpu_start']  = time.process_time() # CPU time of every thread, including audio capture
+        self.current['wall_start'] = time.perf_counter()
+        self.fresh = True
+
+    def poll(self, fps=None):
+        '''
+        Wait for something to do and return the events that happened.
+
+        Args:
+            fps   (int) : frame rate to poll at for a screen that is animating, or None to block until an event arrives
+                          default: None
+
+        Returns:
+            events (list) : pygame events, empty if the idle timeout passed with nothing happening
+        '''
+        if self.current:
+            self.current['iterations'] += 1
+        self.idle_wake = False
+        if fps:
+            self.clock.tick(fps)
+            return pygame.event.get()
+        if self.fresh:
+            self.fresh = False
+            return pygame.event.get()
+        start = time.perf_counter()
+        event = pygame.event.wait(self.idle_timeout)
+        if self.current:
+            self.current['idle'] += time.perf_counter()-start
+        if event.type == NOEVENT:
+            self.idle_wake = True
+            return []
+        return [event] + pygame.event.get()
+
+    def present(self, rects=None):
+        '''
+        Push the frame to the display, unless the loop only ran because the idle timeout passed and so nothing changed.
+
+        Args:
+            rects (list) : areas of the screen to update
+                           default: None (the whole screen)
+        '''
+        if self.idle_wake:
+            return
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+        if self.current:
+            self.current['frames'] += 1
+
+    def report(self, path):
+        '''
+        Write the time, CPU use and frame rate of each screen shown to a text file.
+
+        Args:
+            path (str) : location of the text file, replaced each time
+        '''
+        self._close()
+        if self.current: # Keep counting from now if the screen carries on
+            self.current['cpu_start']  = time.process_time()
+            self.current['wall_start'] = time.perf_counter()
+        lines = [f'{"screen":<22}{"visits":>7}{"seconds":>9}{"cpu %":>7}{"idle %":>8}{"frames":>8}{"fps":>7}']
+        for name, stats in self.stats.items():
+            wall = max(stats['wall'], 1e-9)
+            lines.append(f"{name:<22}{stats['visits']:>7}{stats['wall']:>9.1f}{100*stats['cpu']/wall:>7.1f}{100*stats['idle']/wall:>8.1f}{stats['frames']:>8}{stats['frames']/wall:>7.1f}")
+        write_lines(path, lines) # Nothing is lost but the report if it can't be written
+
+if __name__ == '__main__':
+    print('Module not execuatable.')
+    raise SystemExit
@@ -0,0 +1,215 @@
+try:
+    from collections import deque
+    from scripts.song import SongParser, SPAWN_ACTIONS
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+# Widths in pixels of the images drawn left of the hitbox by Application._performanceScreen, used to place the hitbox without pygame
+KEY_SIGNATURE_WIDTHS = {'Ab':137,
+                        'Bb':93,
+                        'Cb':229,
+                        'Db':165,
+                        'Eb':105,
+                        'Gb':192}
+
+def stave_hitbox(key):
+    '''
+    Find where the performance screen draws the hitbox for a key signature.
+    The time signature is drawn 50 pixels left of the 256 pixel wide cleff (or just right of the key signature) and is 49 pixels wide,
+    and the 50 pixel wide hitbox is drawn 25 pixels right of it.
+
+    Args:
+        key     (str) : key signature of the song, e.g. 'C' or 'Eb'
+
+    Returns:
+        hitbox (list) : left and right x-coordinates of the hitbox
+    '''
+    if key in ['C','Am']: # The key of C and Am have no special notation
+        left = 256-50+49+25
+    else:
+        left = 256-75+KEY_SIGNATURE_WIDTHS[key]+49+25
+    return [left, left+50]
+
+class PerformanceSession:
+    def __init__(self, song, compiled_song, images=None, hitbox=None, screen_width=1280, spawns=None):
+        '''
+        The scoring state of one song performance, advanced one 60 fps frame at a time by step().
+        Holds everything _performanceScreen used to keep in global variables, so it can run without a window.
+
+        Args:
+            song                   (list) : details of the song, consisting of song name, difficulty, and file address
+            compiled_song  (CompiledSong) : the song's timeline as returned by compile_song
+            images                 (dict) : note images passed on to SongParser, or None to score without them
+                                            default: None
+            hitbox                 (list) : left and right x-coordinates of the hitbox
+                                            default: stave_hitbox(key)
+            screen_width            (int) : x-coordinate where new notes are spawned
+                                            default: 1280
+            spawns                 (list) : [frame, action] for every spawn, or False to work them out from the tick count as it goes and record them
+                                            default: None (the schedule compiled with the song)
+        '''
+        header = compiled_song.header
+        self.song           = song
+        self.Song           = SongParser(compiled_song, images) # Load SongParser object
+        self.tempo          = header['tempo']
+        self.cleff          = header['cleff']
+        self.time_signature = header['time_signature']
+        self.key            = header['key']
+        self.song_length    = header['song_length']
+        self.hitbox         = hitbox or stave_hitbox(self.key)
+        self.metronome_offset = round(((screen_width-self.hitbox[0])/(self.tempo/20))/(60**2/self.tempo))
+
+        # Miscellaneous variables
+        self.metronome = 'left'
+        self.current_mic_note = 'X'
+        self.current_note = 'Y'
+        self.score = 0
+        self.tick = 0
+        self.frame = 0 # Number of steps taken, unlike tick this never jumps
+        self.beats = 0
+        self.note_tracking = {} # id of a note on screen: [note detected, timing offset, rest], kept apart as drawing relies on the order of a note's keys
+        self.note_buffer = [self._next_note()]
+        self.note_played_data = []
+        self.note_records = [] # [note name, note detected while it was in the hitbox, timing offset in seconds, played, rest] for each note, see PerformanceHistory
+        self.complete = False
+
+        if spawns is False: # Record the spawns as they happen, to check the compiled schedule against
+            self.spawns = []
+            self.schedule = None
+        else:
+            self.spawns = None
+            if spawns is None:
+                spawns = zip(compiled_song.spawn_frame.tolist(), [SPAWN_ACTIONS[action] for action in compiled_song.spawn_action])
+            self.schedule = deque(spawns) # Spawns still to come, earliest first
+
+    def _next_note(self):
+        # Serve the next note of the song, marking rests in note_tracking as their note name is a pitch like any other note's
+        note = self.Song.next_note()
+        if note and self.Song.rest:
+            self.note_tracking[id(note)] = ['X', None, True]
+        return note
+
+    def step(self, detect=None):
+        '''
+        Advance the performance by one frame: spawn, move and score the notes.
+
+        Args:
+            detect (function) : called with no arguments once the song is underway, returns the note being played or None to keep the last one
+                                default: None
+
+        Returns:
+                       (bool) : whether the song is still being played
+        '''
+        beat = 60**2/self.tempo # Number of frames per beat
+        note_buffer = self.note_buffer
+
+        if self.tick % beat == 0:
+            note_buffer[-1]['long_duration_bool'] += 1
+
+        if (self.tick-(3*self.metronome_offset)) % beat == 0:
+            self.beats += 1
+            if self.metronome == 'left':
+                self.metronome = 'right'
+            else:
+                self.metronome = 'left'
+
+        if self.tick:
+            # Spawn actions: 'bar' adds a bar line, 'note' adds the next note, 'wait' holds a long note for another beat
+            action = None
+            if self.schedule is not None:
+                if self.schedule and self.schedule[0][0] == self.frame:
+                    action = self.schedule.popleft()[1]
+            elif self.tick % round(beat*note_buffer[-1]['note_length']) == 0 and note_buffer[0]:
+                if self.Song.end_of_bar:
+                    action = 'bar'
+                elif note_buffer[-1]['note_length'] > 1 and note_buffer[-1]['long_duration_bool'] != note_buffer[-1]['note_length']:
+                    action = 'wait'
+                else:
+                    action = 'note'
+                self.spawns.append([self.frame, action])
+
+            if action:
+                if action == 'bar':
+                    note_buffer.append({'pos': 1280,
+                                        'note_length': note_buffer[-1]['note_length'],
+                                        'note_name': 'X',
+                                        'long_duration_bool': 0,
+                                        'played': 5,
+                                        'note_img_offset':0,
+                                        'note_img': [None, 0]})
+                    self.Song.end_of_bar = False
+                elif action == 'wait':
+                    self.tick += beat
+                else:
+                    note_buffer.append(self._next_note())
+
+                if self.Song.end_of_bar:
+                    note_buffer[-1]['note_length'] /= 2
+
+                if note_buffer[-1] == None: # End of the song is reached
+                    del note_buffer[-1]
+                    note_buffer.insert(0,None)
+
+            if self.tick > 10 and detect:
+                mic_note = detect()
+                if mic_note:
+                    self.current_mic_note = mic_note
+
+        if self.current_note in self.current_mic_note.split('/'):
+            for note in note_buffer:
+                if note:
+                    if note['note_name'][-1] == 'n':
+                        note_name = note['note_name'][0]
+                    else:
+                        note_name = note['note_name'][0] + note['note_name'][-1]
+
+                    if note_name == self.current_note:
+                        note['played'] -= 1
+                        break
+
+        for i,note in enumerate(note_buffer):
+            if note:
+                note['pos'] -= self.tempo/20
+                if self.hitbox[0] < note['pos'] < self.hitbox[1]:
+                    if note['note_name'][-1] == 'n':
+                        self.current_note = note['note_name'][0]
+                    else:
+                        self.current_note = note['note_name'][0] + note['note_name'][-1]
+                    self.note_tracking.setdefault(id(note), ['X', None, False])[0] = self.current_mic_note # The last note heard while this one was in the hitbox
+                elif note['pos'] < self.hitbox[0]-40:
+                    note['played'] = 2**40
+
+                if note['played'] <= 0:
+                    tracking = self.note_tracking.setdefault(id(note), ['X', None, False])
+                    if tracking[1] is None: # Seconds after the note reached the middle of the hitbox, negative if played early
+                        tracking[1] = ((self.hitbox[0]+self.hitbox[1])/2-note['pos'])/(self.tempo/20)/60
+                        tracking[0] = self.current_mic_note # The note that completed it
+                    note['pos'] = -40
+                    self.current_note = 'X'
+                    self.score += 1
+
+                if note['pos'] <= -40:
+                    del note_buffer[i] # Delete the note when it's x-position is off screen
+                    detected, offset, rest = self.note_tracking.pop(id(note), ['X', None, False])
+                    if note['note_name'] != 'X':
+                        self.note_played_data.append(round(100*(self.score/(len(self.note_played_data)+1)))) # Percent of notes played correctly out of all the notes so far
+                        self.note_records.append([note['note_name'], detected, offset, note['played'] <= 0, rest])
+                else:
+                    note_buffer[i] = note
+
+        if note_buffer == [None]:
+            self.complete = True
+        self.tick += 1
+        self.frame += 1
+        return not self.complete
+
+    def result(self):
+        '''
+        Returns:
+            (list) : song name, score, percent, song length and the accuracy after each note, as shown by _analysisScreen
+        '''
+        return [self.song[0], self.score, round(100*(self.score/self.song_length)), self.song_length, self.note_played_data]
+
+if __name__ == '__main__':
+    print('Module not execuatable.')
+    raise SystemExit
@@ -1,62 +1,264 @@
 try:
-    import pygame
+    import os
+    import json
+    import numpy as np
+    from scripts.files import write_atomic
 except ImportError as e: # most likely a ModuleNotFoundError
     raise Exception(f'Could not import a module: {e}.')
+try:
+    import pygame
+except ImportError: # Only needed for the note images, songs can still be parsed for offline scoring without it
+    pygame = None
+
+def load_song(path):
+    '''
+    Read a song file into its bars of note strings.
+
+    Args:
+        path             (str) : location of the song file
+
+    Returns:
+        song_contents   (list) : the header followed by one list of note strings per bar
+    '''
+    with open(path, mode='r') as File:
+        song_contents = File.read().split('|') # Read the song file into a list
+    for i,bar in enumerate(song_contents):
+        song_contents[i] = bar.strip('\n').split(',') # Strip all newlines and split into individual notes
+    return song_contents
+
+def read_header(song_contents):
+    '''
+    Identify the song variables stored in the header of a song file.
+
+    Args:
+        song_contents (list) : the song file as returned by load_song
+
+    Returns:
+        header        (dict) : tempo, cleff, time_signature (list of two str), key and song_length
+    '''
+    header = dict(item.split('=') for item in song_contents[0]) # e.g. 'tempo=100' --> {'tempo':'100'}
+    return {'tempo'         :int(header['tempo']),
+            'cleff'         :header['cleff'],
+            'time_signature':header['time_signature'].split('/'),
+            'key'           :header['key'],
+            'song_length'   :int(header['notes'])}
+
+def song_details(path):
+    '''
+    Get the name, difficulty and location of a song from its file name, e.g. "Ode to Joy - Easy.txt".
+
+    Args:
+        path    (str) : location of the song file
+
+    Returns:
+        song   (list) : song name, difficulty and file address
+    '''
+    name = os.path.splitext(os.path.basename(path))[0].split(' - ')
+    return [name[0], name[-1], path]
+
+# Creates a list of note names by iterating through ['G','F','E','D','C','B','A'], each iteration of range(7,0,-1) (which counts down from 7 to 1). Then it adds both str values together into the list
+# Finally, the list (['G7', 'F7', 'E7', ... , 'D1', 'C1', 'B1', 'A1']) is iterated through with each value becoming a key in the dictionary with a corresponing y-value
+PITCHES = [y+str(x) for x in range(7,0,-1) for y in ['G','F','E','D','C','B','A']]
+Y_POS = {i:int(count*20+60) for count,i in enumerate(PITCHES)} # Dictionary of each note and its y-value on screen
+ACCIDENTALS = ['n','#','b']
+DURATIONS = {0.25:'sixteenth_',
+             0.5:'eighth_',
+             1.0:'quarter_',
+             2.0:'half_',
+             4.0:'whole_'}
+IMAGE_KEYS = [duration+kind for kind in ['note','rest'] for duration in DURATIONS.values()] # e.g. 'quarter_note', 'half_rest'
+SPAWN_ACTIONS = ['bar','note','wait'] # What a performance spawns, see PerformanceSession.step
+COMPILER_VERSION = 3 # Increase whenever the compiled format changes, so old cache files are rebuilt
+
+class CompiledSong:
+    def __init__(self, header, duration, pitch, accidental, image_key, bar_end, spawn_frame, spawn_action):
+        '''
+        A song as a precomputed timeline, one entry per note in every array.
+
+        Args:
+            header              (dict) : song variables, see read_header
+            duration   (numpy.ndarray) : length of each note in beats
+            pitch      (numpy.ndarray) : index of each note's name in PITCHES
+            accidental (numpy.ndarray) : index of each note's accidental in ACCIDENTALS
+            image_key  (numpy.ndarray) : index of each note's image in IMAGE_KEYS
+            bar_end    (numpy.ndarray) : whether each note is the last of its bar
+            spawn_frame  (numpy.ndarray) : frame of the performance each spawn happens on, see _spawn_schedule
+            spawn_action (numpy.ndarray) : index in SPAWN_ACTIONS of what each spawn adds
+        '''
+        self.header     = header
+        self.duration   = duration
+        self.pitch      = pitch
+        self.accidental = accidental
+        self.image_key  = image_key
+        self.bar_end    = bar_end
+        self.spawn_frame  = spawn_frame
+        self.spawn_action = spawn_action
+
+    def __len__(self):
+        return len(self.duration)
+
+def _spawn_schedule(header, duration, bar_end):
+    '''
+    Work out the frame each bar line and note of a song is spawned on, following the same tick counting as PerformanceSession.step.
+    Spawning only depends on the song, so it is worked out once when the song is compiled rather than at the start of every performance.
+
+    Args:
+        header             (dict) : song variables, see read_header
+        duration  (numpy.ndarray) : length of each note in beats
+        bar_end   (numpy.ndarray) : whether each note is the last of its bar
+
+    Returns:
+        spawn_frame  (numpy.ndarray) : frame of the performance each spawn happens on
+        spawn_action (numpy.ndarray) : index in SPAWN_ACTIONS of what each spawn adds
+    '''
+    beat = 60**2/header['tempo'] # Number of frames per beat
+    frames, actions = [], []
+    if not len(duration):
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int8)
+    note_length, long_duration_bool = float(duration[0]), 0 # The last note or bar line spawned
+    end_of_bar = bool(bar_end[0])
+    index = 1 # Index of the next note to be spawned
+    tick = frame = 0
+    while index <= len(duration):
+        if tick % beat == 0:
+            long_duration_bool += 1
+        if tick and tick % round(beat*note_length) == 0:
+            if end_of_bar:
+                action = 'bar'
+                long_duration_bool = 0
+                end_of_bar = False
+            elif note_length > 1 and long_duration_bool != note_length:
+                action = 'wait'
+                tick += beat
+            else:
+                action = 'note'
+                if index < len(duration):
+                    note_length, long_duration_bool = float(duration[index]), 0
+                    end_of_bar = bool(bar_end[index])
+                index += 1 # Past the last note the song is finished and nothing more is spawned
+            if end_of_bar:
+                note_length /= 2
+            frames.append(frame)
+            actions.append(SPAWN_ACTIONS.index(action))
+        tick += 1
+        frame += 1
+    return np.array(frames, dtype=np.int32), np.array(actions, dtype=np.int8)
+
+def _compile(song_contents):
+    '''
+    Turn the bars of note strings into a CompiledSong.
+
+    Args:
+        song_contents (list) : the song file as returned by load_song
+
+    Returns:
+                (CompiledSong) : the precomputed timeline
+    '''
+    header = read_header(song_contents)
+    notes = [[note, i == len(bar)-1] for bar in song_contents[1:-1] for i, note in enumerate(bar)] # Remove the metadata at index 0 and blank entry at index -1
+    # e.g. 'E4n1.000n' --> pitch 'E4', accidental 'n', duration 1.0, note ('n') or rest ('r')
+    duration = np.array([float(note[3:-1]) for note, bar_end in notes], dtype=np.float32)
+    bar_end = np.array([bar_end for note, bar_end in notes], dtype=bool)
+    return CompiledSong(header,
+                        duration,
+                        np.array([PITCHES.index(note[:2]) for note, bar_end in notes], dtype=np.int8),
+                        np.array([ACCIDENTALS.index(note[2]) for note, bar_end in notes], dtype=np.int8),
+                        np.array([IMAGE_KEYS.index(DURATIONS[float(note[3:-1])]+('note' if note[-1] == 'n' else 'rest')) for note, bar_end in notes], dtype=np.int8),
+                        bar_end,
+                        *_spawn_schedule(header, duration, bar_end))
+
+def compile_song(path, cache_dir=None):
+    '''
+    Get the compiled timeline of a song file, from the cache if the song file has not changed since it was compiled.
+
+    Args:
+        path        (str) : location of the song file
+        cache_dir   (str) : folder the compiled songs are kept in, outside the assets folder so the asset manifest stays valid
+                            default: './.cache/songs'
+
+    Returns:
+         (CompiledSong) : the precomputed timeline
+    '''
+    cache_dir = cache_dir or os.path.join('.', '.cache', 'songs')
+    cache_path = os.path.join(cache_dir, os.path.splitext(os.path.basename(path))[0]+'.npz')
+    source = os.path.abspath(path) # Songs in different folders can share a name, so the cache records which one it holds
+    mtime = os.path.getmtime(path)
+    try:
+        with np.load(cache_path) as cache:
+            if cache['version'] == COMPILER_VERSION and cache['mtime'] == mtime and str(cache['source']) == source:
+                return CompiledSong(json.loads(str(cache['header'])), cache['duration'], cache['pitch'], cache['accidental'], cache['image_key'], cache['bar_end'],
+                                    cache['spawn_frame'], cache['spawn_action'])
+    except (OSError, KeyError, ValueError): # No cache yet, or it is unreadable, so compile the song again
+        pass
+
+    song = _compile(load_song(path))
+    write_atomic(cache_path, # If it can't be written the song is just compiled every time
+                 lambda temporary_path: np.savez(temporary_path, version=COMPILER_VERSION, mtime=mtime, source=source, header=json.dumps(song.header),
+                                                 duration=song.duration, pitch=song.pitch, accidental=song.accidental, image_key=song.image_key, bar_end=song.bar_end,
+                                                 spawn_frame=song.spawn_frame, spawn_action=song.spawn_action),
+                 suffix='.tmp.npz')
+    return song
 
 class SongParser:
-    def __init__(self, song, images):
+    def __init__(self, song, images=None):
         '''
-        Class to handle the translation of song files into their components.
+        Class to serve the notes of a compiled song in order.
 
         Args:
-            song   (list) : the song file with all the song data
-            images (dict) : contains all the image Surface objects and names the program uses
+            song   (CompiledSong) : the compiled song, see compile_song
+            images         (dict) : contains all the image Surface objects and names the program uses, or None to serve the notes without their images
+                                    default: None
         '''
-        self.song = song[1:-1][::-1] # Remove the metadata at index 1 and blank entry at index -1 and reverse the list
-        for i,bar in enumerate(self.song):
-            self.song[i] = bar[::-1] # Reverse the notes in each bar
+        self.song = song
         self.images = images
-        self.current_bar = self.song.pop()
-        # Creates a list of note names by iterating through ['G','F','E','D','C','B','A'], each iteration of range(7,0,-1) (which counts down from 7 to 1). Then it adds both str values together into the list
-        # Finally, the list (['G7', 'F7', 'E7', ... , 'D1', 'C1', 'B1', 'A1']) is iterated through with each value becoming a key in the dictionary with a corresponing y-value
-        self.y_pos = {i:int(count*20+60) for count,i in enumerate([y+str(x) for x in range(7,0,-1) for y in ['G','F','E','D','C','B','A']])} # Dictionary of each note and its y-value on screen
-        self.tilt = {'#':images['sharp'],
-                     'b':images['flat'],
-                     'n':None}
-        self.durations = {0.25:'sixteenth_',
-                          0.5:'eighth_',
-                          1.0:'quarter_',
-                          2.0:'half_',
-                          4.0:'whole_'}
-
-    def _parse(self, note):
+        self.index = 0 # Index of the next note to be served
+        self.end_of_bar = False
+        self.rest = False # Whether the last note served is a rest
+        self.y_pos = Y_POS
+        if images:
+            self.tilt = {'#':images['sharp'],
+                         'b':images['flat'],
+                         'n':None}
+        else:
+            self.tilt = {'#':None, 'b':None, 'n':None}
+        self.durations = DURATIONS
+        self.flipped = {} # Note images with the stem facing downwards, flipped once per image rather than once per note
+
+    def _note(self, i):
         '''
-        Translate a string note/rest name and duration into a dictionary of data.
+        Build the dictionary of data for the note at index i of the compiled song.
 
         Args:
-            note   (str) : contains information about note/rest name, duration and whether it is sharp or flat or not
+            i       (int) : index of the note
 
         Returns:
-            image (dict) : all the data of the note, including loaded image files
+            image  (dict) : all the data of the note, including loaded image files
         '''
+        song = self.song
+        pitch = PITCHES[song.pitch[i]]
+        accidental = ACCIDENTALS[song.accidental[i]]
+        image_key = IMAGE_KEYS[song.image_key[i]]
         image = {'pos':1280} # x-coord of where each note should start in the window
-        image['note_length'] = float(note[3:-1]) # Append note length 
-        image['note_name'] = note[:3] # Append note as string
+        image['note_length'] = float(song.duration[i]) # Append note length 
+        image['note_name'] = pitch + accidental # Append note as string
         image['long_duration_bool'] = 0 # Used to track if a note longer than 1 beat has been spawned for its note duration
         image['played'] = 5 # Number of times microphone detected note must match before the note is successfully played 
-        duration = self.durations[image['note_length']] # Lookup the image prefix in the self.durations dict
-        y_pos = self.y_pos[note[:2]] 
-        tilt = self.tilt[note[2]]
-        
-        if note[-1] == 'n':
-            if y_pos < self.y_pos['B5']: # Any note higher than B5 should have it's stem facing downwards
+        y_pos = Y_POS[pitch]
+        tilt = self.tilt[accidental]
+
+        if not self.images:
+            return image # Offline scoring only needs the timing and note name
+        if image_key.endswith('note'):
+            if y_pos < Y_POS['B5']: # Any note higher than B5 should have it's stem facing downwards
+                if image_key not in self.flipped:
+                    self.flipped[image_key] = pygame.transform.flip(self.images[image_key], True, True) # Flip horizontally and vertically
                 image['note_img_offset'] = 18 # Account for height of image file
-                image['note_img'] = [pygame.transform.flip(self.images[duration+'note'], True, True),y_pos-image['note_img_offset']] # Flip horizontally and vertically
+                image['note_img'] = [self.flipped[image_key],y_pos-image['note_img_offset']]
             else:
                 image['note_img_offset'] = 118
-                image['note_img'] = [self.images[duration+'note'],y_pos-image['note_img_offset']] # Take 118 from y_pos to account for image height of notes
-        elif note[-1] == 'r':
-            image['note_img'] = [self.images[duration+'rest'],350] # The image should always be at y=350 if it is a rest
+                image['note_img'] = [self.images[image_key],y_pos-image['note_img_offset']] # Take 118 from y_pos to account for image height of notes
+        else:
+            image['note_img'] = [self.images[image_key],350] # The image should always be at y=350 if it is a rest
 
         if tilt:
             image['tilt'] = [tilt,y_pos-115]
@@ -68,17 +270,16 @@ class SongParser:
 
         Returns:
             self.note     (dict) : all the data of the note, including loaded image files
-            None      (NoneType) : special condition returned when self.song is empty
+            None      (NoneType) : special condition returned when there are no notes left
         '''
-        self.end_of_bar = len(self.current_bar)==1 # Boolean of whether self.current_bar has length of 1
-        if not self.current_bar:
-            if self.song: # When the song has no more notes it will evaluate as False
-                self.current_bar = self.song.pop()
-                if len(self.current_bar) == 1:
-                    self.end_of_bar = True
-            else:
-                return None
-        self.note = self._parse(self.current_bar.pop()) # Parse the next note in the song
+        if self.index >= len(self.song):
+            self.end_of_bar = False
+            self.rest = False
+            return None
+        self.end_of_bar = bool(self.song.bar_end[self.index]) # Whether this is the last note of its bar
+        self.rest = IMAGE_KEYS[self.song.image_key[self.index]].endswith('rest')
+        self.note = self._note(self.index)
+        self.index += 1
         return self.note
         
 if __name__ == '__main__':
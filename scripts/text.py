@@ -0,0 +1,97 @@
+try:
+    from collections import OrderedDict
+    import pygame
+except ImportError as e: # most likely a ModuleNotFoundError
+    raise Exception(f'Could not import a module: {e}.')
+
+class TextCache:
+    def __init__(self, font_path='.\\assets\\font.ttf', max_surfaces=512):
+        '''
+        A process-wide cache of loaded fonts and rendered text, so static text is only rasterized once.
+        Fonts are loaded the first time a size is asked for and kept, rendered text is kept until it is the least recently used.
+
+        Args:
+            font_path    (str) : location of the font file
+                                 default: '.\\assets\\font.ttf'
+            max_surfaces (int) : number of rendered text surfaces kept before the least recently used is evicted
+                                 default: 512
+        '''
+        self.font_path    = font_path
+        self.max_surfaces = max_surfaces
+        self.fonts    = {} # size: pygame.font.Font
+        self.surfaces = OrderedDict() # (size, text, colour, antialias): pygame.Surface, oldest first
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+    def font(self, size):
+        '''
+        Args:
+            size                (int) : text height in pixels
+
+        Returns:
+            (pygame.font.Font) : the font at that size, loaded from disk only the first time
+        '''
+        if size not in self.fonts:
+            self.fonts[size] = pygame.font.Font(self.font_path, size)
+        return self.fonts[size]
+
+    def render(self, text, size, color=(0,0,0), antialias=True):
+        '''
+        Render text, or return the surface it was rendered to last time.
+        The returned surface is shared, so it should be blitted rather than drawn on.
+
+        Args:
+            text       (str) : text to render
+            size       (int) : text height in pixels
+            color    (tuple) : text color
+                               default: (0,0,0)
+            antialias (bool) : whether to smooth the edges of the text
+                               default: True
+
+        Returns:
+            (pygame.Surface) : the rendered text
+        '''
+        key = (size, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key) # Mark as most recently used
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self.font(size).render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_surfaces:
+            self.surfaces.popitem(last=False) # Evict the least recently used text
+            self.evictions += 1
+        return surface
+
+    def stats(self):
+        '''
+        Returns:
+            (dict) : number of hits, misses, evictions, cached surfaces and loaded fonts
+        '''
+        return {'hits'     :self.hits,
+                'misses'   :self.misses,
+                'evictions':self.evictions,
+                'surfaces' :len(self.surfaces),
+                'fonts'    :len(self.fonts)}
+
+    def clear(self):
+        '''
+        Forget every font and rendered surface, e.g. before pygame.font.quit() invalidates them.
+        '''
+        self.fonts.clear()
+        self.surfaces.clear()
+
+TEXT = TextCache() # Shared by every screen and UI element
+
+def render_text(text, size, color=(0,0,0), antialias=True):
+    '''
+    Render text with the shared cache, see TextCache.render.
+    '''
+    return TEXT.render(text, size, color, antialias)
+
+if __name__ == '__main__':
+    print('Module not execuatable.')
+    raise SystemExit
@@ -2,6 +2,7 @@ try:
     import string
     import pygame
     from pygame.locals import *
+    from scripts.text import render_text
 except ImportError as e: # most likely a ModuleNotFoundError
     raise Exception('Could not import a module: %s.' % e)
 
@@ -45,8 +46,7 @@ class Button:
         pygame.draw.rect(self.ctx.screen, self.colors['alt'], self.rect) # draw the button frame
         pygame.draw.rect(self.ctx.screen, color, pygame.Rect((self.rect.x+5,self.rect.y+5),
                                                              (self.rect.width-10,self.rect.height-10))) # draw the button inside (making a 10 pixel wide frame)
-        font  = pygame.font.Font('.\\assets\\font.ttf', self.dimensions[1]-self.text_size) # load the correct font
-        label = font.render(self.text, True, self.colors['text'])
+        label = render_text(self.text, self.dimensions[1]-self.text_size, self.colors['text']) # rendered once, then reused from the text cache
         self.ctx.screen.blit(label, (self.position[0]-self.dimensions[0]*.45,self.position[1]-self.dimensions[1]*.45)) # render the text in the middle of the button
 
     def check(self, mouse_pos):
@@ -152,29 +152,32 @@ class ScrollBar:
         return self.scroll_position
 
 class SongTab:
-    def __init__(self, ctx, start_pos, song=['name','difficulty','location'], highscore=-1):
+    def __init__(self, ctx, start_pos, song=['name','difficulty','location'], highscore=-1, details=[]):
         self.ctx       = ctx
         self.start_pos = start_pos
         self.position  = start_pos
         self.song      = song
         self.button    = Button(self.ctx, text='play', text_size=22, position=[self.position+125,400], dimensions=[160,75], color=(213,240,247), alt_color=(0,162,232), hover_color=(58,186,218), text_color=(0,0,0))
         self.highscore = highscore
+        self.details   = details
 
     def render(self):
         pygame.draw.rect(self.ctx.screen, (0,162,232), (self.position, 115, 250, 350))
         pygame.draw.rect(self.ctx.screen, (153,217,234), (self.position+5, 120, 240, 340)) # 5 pixels smaller to create a border
 
-        font_40  = pygame.font.Font('.\\assets\\font.ttf', 40) # size 40 text
-        font_20  = pygame.font.Font('.\\assets\\font.ttf', 20) # size 20 text
-        name = font_40.render(self.song[0], True, (0,0,0)) # create the song name text
-        diff = font_20.render(self.song[1], True, (0,0,0)) # create the song difficulty text
+        name = render_text(self.song[0], 40) # create the song name text
+        diff = render_text(self.song[1], 20) # create the song difficulty text
         self.ctx.screen.blit(name, (self.position+10,120)) # render all the text
         self.ctx.screen.blit(diff, (self.position+10,170))
 
         if self.highscore >= 0:
-            highscore = font_20.render(f'Highscore: {self.highscore}%', True, (0,0,0))
+            highscore = render_text(f'Highscore: {self.highscore}%', 20)
             self.ctx.screen.blit(highscore, (self.position+10,200))
 
+        for line, text in enumerate(self.details): # e.g. tempo, time signature and key, then the number of notes
+            details = render_text(text, 20)
+            self.ctx.screen.blit(details, (self.position+10,230+25*line))
+
     def set_x(self, x):
         self.button.set_position([self.start_pos+125+x,400])
         self.position = self.start_pos + x
@@ -182,6 +185,90 @@ class SongTab:
     def get_x(self):
         return self.position
 
+class SongCarousel:
+    def __init__(self, ctx, songs, highscores=None, history=None, tab_width=275, first_tab=140, view_width=1280):
+        '''
+        Create a row of song tabs, of which only the tabs on screen exist, so scrolling costs the same however many songs there are.
+
+        Args:
+            ctx (__main__.Application) : context of the Application instance required for rendering the tabs
+            songs               (list) : song library entries to show, in order, see SongLibrary.query
+            highscores          (dict) : song name: high score percent, or None to not show high scores
+                                         default: None
+            history (PerformanceHistory) : the user's performance history, or None to not show how often each song was played
+                                         default: None
+            tab_width            (int) : distance between the left of one tab and the next
+                                         default: 275
+            first_tab            (int) : x coordinate of the first tab when not scrolled
+                                         default: 140
+            view_width           (int) : width of the screen the tabs are shown on
+                                         default: 1280
+        '''
+        self.ctx        = ctx
+        self.songs      = songs
+        self.highscores = highscores
+        self.history    = history
+        self.tab_width  = tab_width
+        self.first_tab  = first_tab
+        self.view_width = view_width
+        self.tabs = {} # index in songs: SongTab, only for the tabs on screen
+
+    def get_scroll_length(self):
+        return max(round(self.tab_width*len(self.songs))-1025, 0) # 0 when every tab fits, so there is nothing to scroll
+
+    def _make_tab(self, index):
+        song = self.songs[index]
+        highscore = self.highscores.get(song['name'], 0) if self.highscores is not None else -1
+        details = [f"{song['tempo']} bpm  {song['time_signature']}  {song['key']}", f"{song['notes']} notes"]
+        song_stats = self.history.song_stats(song['name']) if self.history else None # From the running aggregates, so this never reads the history itself
+        if song_stats:
+            details.append(f"{song_stats['plays']} plays, average {song_stats['mean']:.0f}%")
+        return SongTab(self.ctx, start_pos=self.first_tab+self.tab_width*index, song=[song['name'], song['difficulty'], song['path']], highscore=highscore, details=details)
+
+    def set_x(self, x):
+        '''
+        Scroll the tabs, creating the tabs that come on screen and dropping the ones that leave it.
+
+        Args:
+            x (int) : scroll offset, as returned by ScrollBar.get_notch_position
+        '''
+        first = max(int((-self.tab_width-self.first_tab-x)//self.tab_width), 0) # Only the indices that could be on screen are looked at
+        last  = min(int((self.view_width-self.first_tab-x)//self.tab_width)+1, len(self.songs))
+        visible = [index for index in range(first, last) if -self.tab_width < self.first_tab+self.tab_width*index+x < self.view_width]
+        for index in list(self.tabs):
+            if index not in visible:
+                del self.tabs[index]
+        for index in visible:
+            if index not in self.tabs:
+                self.tabs[index] = self._make_tab(index)
+            self.tabs[index].set_x(x)
+
+    def render(self, mouse_pos):
+        '''
+        Draw the tabs on screen.
+
+        Args:
+            mouse_pos (tuple) : mouse coordinates, for the play button hover color
+        '''
+        for tab in self.tabs.values():
+            tab.render()
+            tab.button.check(mouse_pos)
+
+    def check(self, mouse_pos):
+        '''
+        Find which play button, if any, is under the mouse.
+
+        Args:
+            mouse_pos (tuple) : mouse coordinates
+
+        Returns:
+            (list) : song name, difficulty and file address of the song, or None
+        '''
+        for tab in self.tabs.values():
+            if tab.button.check(mouse_pos):
+                return tab.song
+        return None
+
 class TextInput:
     def __init__(self, ctx, dimensions, position, character_limit, allowed_characters, color, active_color, input_hidden=False):
         self.ctx             = ctx
@@ -203,11 +290,10 @@ class TextInput:
             pygame.draw.rect(self.ctx.screen, self.colors['active'], self.rect)
         else:
             pygame.draw.rect(self.ctx.screen, self.colors['inactive'], self.rect)
-        font = pygame.font.Font('.\\assets\\font.ttf', self.dimensions[1])
         if self.input_hidden:
-            text = font.render('•'*len(self.value), True, (0,0,0))
+            text = render_text('•'*len(self.value), self.dimensions[1])
         else:
-            text = font.render(''.join(self.value), True, (0,0,0))
+            text = render_text(''.join(self.value), self.dimensions[1])
         self.ctx.screen.blit(text, (self.rect.left,self.rect.top-(.2*self.dimensions[1])))
 
     def check(self, mouse_pos, mouse_clicked):
@@ -1,79 +1,209 @@
 try:
     import os
     import json
+    import sqlite3
 except ImportError as e: # most likely a ModuleNotFoundError
     raise Exception(f'Could not import a module: {e}.')
 
+SCHEMA_VERSION = 2
+
+class UserStore:
+    def __init__(self, path='./assets/users/users.db', legacy_directory='./assets/users'):
+        '''
+        Every user account, kept in one SQLite database so looking up a user is a single indexed query
+        however many accounts there are. Several copies of the program (e.g. on a shared lab machine) can use the same database.
+        Account data is cached in memory, and the cache is dropped whenever the database is written, by this or any other copy.
+
+        Args:
+            path             (str) : location of the database, created if it does not exist
+                                     default: './assets/users/users.db'
+            legacy_directory (str) : folder of JSON user files imported when the database is first created
+                                     default: './assets/users'
+        '''
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=10) # Wait up to 10 seconds for another copy of the program to finish writing
+        try:
+            self.connection.execute('PRAGMA journal_mode = WAL') # Readers do not block the writer
+        except sqlite3.OperationalError: # Not supported on some network drives, the default journal still works
+            pass
+        self.cache = {} # username: account data
+        self.data_version = None
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version < 1:
+            self._create(legacy_directory)
+        if version < 2:
+            self._upgrade()
+
+    def _upgrade(self):
+        # Version 2: each performance is only kept in the user's PerformanceHistory, which also has the notes played
+        with self.connection:
+            self.connection.execute('DROP TABLE IF EXISTS song_history')
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _create(self, legacy_directory):
+        # Create the tables, and import the JSON user files the program used to keep
+        with self.connection: # One transaction, so a half created database is never left behind
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS users (
+                                           username TEXT PRIMARY KEY,
+                                           password TEXT NOT NULL,
+                                           data     TEXT NOT NULL DEFAULT '{}')''')
+            if os.path.isdir(legacy_directory):
+                for file in sorted(os.listdir(legacy_directory)):
+                    username, extension = os.path.splitext(file)
+                    if extension.lower() != '.json':
+                        continue
+                    try:
+                        with open(os.path.join(legacy_directory, file), 'r') as user_file:
+                            data = json.load(user_file)
+                        password = data.pop('password')
+                    except (OSError, ValueError, KeyError): # Unreadable file, skip it rather than refusing to start
+                        continue
+                    self.connection.execute('INSERT OR IGNORE INTO users (username, password, data) VALUES (?,?,?)', (username, password, json.dumps(data)))
+            self.connection.execute('PRAGMA user_version = 1')
+
+    def _check_cache(self):
+        # data_version changes when another connection commits, so the cache is only kept while nothing else has written
+        data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self.data_version:
+            self.cache.clear()
+            self.data_version = data_version
+
+    def get(self, username):
+        '''
+        Args:
+            username (str) : exact username
+
+        Returns:
+            (dict) : password and account data, or None if the user does not exist
+        '''
+        self._check_cache()
+        if username not in self.cache:
+            row = self.connection.execute('SELECT password, data FROM users WHERE username = ?', (username,)).fetchone()
+            if row is None:
+                return None
+            self.cache[username] = {'password':row[0], **json.loads(row[1])}
+        return dict(self.cache[username]) # A copy, so changes are only kept once saved
+
+    def create(self, username, password):
+        '''
+        Args:
+            username (str) : exact username
+            password (str) : password
+
+        Returns:
+            (bool) : False if the username is already taken
+        '''
+        try:
+            with self.connection:
+                self.connection.execute('INSERT INTO users (username, password) VALUES (?,?)', (username, password))
+        except sqlite3.IntegrityError: # Primary key already exists
+            return False
+        self.cache.pop(username, None)
+        return True
+
+    def save(self, username, data):
+        '''
+        Replace a user's account data in one transaction.
+
+        Args:
+            username (str) : exact username
+            data    (dict) : password and account data, as returned by get
+        '''
+        data = dict(data)
+        password = data.pop('password')
+        with self.connection:
+            self.connection.execute('UPDATE users SET password = ?, data = ? WHERE username = ?', (password, json.dumps(data), username))
+        self.cache.pop(username, None)
+
+    def remove(self, username):
+        '''
+        Delete a user.
+
+        Args:
+            username (str) : exact username
+        '''
+        with self.connection:
+            self.connection.execute('DELETE FROM users WHERE username = ?', (username,))
+        self.cache.pop(username, None)
+
+    def close(self):
+        self.connection.close()
+
+_STORE = None
+
+def get_store():
+    '''
+    Returns:
+        (UserStore) : the store shared by every User, opened the first time it is needed
+    '''
+    global _STORE
+    if _STORE is None:
+        _STORE = UserStore()
+    return _STORE
+
 class User:
     '''
     User class to handle song performance storing.
 
     Args:
-        path       (str) : indicates location of JSON user file
+        store (UserStore) : where accounts are kept
+                            default: None (the shared store)
     Returns:
-        self.data (dict) : all user and song data
+        self.data  (dict) : all user and song data
     '''
-    def __init__(self):
-        self.data = None # Upon initializing create an empty dict
-        self.path = None
+    def __init__(self, store=None):
+        self.store = store
+        self.data = None
+        self.username = None
         return
 
-    def _load_data(self):
-        with open(self.path, 'r') as file:
-            self.data = json.load(file)
-        return
+    def _store(self):
+        if self.store is None:
+            self.store = get_store()
+        return self.store
 
     def validate(self, username, password):
         if not username or not password:
             return 'Both fields must be filled in.'
-        directory = [[files,root] for root, dirs, files in os.walk('.\\assets\\users\\')]
-        if len(directory) == 1 and not directory[0][0]:
+        data = self._store().get(username)
+        if data is None:
             return 'User does not exist.'
+        if password == data['password']:
+            self.username = username
+            self.data = data
+            return
         else:
-            for file in directory[0][0]:
-                if username in file:
-                    self.path = directory[0][1]+file
-                    self._load_data()
-                    if password == self.data['password']:
-                        self.username = username
-                        return
-                    else:
-                        self.path = None
-                        self.data = {}
-                        return 'Invalid password.'
-            return 'User does not exist.'
+            self.username = None
+            self.data = None
+            return 'Invalid password.'
 
     def create(self, username, password):
         if not username or not password:
             return 'Both fields must be filled in.'
-        error = self.validate(username,password)
-        if error == 'User does not exist.':
-            self.path = f'.\\assets\\users\\{username}.json'
-            self.username = username
-            self.save({'password':password})
-            return
-        else:
+        if not self._store().create(username, password):
             return 'User already exists.'
+        self.username = username
+        self.data = self.store.get(username)
+        return
 
     def remove(self):
-        os.remove(self.path)
+        self._store().remove(self.username)
         return
 
     def save(self,data):
-        self.data = data
-        with open(self.path, 'w') as file:
-            json.dump(data, file, indent=4)
+        self._store().save(self.username, data)
+        self.data = self.store.get(self.username)
         return
 
     def get_data(self):
-        if self.path:
-            self._load_data()
+        if self.username:
+            self.data = self._store().get(self.username) # Only reads the database if it has been written since
             return self.data
         else:
             return None
 
     def get_username(self):
-        if self.path:
+        if self.username:
             return self.username
         else:
             return None